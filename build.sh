@@ -5,4 +5,9 @@ set -o errexit
 pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+# Shared table behind the login throttle (LOGIN_THROTTLE_CACHE_ALIAS)
+python manage.py createcachetable
+# The low-stock watchlist starts empty when its table is created and is
+# otherwise only filled by stock changes and the worker's daily refresh
+python manage.py refresh_watchlist
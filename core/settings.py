@@ -76,23 +76,33 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'market.profiles.ProfileMiddleware',
+    'market.routers.ReplicaMiddleware',
+    'market.carts.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'market.catalogue.fragments',
             ],
+            # Compiled templates are kept in memory in production; DEBUG reloads them on change
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
@@ -141,6 +151,15 @@ DATABASES['default']['OPTIONS'] = {
     },
 }
 
+# Optional read replica for the reporting views (market.routers)
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dj_database_url.parse(REPLICA_DATABASE_URL)
+    DATABASES['replica']['OPTIONS'] = DATABASES['default']['OPTIONS']
+DATABASE_ROUTERS = ['market.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+REPLICA_HEALTH_INTERVAL = int(os.getenv('REPLICA_HEALTH_INTERVAL', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -181,7 +200,68 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Rendered receipts of processed orders are also kept on disk when this is set
+RECEIPT_CACHE_DIR = os.getenv('RECEIPT_CACHE_DIR')
+
+# Generated PDF receipts/reports (content-addressed) and the size of the render pool
+DOCUMENT_CACHE_DIR = os.getenv('DOCUMENT_CACHE_DIR', os.path.join(BASE_DIR, 'documents'))
+DOCUMENT_WORKERS = int(os.getenv('DOCUMENT_WORKERS', os.cpu_count() or 1))
+DOCUMENT_WAIT_SECONDS = 10
+
+# Chunked purges (market.purge): rows per DELETE and where archives are written
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 1000))
+PURGE_ARCHIVE_DIR = os.getenv('PURGE_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archives'))
+
+# Closed months of sales/orders moved out of the hot tables (market.coldstore)
+COLD_STORAGE_DIR = os.getenv('COLD_STORAGE_DIR', os.path.join(BASE_DIR, 'coldstore'))
+COLD_STORAGE_AFTER_MONTHS = int(os.getenv('COLD_STORAGE_AFTER_MONTHS', 12))
+
+# Background task queue (market.taskqueue, run with `manage.py runworker`)
+TASK_WORKER_CONCURRENCY = int(os.getenv('TASK_WORKER_CONCURRENCY', 4))
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', 1))
+TASK_RETRY_DELAY = 30           # seconds before the first retry, doubled each attempt
+TASK_LOCK_TIMEOUT = 15 * 60     # a running task not heard from for this long is assumed dead and requeued
+TASK_KEEP_DAYS = 7              # finished tasks are pruned after this many days
+
+# Month-end close (market.closing, `manage.py month_end_close`)
+CLOSE_WORKERS = int(os.getenv('CLOSE_WORKERS', os.cpu_count() or 1))
+CLOSE_DAY_RANGE = 8             # days of sales per partition
+
+# Sessions: cache first, DB writes only for real changes (market.sessions). Quick
+# successive changes are coalesced only when the 'sessions' alias is a cache every
+# process shares (e.g. SESSION_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# with SESSION_CACHE_LOCATION=redis://...); with the LocMem default each change is
+# written through, since other workers and the task worker could not see it.
+SESSION_CACHE = {
+    'BACKEND': os.getenv('SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': os.getenv('SESSION_CACHE_LOCATION', 'sessions'),
+}
+if SESSION_CACHE['BACKEND'].endswith('LocMemCache'):
+    SESSION_CACHE['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('SESSION_CACHE_ENTRIES', 100000))}
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': SESSION_CACHE,
+    # Shared storefront fragments and category menus (market.catalogue), {% cache %} picks this alias
+    'template_fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'template_fragments'},
+}
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 600))  # seconds
+SESSION_ENGINE = 'market.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_WRITE_COALESCE = int(os.getenv('SESSION_WRITE_COALESCE', 5))  # seconds
+
 # Authentication Settings
+AUTHENTICATION_BACKENDS = ['market.authentication.IdentifierBackend']  # username, email or phone
+LOGIN_THROTTLE_FAILURES = 5      # failed logins per identifier before it is locked out...
+LOGIN_THROTTLE_WINDOW = 15 * 60  # ...for this many seconds
+# The failure counters must be shared by every worker process, so they live in the
+# database cache table (`manage.py createcachetable`, run by build.sh) unless
+# LOGIN_THROTTLE_CACHE_BACKEND/LOCATION point at a shared cache such as Redis
+CACHES['login_throttle'] = {
+    'BACKEND': os.getenv('LOGIN_THROTTLE_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+    'LOCATION': os.getenv('LOGIN_THROTTLE_CACHE_LOCATION', 'market_login_throttle'),
+    'TIMEOUT': LOGIN_THROTTLE_WINDOW,
+}
+LOGIN_THROTTLE_CACHE_ALIAS = 'login_throttle'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = 'home'
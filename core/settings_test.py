@@ -0,0 +1,12 @@
+"""
+Settings for the test suite: `python manage.py test --settings=core.settings_test`.
+
+Two local SQLite databases stand in for the TiDB primary and its read
+replica, so the router tests can tell which one a query went to.
+"""
+from .settings import *  # noqa
+
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test_default.sqlite3'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test_replica.sqlite3'},
+}
@@ -0,0 +1,310 @@
+"""
+Vectorized period-over-period analytics for the month-end admin reports.
+
+Each table is pulled once into NumPy arrays: one values_list() per table,
+read in keyset chunks straight into preallocated arrays. Amounts are cast to
+float and months come from year/month extracts in SQL, so no per-row Python
+objects are built beyond the current chunk. Months already moved to cold
+storage are read from their memory-mapped columns instead.
+
+Everything after loading is array arithmetic on a [group x month] matrix
+built with np.bincount: grouped sums, trailing moving averages, MoM/YoY
+changes and margins. A report over two years of sales costs a handful of
+queries however many categories, products or months it shows
+(`manage.py benchmark_analytics` compares it with the ORM-only way).
+
+Months are indexed as year * 12 + month - 1 throughout.
+"""
+from datetime import date
+
+import numpy as np
+from django.db.models import ExpressionWrapper, F, FloatField, IntegerField
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from . import coldstore
+from .models import Sale, OrderItem, Expenses, Product, Category
+
+LOAD_CHUNK = 50000
+UNCATEGORISED = -1
+
+
+# --- Months ---
+
+def month_index(year, month):
+    return year * 12 + month - 1
+
+
+def month_of(day):
+    return month_index(day.year, day.month)
+
+
+def month_label(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def month_start(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_end(index):
+    following = month_start(index + 1)
+    return date.fromordinal(following.toordinal() - 1)
+
+
+def _month_expression(field):
+    return ExpressionWrapper(
+        ExtractYear(field) * 12 + ExtractMonth(field) - 1, output_field=IntegerField()
+    )
+
+
+# --- Loading ---
+
+def _load(queryset, columns, dtypes):
+    """
+    Reads `columns` (name -> expression) of `queryset` into arrays of `dtypes`,
+    LOAD_CHUNK rows per query in primary-key order.
+    """
+    queryset = queryset.annotate(**{f"_{name}": expr for name, expr in columns.items()})
+    names = [f"_{name}" for name in columns]
+    total = queryset.count()
+    arrays = {name: np.empty(total, dtype=dtypes[name]) for name in columns}
+
+    filled, last_pk = 0, 0
+    while filled < total:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', *names)[:LOAD_CHUNK])
+        if not rows:
+            break
+        block = np.array(rows, dtype=float)
+        count = min(len(rows), total - filled)
+        for position, name in enumerate(columns, start=1):
+            values = block[:count, position]
+            if np.issubdtype(dtypes[name], np.integer):
+                # NULL foreign keys read back as NaN
+                values = np.nan_to_num(values, nan=UNCATEGORISED)
+            arrays[name][filled:filled + count] = values
+        filled += count
+        last_pk = rows[-1][0]
+    return {name: values[:filled] for name, values in arrays.items()}
+
+
+SALE_DTYPES = {
+    'month': np.int32, 'product': np.int64, 'category': np.int64, 'seller': np.int64,
+    'revenue': np.float64, 'cost': np.float64, 'quantity': np.int64,
+}
+
+
+def load_sales(first_month, last_month, completed_only=True):
+    """Completed sales between two month indexes (inclusive), hot and archived."""
+    start, end = month_start(first_month), month_end(last_month)
+    sales = Sale.objects.filter(sale_date__date__range=[start, end])
+    if completed_only:
+        sales = sales.filter(is_completed=True)
+    hot = _load(sales, {
+        'month': _month_expression('sale_date'),
+        'product': F('products_id'),
+        'category': F('category_id'),
+        'seller': F('seller_id'),
+        'revenue': Cast('sale_amount', FloatField()),
+        'cost': Cast('cost_amount', FloatField()),
+        'quantity': F('quantity'),
+    }, SALE_DTYPES)
+
+    parts = [hot]
+    for cols, mask in coldstore._sales_in(start, end, completed_only=completed_only):
+        parts.append({
+            'month': _ordinal_months(cols['day'][mask]).astype(np.int32),
+            'product': cols['product_id'][mask].astype(np.int64),
+            'category': cols['category_id'][mask].astype(np.int64),
+            'seller': cols['seller_id'][mask].astype(np.int64),
+            'revenue': cols['amount'][mask] / 100,
+            'cost': cols['cost'][mask] / 100,
+            'quantity': cols['quantity'][mask].astype(np.int64),
+        })
+    return {name: np.concatenate([part[name] for part in parts]) for name in SALE_DTYPES}
+
+
+def _ordinal_months(ordinals):
+    """Month indexes of date ordinals (as stored in cold storage)."""
+    days = np.asarray(ordinals, dtype='int64') - date(1970, 1, 1).toordinal()
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype('int64') + 1970 * 12
+
+
+def load_order_items(first_month, last_month):
+    """Items of processed online orders between two month indexes."""
+    items = OrderItem.objects.filter(
+        order__is_processed=True,
+        order__order_date__date__range=[month_start(first_month), month_end(last_month)],
+    )
+    return _load(items, {
+        'month': _month_expression('order__order_date'),
+        'product': F('product_id'),
+        'quantity': F('quantity'),
+        'revenue': ExpressionWrapper(F('price_at_purchase') * F('quantity'), output_field=FloatField()),
+        'cost': ExpressionWrapper(F('cost_at_purchase') * F('quantity'), output_field=FloatField()),
+    }, {'month': np.int32, 'product': np.int64, 'quantity': np.int64, 'revenue': np.float64, 'cost': np.float64})
+
+
+def load_expenses(first_month, last_month):
+    expenses = Expenses.objects.filter(expenses_date__range=[month_start(first_month), month_end(last_month)])
+    return _load(expenses, {
+        'month': _month_expression('expenses_date'),
+        'amount': Cast('amount', FloatField()),
+    }, {'month': np.int32, 'amount': np.float64})
+
+
+# --- Vectorized building blocks ---
+
+def codes(ids):
+    """(distinct ids, dense code of each row) for grouping with bincount."""
+    return np.unique(ids, return_inverse=True)
+
+
+def grouped_sum(groups, values, size):
+    return np.bincount(groups, weights=values, minlength=size)
+
+
+def pivot(rows, cols, values, shape):
+    """[rows x cols] matrix of summed values, e.g. category x month."""
+    flat = rows.astype(np.int64) * shape[1] + cols
+    return np.bincount(flat, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+
+
+def moving_average(matrix, window):
+    """Trailing mean over `window` columns (fewer at the start of the series)."""
+    matrix = np.atleast_2d(matrix)
+    totals = np.cumsum(matrix, axis=1)
+    shifted = np.zeros_like(totals)
+    shifted[:, window:] = totals[:, :-window]
+    counts = np.minimum(np.arange(1, matrix.shape[1] + 1), window)
+    return (totals - shifted) / counts
+
+
+def change(matrix, lag):
+    """Relative change (%) against `lag` columns earlier; NaN where there is no base."""
+    matrix = np.atleast_2d(matrix).astype(float)
+    result = np.full(matrix.shape, np.nan)
+    base = matrix[:, :-lag]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[:, lag:] = np.where(base != 0, (matrix[:, lag:] - base) * 100 / np.abs(base), np.nan)
+    return result
+
+
+def margin(revenue, cost):
+    """Gross margin (%) element-wise; NaN where there was no revenue."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(revenue != 0, (revenue - cost) * 100 / revenue, np.nan)
+
+
+def _clean(values, digits=1):
+    """Rounded Python floats with None for NaN, ready for templates and caches."""
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+# --- Reports ---
+
+def monthly_overview(last_month=None, months=12):
+    """
+    The `months` months up to `last_month`: revenue, cost, profit, margin,
+    expenses, net, online order revenue, 3-month moving average and MoM/YoY
+    changes; plus revenue by category for the same months with YoY change.
+    """
+    last_month = last_month if last_month is not None else month_of(timezone.localdate())
+    first_month = last_month - months + 1
+    # Twelve extra months so the first shown month has a YoY base
+    load_from = first_month - 12
+    width = last_month - load_from + 1
+
+    sales = load_sales(load_from, last_month)
+    items = load_order_items(load_from, last_month)
+    expenses = load_expenses(load_from, last_month)
+
+    column = sales['month'] - load_from
+    revenue = grouped_sum(column, sales['revenue'], width)
+    cost = grouped_sum(column, sales['cost'], width)
+    spent = grouped_sum(expenses['month'] - load_from, expenses['amount'], width)
+    online = grouped_sum(items['month'] - load_from, items['revenue'], width)
+
+    profit = revenue - cost
+    shown = slice(12, None)
+    series = {
+        'revenue': revenue, 'cost': cost, 'profit': profit, 'expenses': spent, 'net': profit - spent,
+        'online': online,
+        'margin': margin(revenue, cost),
+        'moving_average': moving_average(revenue, 3)[0],
+        'mom': change(revenue, 1)[0],
+        'yoy': change(revenue, 12)[0],
+    }
+    rows = [
+        {'month': month_label(first_month + offset), **{
+            name: (None if np.isnan(values[shown][offset]) else round(float(values[shown][offset]), 1))
+            for name, values in series.items()
+        }}
+        for offset in range(months)
+    ]
+
+    # Revenue by category x month
+    category_ids, category_codes = codes(sales['category'])
+    matrix = pivot(category_codes, column, sales['revenue'], (len(category_ids), width))
+    yoy = change(matrix, 12)
+    names = dict(Category.objects.filter(id__in=category_ids.tolist()).values_list('id', 'name'))
+    order = np.argsort(-matrix[:, shown].sum(axis=1))
+    categories = [
+        {
+            'label': names.get(int(category_ids[i]), 'Uncategorised'),
+            'revenue': _clean(matrix[i, shown], 0),
+            'total': round(float(matrix[i, shown].sum()), 0),
+            'yoy_last': _clean(yoy[i, -1:])[0],
+        }
+        for i in order if matrix[i, shown].any()
+    ]
+    return {
+        'months': [month_label(first_month + offset) for offset in range(months)],
+        'rows': rows,
+        'categories': categories,
+        'rows_loaded': len(sales['month']) + len(items['month']) + len(expenses['month']),
+    }
+
+
+def margin_changes(month=None, compare='yoy', limit=20):
+    """
+    Products sold in both `month` and the comparison month (previous month
+    for 'mom', same month last year for 'yoy'), ordered by how much their
+    gross margin changed, biggest drop first.
+    """
+    month = month if month is not None else month_of(timezone.localdate())
+    base_month = month - (1 if compare == 'mom' else 12)
+    sales = load_sales(base_month, month)
+    in_period = (sales['month'] == month) | (sales['month'] == base_month)
+    product_ids, product_codes = codes(sales['product'][in_period])
+    column = (sales['month'][in_period] == month).astype(np.int64)  # 0 = base, 1 = current
+
+    shape = (len(product_ids), 2)
+    revenue = pivot(product_codes, column, sales['revenue'][in_period], shape)
+    cost = pivot(product_codes, column, sales['cost'][in_period], shape)
+    units = pivot(product_codes, column, sales['quantity'][in_period].astype(float), shape)
+    margins = margin(revenue, cost)
+    delta = margins[:, 1] - margins[:, 0]
+
+    both = ~np.isnan(delta)
+    order = np.flatnonzero(both)[np.argsort(delta[both], kind='stable')][:limit]
+    names = Product.objects.in_bulk(product_ids[order].tolist())
+    return {
+        'month': month_label(month),
+        'base_month': month_label(base_month),
+        'compare': compare,
+        'products': [
+            {
+                'label': names[int(product_ids[i])].name if int(product_ids[i]) in names else 'Unknown',
+                'base_margin': round(float(margins[i, 0]), 1),
+                'margin': round(float(margins[i, 1]), 1),
+                'change': round(float(delta[i]), 1),
+                'revenue': round(float(revenue[i, 1]), 0),
+                'base_revenue': round(float(revenue[i, 0]), 0),
+                'units': int(units[i, 1]),
+            }
+            for i in order
+        ],
+        'shrank': int((delta[both] < 0).sum()),
+        'compared': int(both.sum()),
+    }
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MarketConfig(AppConfig):
     name = 'market'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import tasks  # noqa: F401  (registers the background tasks)
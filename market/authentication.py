@@ -0,0 +1,103 @@
+"""
+Login by username, email or customer phone number with one lookup and one
+password check.
+
+IdentifierBackend resolves the identifier with a single UNION query whose
+branches each use an index (auth_user.username, auth_user.email - indexed by
+migration 0013 - and market_customer.phone). A username match wins, then a
+phone number, then an email address that belongs to exactly one account.
+The password is hashed once whether or not a user was found, as in
+ModelBackend.
+
+Failed attempts are counted per identifier in the LOGIN_THROTTLE_CACHE_ALIAS
+cache, which every worker process shares (the database by default). After
+LOGIN_THROTTLE_FAILURES failures within LOGIN_THROTTLE_WINDOW seconds the
+backend refuses that identifier without hashing anything until the window
+runs out, so a burst of guesses costs no PBKDF2 work on any worker. A
+successful login clears the count.
+
+The count is per identifier, not per client: anyone who knows a username,
+email or phone number can lock that account out for LOGIN_THROTTLE_WINDOW
+seconds by failing on purpose. The owner waits, or staff clear it with
+reset_failures(identifier) from `manage.py shell`.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.db.models import IntegerField, Value
+
+UserModel = get_user_model()
+
+# Lower wins when several accounts match
+USERNAME, PHONE, EMAIL = 0, 1, 2
+
+
+def _cache():
+    return caches[settings.LOGIN_THROTTLE_CACHE_ALIAS]
+
+
+def _throttle_key(identifier):
+    digest = hashlib.sha256(identifier.strip().lower().encode()).hexdigest()[:32]
+    return f'login:failures:{digest}'
+
+
+def is_throttled(identifier):
+    return (_cache().get(_throttle_key(identifier)) or 0) >= settings.LOGIN_THROTTLE_FAILURES
+
+
+def record_failure(identifier):
+    cache = _cache()
+    key = _throttle_key(identifier)
+    if not cache.add(key, 1, settings.LOGIN_THROTTLE_WINDOW):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, settings.LOGIN_THROTTLE_WINDOW)
+
+
+def reset_failures(identifier):
+    _cache().delete(_throttle_key(identifier))
+
+
+def find_user(identifier):
+    """The account `identifier` names (username, phone or unique email), or None."""
+    def branch(rank, **lookup):
+        return UserModel._default_manager.filter(**lookup).annotate(
+            match=Value(rank, output_field=IntegerField())
+        )
+
+    candidates = list(
+        branch(USERNAME, username=identifier)
+        .union(branch(PHONE, customer__phone=identifier), branch(EMAIL, email__iexact=identifier), all=True)
+        .order_by('match')[:3]
+    )
+    if not candidates:
+        return None
+    best = candidates[0]
+    if best.match == EMAIL and len({user.pk for user in candidates}) > 1:
+        return None  # an email shared by several accounts identifies none of them
+    return best
+
+
+class IdentifierBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        identifier = username if username is not None else kwargs.get(UserModel.USERNAME_FIELD)
+        if not identifier or password is None:
+            return None
+        if is_throttled(identifier):
+            # Stops authenticate() here: no other backend tries, nothing is hashed
+            raise PermissionDenied
+
+        user = find_user(identifier)
+        if user is None:
+            # Hash anyway so unknown identifiers take as long as wrong passwords
+            UserModel().set_password(password)
+        elif user.check_password(password) and self.user_can_authenticate(user):
+            reset_failures(identifier)
+            return user
+        record_failure(identifier)
+        return None
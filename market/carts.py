@@ -0,0 +1,212 @@
+"""
+Shopping carts kept out of the session.
+
+Logged-in customers get a Cart row (keyed by user id) with one CartLine per
+product; adding, changing or removing a product writes that one line.
+Anonymous visitors keep their cart in a signed cookie ("12:3|15:1"), so
+browsing and filling a cart never writes a session row. The cookie cart is
+merged into the database cart when its owner logs in (signals.py) and the
+cookie is dropped.
+
+The item count behind the navbar badge is cached per user for
+COUNT_TIMEOUT seconds and kept up to date by the mutations, so count()
+answers from the cookie or the cache without loading the user or the
+session's User row. The default cache is per process: the timeout is kept
+short because another worker's copy misses changes made elsewhere (an add
+handled by a different worker, checkout) until it expires.
+
+CartMiddleware writes the cookie of anonymous carts changed during a
+request; it goes after AuthenticationMiddleware.
+"""
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import Cart, CartLine, Product
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'market.carts'
+COOKIE_MAX_AGE = 30 * 24 * 3600
+MAX_LINES = 50  # keeps the cookie well under the 4 KB limit
+COUNT_TIMEOUT = 10
+
+
+def _count_key(user_id):
+    return f'cart:count:{user_id}'
+
+
+# --- Anonymous carts ---
+
+def _decode(value):
+    lines = {}
+    for part in (value or '').split('|'):
+        product_id, _, quantity = part.partition(':')
+        if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            lines[int(product_id)] = int(quantity)
+    return lines
+
+
+def _encode(lines):
+    return '|'.join(f'{product_id}:{quantity}' for product_id, quantity in lines.items())
+
+
+def _cookie_lines(request):
+    return _decode(request.get_signed_cookie(COOKIE_NAME, default='', salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE))
+
+
+class CookieCart:
+    def __init__(self, request):
+        self.request = request
+        self._lines = _cookie_lines(request)
+
+    def lines(self):
+        """{product id: quantity}"""
+        return dict(self._lines)
+
+    def count(self):
+        return sum(self._lines.values())
+
+    def add(self, product_id, quantity=1):
+        """Adds `quantity` of a product; False if nothing was added."""
+        if quantity <= 0:
+            return False
+        if product_id not in self._lines and not self._can_add(product_id):
+            return False
+        self._lines[product_id] = self._lines.get(product_id, 0) + quantity
+        self._save()
+        return True
+
+    def set(self, product_id, quantity):
+        if quantity <= 0:
+            return self.remove(product_id)
+        if product_id not in self._lines and not self._can_add(product_id):
+            return
+        self._lines[product_id] = quantity
+        self._save()
+
+    def remove(self, product_id):
+        if self._lines.pop(product_id, None) is not None:
+            self._save()
+
+    def clear(self):
+        self._lines = {}
+        self._save()
+
+    def _can_add(self, product_id):
+        """Room for a new line and the product exists."""
+        return len(self._lines) < MAX_LINES and Product.objects.filter(pk=product_id).exists()
+
+    def _save(self):
+        # Written on the response by CartMiddleware
+        self.request._cart_cookie = _encode(self._lines)
+
+
+# --- Customer carts ---
+
+class DatabaseCart:
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def lines(self):
+        return dict(CartLine.objects.filter(cart_id=self.user_id).values_list('product_id', 'quantity'))
+
+    def count(self):
+        return count_for(self.user_id)
+
+    def add(self, product_id, quantity=1):
+        """Adds `quantity` of a product; False if nothing was added."""
+        if quantity <= 0:
+            return False
+        lines = CartLine.objects.filter(cart_id=self.user_id, product_id=product_id)
+        if not lines.update(quantity=F('quantity') + quantity) and not self._insert(product_id, quantity):
+            return False
+        try:
+            cache.incr(_count_key(self.user_id), quantity)
+        except ValueError:
+            pass  # not cached: the next count() sums the lines
+        return True
+
+    def set(self, product_id, quantity):
+        if quantity <= 0:
+            return self.remove(product_id)
+        lines = CartLine.objects.filter(cart_id=self.user_id, product_id=product_id)
+        if lines.update(quantity=quantity) or self._insert(product_id, quantity):
+            cache.delete(_count_key(self.user_id))
+
+    def remove(self, product_id):
+        CartLine.objects.filter(cart_id=self.user_id, product_id=product_id).delete()
+        cache.delete(_count_key(self.user_id))
+
+    def clear(self):
+        CartLine.objects.filter(cart_id=self.user_id).delete()
+        cache.set(_count_key(self.user_id), 0, COUNT_TIMEOUT)
+
+    def _insert(self, product_id, quantity):
+        """First line for a product; False if the product does not exist."""
+        if not Product.objects.filter(pk=product_id).exists():
+            return False
+        Cart.objects.get_or_create(user_id=self.user_id)
+        try:
+            with transaction.atomic():
+                CartLine.objects.create(cart_id=self.user_id, product_id=product_id, quantity=quantity)
+        except IntegrityError:
+            # Another request added it in the meantime
+            CartLine.objects.filter(cart_id=self.user_id, product_id=product_id).update(
+                quantity=F('quantity') + quantity
+            )
+        return True
+
+
+def count_for(user_id):
+    key = _count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = CartLine.objects.filter(cart_id=user_id).aggregate(total=Sum('quantity'))['total'] or 0
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
+
+
+# --- Entry points ---
+
+def get_cart(request):
+    if request.user.is_authenticated:
+        return DatabaseCart(request.user.pk)
+    return CookieCart(request)
+
+
+def count(request):
+    """Items in the visitor's cart, from the cookie or the count cache."""
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        return sum(_cookie_lines(request).values())
+    return count_for(user_id)
+
+
+def merge_cookie_cart(request, user):
+    """Moves an anonymous cart into `user`'s cart (on login)."""
+    lines = _cookie_lines(request)
+    if not lines:
+        return
+    cart = DatabaseCart(user.pk)
+    for product_id, quantity in lines.items():
+        cart.add(product_id, quantity)
+    request._cart_cookie = ''
+
+
+class CartMiddleware:
+    """Sets (or deletes) the cart cookie after a request changed an anonymous cart."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        value = getattr(request, '_cart_cookie', None)
+        if value:
+            response.set_signed_cookie(
+                COOKIE_NAME, value, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+            )
+        elif value is not None:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
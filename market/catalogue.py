@@ -0,0 +1,154 @@
+"""
+Conditional GET for the storefront pages (home, shop, product details).
+
+Whether a page changed is decided before the view runs, without rendering:
+
+  home, shop       the catalogue version: the newest updated_at and the row
+                   count of products and of categories, from two aggregate
+                   queries on the database every process writes to (bulk
+                   writes set updated_at too; the counts catch deletions)
+  product details  the product's and its category's updated_at, one query
+                   on the primary key
+
+The ETag also covers the query string (category, search, page), the user
+from the session and the CSRF cookie, since the header and the forms differ
+per visitor. A request whose If-None-Match (or, for product pages,
+If-Modified-Since) still matches gets 304 Not Modified; pages with flash
+messages waiting are always rendered so the messages are shown and
+consumed.
+
+The pages carry a CSRF token and the visitor's name, so they are marked
+`private, no-cache`: browsers keep them and revalidate every time, a CDN in
+front of the app passes them through instead of sharing one visitor's copy.
+The home page's featured product is drawn when the page is rendered and so
+stays the same until the catalogue changes.
+
+The parts every storefront page shares are kept as template fragments in
+the 'template_fragments' cache for FRAGMENT_CACHE_TIMEOUT seconds:
+navbar, footer and chat bot once for everybody, the header per role and
+username, and the category menu per catalogue version and selected
+category. The categories behind the menu are cached there too, per
+catalogue version, so no process can serve a menu older than the
+database. fragments() puts the keys and timeout in every template
+context; `manage.py benchmark_templates` times the pages with and without
+these caches.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Category, Product
+
+CATEGORIES_KEY = 'catalogue:categories'
+FRAGMENT_CACHE = 'template_fragments'
+
+
+def _state():
+    """(newest updated_at, row count) of products and of categories."""
+    return [
+        model.objects.aggregate(changed=Max('updated_at'), count=Count('pk'))
+        for model in (Product, Category)
+    ]
+
+
+def version(request):
+    """The catalogue version, worked out once per request."""
+    if not hasattr(request, '_catalogue_version'):
+        request._catalogue_version = repr([(part['changed'], part['count']) for part in _state()])
+    return request._catalogue_version
+
+
+def categories(request):
+    """All categories for the menus, cached per catalogue version."""
+    fragments_cache = caches[FRAGMENT_CACHE]
+    key = f"{CATEGORIES_KEY}:{hashlib.sha256(version(request).encode()).hexdigest()[:32]}"
+    found = fragments_cache.get(key)
+    if found is None:
+        found = list(Category.objects.all())
+        fragments_cache.set(key, found, settings.FRAGMENT_CACHE_TIMEOUT)
+    return found
+
+
+def fragment_role(request):
+    if request.session.get(SESSION_KEY) is None:
+        return 'anonymous'
+    user = request.user
+    return 'staff' if user.is_staff or user.is_superuser else 'customer'
+
+
+def fragments(request):
+    """Context processor: what the {% cache %} fragments are keyed on (resolved only when used)."""
+    return {
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'fragment_role': lambda: fragment_role(request),
+        'catalogue_version': lambda: version(request),
+    }
+
+
+def catalogue_state(request, **kwargs):
+    """
+    (ETag parts, last modified) of a page listing the catalogue. No
+    Last-Modified: deleting a product does not move the newest updated_at.
+    """
+    return [version(request)], None
+
+
+def product_state(request, pk):
+    """(ETag parts, last modified) of one product's page; None if it does not exist."""
+    row = Product.objects.filter(pk=pk).values_list('updated_at', 'category__updated_at').first()
+    if row is None:
+        return None
+    return [stamp.isoformat() for stamp in row], max(row)
+
+
+def _etag(request, parts):
+    visitor = [
+        request.get_full_path(),
+        request.session.get(SESSION_KEY),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    ]
+    digest = hashlib.sha256(repr(parts + visitor).encode()).hexdigest()[:32]
+    return quote_etag(digest)
+
+
+def conditional_page(state):
+    """
+    Answers GET/HEAD with 304 when the page is unchanged according to
+    `state(request, **view kwargs)`, and sets its validators otherwise.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            found = state(request, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+            parts, last_modified = found
+            etag = _etag(request, parts)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            if not len(messages.get_messages(request)):
+                response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+                if response is not None:
+                    patch_cache_control(response, private=True, no_cache=True)
+                    return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response.headers.setdefault('ETag', etag)
+                if timestamp is not None:
+                    response.headers.setdefault('Last-Modified', http_date(timestamp))
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,197 @@
+"""
+Chart series for the admin dashboard, served as JSON by dashboard_chart_data.
+
+data(metric, granularity, start, end, seller_id, category_id) returns
+{'labels': [ISO bucket start, ...], 'values': [...]} with empty buckets
+filled with 0, so the client can plot any range at day, week, month or year
+resolution. Revenue and profit cover completed sales, including months
+moved to cold storage; expenses are shop-wide and ignore the seller and
+category filters.
+
+Results are cached per (metric, granularity, range, filters). Every key
+carries a generation number that invalidate() bumps when sales or expenses
+change (or a deleted product, seller or category takes sales with it), so a
+new sale makes every cached series stale at once. Cached results are always
+computed on the primary, even inside replica views.
+"""
+import time
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
+from django.utils import timezone
+
+from . import coldstore, routers
+from .models import Sale, Expenses, Product
+
+METRICS = ('revenue', 'profit', 'expenses', 'top_products')
+GRANULARITIES = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth, 'year': TruncYear}
+MAX_BUCKETS = 1200
+TOP_PRODUCTS = 5
+CACHE_TIMEOUT = 60 * 60
+GENERATION_KEY = 'charts:generation'
+
+
+class ChartError(ValueError):
+    pass
+
+
+# --- Buckets ---
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def buckets(start, end, granularity):
+    """Start dates of every bucket from `start` to `end` (inclusive)."""
+    result, current = [], bucket_start(start, granularity)
+    while current <= end:
+        result.append(current)
+        if granularity == 'day':
+            current += timedelta(days=1)
+        elif granularity == 'week':
+            current += timedelta(days=7)
+        elif granularity == 'month':
+            current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+        else:
+            current = date(current.year + 1, 1, 1)
+    return result
+
+
+def _as_date(value):
+    if isinstance(value, date) and not hasattr(value, 'hour'):
+        return value
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+# --- Series ---
+
+def _sales(start, end, seller_id, category_id):
+    sales = Sale.objects.filter(is_completed=True, sale_date__date__range=[start, end])
+    if seller_id:
+        sales = sales.filter(seller_id=seller_id)
+    if category_id:
+        sales = sales.filter(category_id=category_id)
+    return sales
+
+
+def _sales_series(metric, granularity, start, end, seller_id, category_id):
+    totals = {}
+    rows = (
+        _sales(start, end, seller_id, category_id)
+        .annotate(bucket=GRANULARITIES[granularity]('sale_date'))
+        .values('bucket')
+        .annotate(revenue=Sum('sale_amount'), cost=Sum('cost_amount'))
+        .order_by()
+    )
+    for row in rows:
+        value = (row['revenue'] or 0) - ((row['cost'] or 0) if metric == 'profit' else 0)
+        key = bucket_start(_as_date(row['bucket']), granularity)
+        totals[key] = totals.get(key, 0) + float(value)
+
+    for day, cold in coldstore.daily_sales(start, end, seller_id, category_id).items():
+        value = cold['total_revenue'] - (cold['cost_total'] if metric == 'profit' else 0)
+        key = bucket_start(day, granularity)
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _expense_series(granularity, start, end):
+    rows = (
+        Expenses.objects.filter(expenses_date__range=[start, end])
+        .annotate(bucket=GRANULARITIES[granularity]('expenses_date'))
+        .values('bucket')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    return {bucket_start(_as_date(row['bucket']), granularity): float(row['total'] or 0) for row in rows}
+
+
+def _top_products(start, end, seller_id, category_id, limit):
+    rows = list(
+        _sales(start, end, seller_id, category_id)
+        .values('products_id')
+        .annotate(units=Sum('quantity'), revenue=Sum('sale_amount'))
+        .order_by('-units')[:limit]
+    )
+    names = dict(Product.objects.filter(id__in=[r['products_id'] for r in rows]).values_list('id', 'name'))
+    return {
+        'labels': [names.get(r['products_id'], 'Unknown') for r in rows],
+        'values': [r['units'] or 0 for r in rows],
+        'revenue': [float(r['revenue'] or 0) for r in rows],
+    }
+
+
+def _compute(metric, granularity, start, end, seller_id, category_id, limit):
+    if metric == 'top_products':
+        return _top_products(start, end, seller_id, category_id, limit)
+    if metric == 'expenses':
+        totals = _expense_series(granularity, start, end)
+    else:
+        totals = _sales_series(metric, granularity, start, end, seller_id, category_id)
+    keys = buckets(start, end, granularity)
+    return {
+        'labels': [key.isoformat() for key in keys],
+        'values': [round(totals.get(key, 0), 2) for key in keys],
+    }
+
+
+def data(metric, granularity, start, end, seller_id=None, category_id=None, limit=TOP_PRODUCTS):
+    """One chart series, from the cache when this exact request was served before."""
+    if metric not in METRICS:
+        raise ChartError(f"Unknown metric '{metric}'.")
+    if granularity not in GRANULARITIES:
+        raise ChartError(f"Unknown granularity '{granularity}'.")
+    if start > end:
+        raise ChartError("The start date is after the end date.")
+    if metric != 'top_products' and len(buckets(start, end, granularity)) > MAX_BUCKETS:
+        raise ChartError("Range too long for this granularity; use a coarser one.")
+
+    def compute():
+        result = _compute(metric, granularity, start, end, seller_id, category_id, limit)
+        result.update(metric=metric, granularity=granularity, start=start.isoformat(), end=end.isoformat())
+        return result
+
+    return cached(compute, metric, granularity, start, end, seller_id, category_id, limit)
+
+
+def cached(compute, *parts):
+    """
+    compute(), cached under `parts` until the next invalidate(). It reads the
+    primary: figures from a lagging replica would be kept under the new
+    generation for up to CACHE_TIMEOUT.
+    """
+    key = ':'.join(str(part) for part in ('charts', generation()) + parts)
+    result = cache.get(key)
+    if result is None:
+        with routers.primary():
+            result = compute()
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+# --- Invalidation ---
+
+def generation():
+    # Seeded from the clock, so losing the key (cache restart, eviction) can
+    # never bring an older generation's entries back
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def invalidate():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_on_commit():
+    transaction.on_commit(invalidate)
@@ -0,0 +1,63 @@
+"""
+Shop assistant replies from OpenRouter. The HTTP call can take several
+seconds, so chatbot_response queues reply() as a background task and the
+chat widget polls for the answer.
+"""
+import os
+
+from openai import OpenAI
+
+from .models import Product
+
+# Initialize client
+client = OpenAI(
+    base_url="https://openrouter.ai/api/v1",
+    api_key=os.getenv("DEEPSEEK_API_KEY"),
+)
+
+
+def reply(user_message):
+    try:
+        products = Product.objects.all()[:20]
+        inventory_summary = "\n".join([
+            f"- {p.name}: {p.selling_price} XAF (Stock: {p.quantity} {p.unit})"
+            for p in products
+        ])
+
+        system_prompt = f"""
+        You are the official AI Assistant for our Mini Market called Momshop. 
+        Your theme colors are Orange, White, and Dull Black.
+
+        SHOP FACTS:
+        - Location: Makepe St. Tropez, Douala.
+        - Hours: 8 AM - 10 PM.
+        - Payments: Cash, Orange Money, Mobile Money.
+        - Delivery: 1,000 XAF within the city.
+
+        INVENTORY:
+        {inventory_summary}
+
+        STRICT INSTRUCTIONS:
+        - If a customer asks about a product, check the inventory list above.
+        - If you DO NOT know the answer, or if the question is about a specific complaint, 
+          refund, or a product NOT in the list, reply: 
+          "I'm sorry, I don't have that specific information. Please contact our 
+          Human Support team directly at +237 600 000 000 for further assistance."
+        - Keep answers helpful and concise.
+        """
+
+        completion = client.chat.completions.create(
+            extra_headers={
+                "HTTP-Referer": "http://localhost:8000", # Required for OpenRouter
+            },
+            model="nex-agi/deepseek-v3.1-nex-n1:free",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message},
+            ],
+        )
+        return completion.choices[0].message.content
+
+    except Exception as e:
+        # Shown in the chat window, as before
+        return f"Backend Error: {str(e)}"
@@ -0,0 +1,337 @@
+"""
+Month-end close: seller statements, category P&L, expense summary and
+inventory valuation for one month, written to report tables.
+
+The month is split into partitions that can run independently:
+
+  sales       one per seller and day range (CLOSE_DAY_RANGE days), partial
+              totals per category and payment method
+  expenses    one per day range, totals per expense type
+  inventory   one per category, stock on hand at the last day of the month
+
+run() spreads pending partitions over a spawned process pool; every worker
+sets Django up afresh and so opens its own database connection. A finished
+partition stores its partial aggregate (integer cents, so sums are exact)
+on its ClosePartition row before the next one is handed out. An interrupted
+close therefore resumes where it stopped: planning is idempotent and only
+partitions not yet done are run again.
+
+merge() adds the partials up in (kind, key) order and replaces the month's
+report rows in one transaction, so the same data always gives the same
+figures whatever order the workers finished in. Months in cold storage are
+read from their archived columns.
+"""
+import calendar
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import coldstore, stock
+from .models import (
+    Sale, Seller, Product, Expenses, MonthEndClose, ClosePartition,
+    SellerStatement, CategoryProfitLoss, ExpenseSummary, InventoryValuation,
+)
+
+# Order of the values in a sales partial: [revenue, cost, units, transactions, cash, mobile money, card]
+SALES_FIELDS = ('revenue', 'cost', 'units', 'transactions', 'cash', 'mobile_money', 'card')
+PAYMENT_SLOTS = {'cash': 4, 'mobile_money': 5, 'card': 6}
+NO_CATEGORY = '-1'
+
+
+class ClosingError(Exception):
+    pass
+
+
+def _cents(value):
+    return int(round((value or 0) * 100))
+
+
+def _money(cents):
+    return Decimal(cents) / 100
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def day_ranges(first, last, size=None):
+    """[(first day, last day), ...] covering the month in blocks of `size` days."""
+    size = size or settings.CLOSE_DAY_RANGE
+    ranges, start = [], first
+    while start <= last:
+        end = min(start + timedelta(days=size - 1), last)
+        ranges.append((start, end))
+        start = end + timedelta(days=1)
+    return ranges
+
+
+# --- Planning ---
+
+def _sellers_with_sales(first, last):
+    sellers = set(
+        Sale.objects.filter(is_completed=True, sale_date__date__range=[first, last])
+        .values_list('seller_id', flat=True).distinct()
+    )
+    for cols, mask in coldstore._sales_in(first, last):
+        sellers.update(int(s) for s in np.unique(cols['seller_id'][mask]))
+    return sorted(sellers)
+
+
+def plan(year, month, restart=False):
+    """
+    The MonthEndClose of a month with its partitions created. Existing
+    partitions (and their results) are kept unless `restart` is set.
+    """
+    first, last = month_bounds(year, month)
+    if last >= timezone.localdate():
+        raise ClosingError(f"{year:04d}-{month:02d} has not ended yet.")
+
+    close, _ = MonthEndClose.objects.get_or_create(month=first)
+    if restart:
+        close.work.all().delete()
+        close.status = 'running'
+    elif close.status == 'done':
+        return close
+
+    ranges = day_ranges(first, last)
+    work = [
+        ClosePartition(
+            close=close, kind='sales', key=f"seller={seller} days={start.day}-{end.day}",
+            params={'seller': seller, 'first': start.isoformat(), 'last': end.isoformat()},
+        )
+        for seller in _sellers_with_sales(first, last)
+        for start, end in ranges
+    ]
+    work += [
+        ClosePartition(
+            close=close, kind='expenses', key=f"days={start.day}-{end.day}",
+            params={'first': start.isoformat(), 'last': end.isoformat()},
+        )
+        for start, end in ranges
+    ]
+    categories = sorted(set(Product.objects.values_list('category_id', flat=True)))
+    work += [
+        ClosePartition(
+            close=close, kind='inventory', key=f"category={category}",
+            params={'category': category, 'day': last.isoformat()},
+        )
+        for category in categories
+    ]
+    ClosePartition.objects.bulk_create(work, ignore_conflicts=True)
+
+    close.partitions = close.work.count()
+    close.finished_partitions = close.work.filter(done=True).count()
+    close.status, close.error = 'running', ''
+    close.save(update_fields=['partitions', 'finished_partitions', 'status', 'error', 'updated_at'])
+    return close
+
+
+# --- Partitions (run in the worker processes) ---
+
+def _sales_partial(seller_id, first, last):
+    """{category id: [revenue, cost, units, transactions, cash, mobile money, card]} in cents."""
+    partial = {}
+
+    def add(category_id, payment, revenue, cost, units, transactions):
+        values = partial.setdefault(str(category_id), [0] * len(SALES_FIELDS))
+        values[0] += revenue
+        values[1] += cost
+        values[2] += units
+        values[3] += transactions
+        if payment in PAYMENT_SLOTS:
+            values[PAYMENT_SLOTS[payment]] += revenue
+
+    rows = (
+        Sale.objects.filter(is_completed=True, seller_id=seller_id, sale_date__date__range=[first, last])
+        .values('category_id', 'payment_method')
+        .annotate(revenue=Sum('sale_amount'), cost=Sum('cost_amount'), units=Sum('quantity'), transactions=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        category = row['category_id'] if row['category_id'] is not None else NO_CATEGORY
+        add(category, row['payment_method'], _cents(row['revenue']), _cents(row['cost']),
+            row['units'] or 0, row['transactions'])
+
+    payments = {code: method for method, code in coldstore.PAYMENT_CODES.items()}
+    for cols, mask in coldstore._sales_in(first, last, seller_id):
+        group = cols['category_id'][mask].astype(np.int64) * 256 + cols['payment'][mask]
+        keys, slots = np.unique(group, return_inverse=True)
+        if not len(keys):
+            continue
+        sums = [np.bincount(slots, weights=cols[name][mask], minlength=len(keys)) for name in ('amount', 'cost', 'quantity')]
+        counts = np.bincount(slots, minlength=len(keys))
+        for i, key in enumerate(keys.tolist()):
+            add(key // 256, payments.get(key % 256), int(sums[0][i]), int(sums[1][i]), int(sums[2][i]), int(counts[i]))
+    return partial
+
+
+def _expenses_partial(first, last):
+    """{expense type: [count, total cents]}"""
+    rows = (
+        Expenses.objects.filter(expenses_date__range=[first, last])
+        .values('expenses_type').annotate(count=Count('id'), total=Sum('amount')).order_by()
+    )
+    return {row['expenses_type']: [row['count'], _cents(row['total'])] for row in rows}
+
+
+def _inventory_partial(category_id, day):
+    """[products, units, cost value cents, retail value cents] of one category at the end of `day`."""
+    products = list(Product.objects.filter(category_id=category_id).values_list('id', 'buying_price', 'selling_price'))
+    on_hand = stock.stock_at(day, [pid for pid, _, _ in products])
+    units = cost = retail = 0
+    for pid, buying, selling in products:
+        quantity = max(on_hand.get(pid, 0), 0)
+        units += quantity
+        cost += _cents(buying) * quantity
+        retail += _cents(selling) * quantity
+    return [len(products), units, cost, retail]
+
+
+def run_partition(partition_id):
+    """Computes one partition and stores its partial; safe to call again."""
+    close_old_connections()
+    part = ClosePartition.objects.get(pk=partition_id)
+    if part.done:
+        return partition_id
+    params = part.params
+    if part.kind == 'sales':
+        result = _sales_partial(
+            params['seller'], date.fromisoformat(params['first']), date.fromisoformat(params['last'])
+        )
+    elif part.kind == 'expenses':
+        result = _expenses_partial(date.fromisoformat(params['first']), date.fromisoformat(params['last']))
+    else:
+        result = _inventory_partial(params['category'], date.fromisoformat(params['day']))
+    ClosePartition.objects.filter(pk=partition_id).update(result=result, done=True, updated_at=timezone.now())
+    close_old_connections()
+    return partition_id
+
+
+def run(close, workers=None, log=None):
+    """Runs every pending partition of `close`, `workers` at a time."""
+    pending = list(close.work.filter(done=False).order_by('kind', 'key').values_list('id', flat=True))
+    workers = workers or settings.CLOSE_WORKERS
+    if workers > 1 and len(pending) > 1:
+        # Spawned (not forked) children set Django up with their own connections
+        pool = ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+        )
+        try:
+            futures = [pool.submit(run_partition, pid) for pid in pending]
+            for future in as_completed(futures):
+                future.result()
+                _progress(close, log)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    else:
+        for pid in pending:
+            run_partition(pid)
+            _progress(close, log)
+
+
+def _progress(close, log):
+    close.finished_partitions += 1
+    MonthEndClose.objects.filter(pk=close.pk).update(finished_partitions=close.finished_partitions)
+    if log:
+        log(f"  {close.finished_partitions}/{close.partitions} partitions done")
+
+
+# --- Merging ---
+
+def merge(close):
+    """Adds up every partial and rewrites the month's report tables."""
+    work = list(close.work.order_by('kind', 'key'))
+    missing = [part.key for part in work if not part.done]
+    if missing:
+        raise ClosingError(f"{len(missing)} partitions are not finished yet.")
+
+    sellers, categories, expenses, inventory = {}, {}, {}, {}
+    for part in work:
+        if part.kind == 'sales':
+            seller = sellers.setdefault(part.params['seller'], [0] * len(SALES_FIELDS))
+            for category, values in part.result.items():
+                per_category = categories.setdefault(category, [0] * len(SALES_FIELDS))
+                for i, value in enumerate(values):
+                    seller[i] += value
+                    per_category[i] += value
+        elif part.kind == 'expenses':
+            for kind, (count, total) in part.result.items():
+                current = expenses.setdefault(kind, [0, 0])
+                current[0] += count
+                current[1] += total
+        else:
+            inventory[part.params['category']] = part.result
+
+    revenue = sum(values[0] for values in sellers.values())
+    cost = sum(values[1] for values in sellers.values())
+    spent = sum(total for _, total in expenses.values())
+
+    known_sellers = set(Seller.objects.filter(pk__in=list(sellers)).values_list('pk', flat=True))
+    statements = [
+        SellerStatement(
+            close=close, seller_id=seller_id,
+            revenue=_money(v[0]), cost=_money(v[1]), gross_profit=_money(v[0] - v[1]),
+            units=v[2], transactions=v[3],
+            cash_sales=_money(v[4]), mobile_money_sales=_money(v[5]), card_sales=_money(v[6]),
+        )
+        for seller_id, v in sorted(sellers.items())
+        if seller_id in known_sellers
+    ]
+    results = []
+    for category, v in sorted(categories.items(), key=lambda item: int(item[0])):
+        allocated = round(spent * v[0] / revenue) if revenue else 0
+        results.append(CategoryProfitLoss(
+            close=close, category_id=None if category == NO_CATEGORY else int(category),
+            revenue=_money(v[0]), cost=_money(v[1]), gross_profit=_money(v[0] - v[1]),
+            allocated_expenses=_money(allocated), net_profit=_money(v[0] - v[1] - allocated), units=v[2],
+        ))
+    summaries = [
+        ExpenseSummary(close=close, expenses_type=kind, count=count, total=_money(total))
+        for kind, (count, total) in sorted(expenses.items())
+    ]
+    valuations = [
+        InventoryValuation(
+            close=close, category_id=category, products=products, units=units,
+            cost_value=_money(cost_value), retail_value=_money(retail_value),
+        )
+        for category, (products, units, cost_value, retail_value) in sorted(inventory.items())
+    ]
+
+    with transaction.atomic():
+        for model in (SellerStatement, CategoryProfitLoss, ExpenseSummary, InventoryValuation):
+            model.objects.filter(close=close).delete()
+        SellerStatement.objects.bulk_create(statements)
+        CategoryProfitLoss.objects.bulk_create(results)
+        ExpenseSummary.objects.bulk_create(summaries)
+        InventoryValuation.objects.bulk_create(valuations)
+
+        close.total_revenue = _money(revenue)
+        close.total_cost = _money(cost)
+        close.total_expenses = _money(spent)
+        close.inventory_value = _money(sum(v[2] for v in inventory.values()))
+        close.finished_partitions = len(work)
+        close.status, close.error, close.finished_at = 'done', '', timezone.now()
+        close.save()
+    return close
+
+
+def close_month(year, month, workers=None, restart=False, log=None):
+    """Plans, runs and merges the close of one month; resumes an interrupted one."""
+    close = plan(year, month, restart=restart)
+    if close.status == 'done':
+        return close
+    try:
+        run(close, workers, log)
+    except BaseException as e:
+        MonthEndClose.objects.filter(pk=close.pk).update(status='failed', error=repr(e)[:2000])
+        raise
+    return merge(close)
@@ -0,0 +1,325 @@
+"""
+Cold storage for closed months of sales and orders.
+
+archive_month() moves one month of completed Sale, processed Order and
+OrderItem rows out of the hot tables into COLD_STORAGE_DIR/YYYY-MM/; open
+credits and pending orders stay hot until they are settled:
+
+  sales/<column>.npy, orders/<column>.npy, items/<column>.npy
+      one NumPy array per column with narrow dtypes (amounts in integer
+      cents, dates as day ordinals, payment methods as small codes), read
+      back with mmap so aggregating a month costs a few vector operations
+  rows.jsonl.gz
+      the full rows as a Django fixture; `manage.py loaddata` restores them
+  manifest.json
+      row counts and totals, checked when the month is written, and the
+      state: 'deleting' until the month's hot rows are all gone, then
+      'complete'
+
+The files are published before the hot rows are deleted (in short
+transactions). Readers skip months still 'deleting', so no row is counted
+twice, and running archive_month again on such a month finishes the deletes
+from the ids in the archive.
+
+Readers (sales_figures, daily_sales) combine any archived months that overlap
+a date range. reporting.daily_totals and the seller report add them to the
+hot rows, so reports span archived periods transparently.
+"""
+import calendar
+import gzip
+import json
+import os
+import shutil
+from datetime import date, datetime, time as dt_time, timedelta
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Sale, Order, OrderItem
+
+PAYMENT_CODES = {'cash': 0, 'mobile_money': 1, 'card': 2}
+DELETE_CHUNK = 1000
+
+SALE_COLUMNS = {
+    'id': np.int64, 'day': np.int32, 'seller_id': np.int32, 'product_id': np.int32,
+    'category_id': np.int32, 'quantity': np.int32, 'amount': np.int64, 'cost': np.int64,
+    'payment': np.uint8, 'completed': np.bool_,
+}
+ORDER_COLUMNS = {'id': np.int64, 'day': np.int32, 'customer_id': np.int32, 'total': np.int64}
+ITEM_COLUMNS = {
+    'order_id': np.int64, 'day': np.int32, 'product_id': np.int32,
+    'quantity': np.int32, 'price': np.int64, 'cost': np.int64,
+}
+
+
+class ColdStorageError(Exception):
+    pass
+
+
+def _cents(value):
+    return int(round((value or 0) * 100))
+
+
+def _month_bounds(year, month):
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    start = timezone.make_aware(datetime.combine(first, dt_time.min))
+    end = timezone.make_aware(datetime.combine(last + timedelta(days=1), dt_time.min))
+    return first, last, start, end
+
+
+def month_dir(year, month):
+    return os.path.join(settings.COLD_STORAGE_DIR, f"{year:04d}-{month:02d}")
+
+
+def read_manifest(folder):
+    """The manifest of an archived month folder, or None."""
+    try:
+        with open(os.path.join(folder, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(folder, manifest):
+    path = os.path.join(folder, 'manifest.json')
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def archived_months():
+    """[(year, month)] of every completely archived month, oldest first."""
+    if not os.path.isdir(settings.COLD_STORAGE_DIR):
+        return []
+    months = []
+    for name in sorted(os.listdir(settings.COLD_STORAGE_DIR)):
+        manifest = read_manifest(os.path.join(settings.COLD_STORAGE_DIR, name))
+        # Archives written before the state was recorded are complete
+        if manifest is not None and manifest.get('state', 'complete') == 'complete':
+            year, month = name.split('-')
+            months.append((int(year), int(month)))
+    return months
+
+
+def closed_months(older_than_months=None, today=None):
+    """Months with hot sales that ended more than `older_than_months` ago."""
+    older_than_months = settings.COLD_STORAGE_AFTER_MONTHS if older_than_months is None else older_than_months
+    today = today or timezone.localdate()
+    index = today.year * 12 + today.month - 1 - older_than_months
+    cutoff = date(index // 12, index % 12 + 1, 1)
+    _, _, start, _ = _month_bounds(cutoff.year, cutoff.month)
+    return [(d.year, d.month) for d in Sale.objects.filter(sale_date__lt=start).dates('sale_date', 'month')]
+
+
+def _write_columns(folder, columns, rows):
+    os.makedirs(folder)
+    for index, (name, dtype) in enumerate(columns.items()):
+        np.save(os.path.join(folder, f"{name}.npy"), np.array([row[index] for row in rows], dtype=dtype))
+
+
+def archive_month(year, month):
+    """
+    Moves one month to cold storage and returns its manifest. Open credits
+    and unprocessed orders stay in the hot tables. Finishes the deletes of a month left
+    'deleting'; raises ColdStorageError if the month is already archived.
+    """
+    target = month_dir(year, month)
+    if os.path.exists(target):
+        manifest = read_manifest(target)
+        if manifest is None or manifest.get('state', 'complete') != 'deleting':
+            raise ColdStorageError(f"{year:04d}-{month:02d} is already archived.")
+        sale_ids = np.load(os.path.join(target, 'sales', 'id.npy')).tolist()
+        order_ids = np.load(os.path.join(target, 'orders', 'id.npy')).tolist()
+        return _delete_hot_rows(target, manifest, sale_ids, order_ids)
+    first, last, start, end = _month_bounds(year, month)
+
+    sales = list(Sale.objects.filter(sale_date__gte=start, sale_date__lt=end, is_completed=True).order_by('id'))
+    orders = list(Order.objects.filter(order_date__gte=start, order_date__lt=end, is_processed=True).order_by('id'))
+    order_days = {o.id: timezone.localtime(o.order_date).date().toordinal() for o in orders}
+    items = list(OrderItem.objects.filter(order_id__in=order_days).order_by('id'))
+
+    sale_rows = [
+        (s.id, timezone.localtime(s.sale_date).date().toordinal(), s.seller_id, s.products_id,
+         s.category_id or -1, s.quantity, _cents(s.sale_amount), _cents(s.cost_amount),
+         PAYMENT_CODES.get(s.payment_method, 255), s.is_completed)
+        for s in sales
+    ]
+    order_rows = [(o.id, order_days[o.id], o.customer_id, _cents(o.total_amount)) for o in orders]
+    item_rows = [
+        (i.order_id, order_days[i.order_id], i.product_id, i.quantity,
+         _cents(i.price_at_purchase), _cents(i.cost_at_purchase))
+        for i in items
+    ]
+    manifest = {
+        'month': f"{year:04d}-{month:02d}",
+        'first_day': first.isoformat(),
+        'last_day': last.isoformat(),
+        'archived_at': timezone.now().isoformat(),
+        'sales': len(sale_rows),
+        'orders': len(order_rows),
+        'items': len(item_rows),
+        'sales_amount_cents': sum(row[6] for row in sale_rows),
+        'state': 'deleting',
+    }
+
+    # Write everything next to the target, then rename it into place in one step
+    staging = f"{target}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        _write_columns(os.path.join(staging, 'sales'), SALE_COLUMNS, sale_rows)
+        _write_columns(os.path.join(staging, 'orders'), ORDER_COLUMNS, order_rows)
+        _write_columns(os.path.join(staging, 'items'), ITEM_COLUMNS, item_rows)
+        with gzip.open(os.path.join(staging, 'rows.jsonl.gz'), 'wt', encoding='utf-8') as out:
+            for rows in (sales, orders, items):
+                if rows:
+                    out.write(serializers.serialize('jsonl', rows))
+        _write_manifest(staging, manifest)
+
+        check = np.load(os.path.join(staging, 'sales', 'amount.npy'), mmap_mode='r')
+        if int(check.sum()) != manifest['sales_amount_cents']:
+            raise ColdStorageError("Archived sales do not add up; nothing was deleted.")
+        os.replace(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return _delete_hot_rows(target, manifest, [s.id for s in sales], [o.id for o in orders])
+
+
+def _delete_hot_rows(target, manifest, sale_ids, order_ids):
+    """Deletes the archived rows from the hot tables, then marks the month complete."""
+    _delete_ids(OrderItem, order_ids, field='order_id')
+    _delete_ids(Order, order_ids)
+    _delete_ids(Sale, sale_ids)
+    manifest['state'] = 'complete'
+    _write_manifest(target, manifest)
+    return manifest
+
+
+def _delete_ids(model, ids, field='id'):
+    # Short transactions; ids already gone (an earlier, interrupted run) are no-ops
+    for offset in range(0, len(ids), DELETE_CHUNK):
+        with transaction.atomic():
+            model.objects.filter(**{f"{field}__in": ids[offset:offset + DELETE_CHUNK]}).delete()
+
+
+# --- Reading ---
+
+@lru_cache(maxsize=64)
+def _load(folder, mtime):
+    # mtime is part of the key so a re-archived month is read afresh
+    return {
+        name[:-4]: np.load(os.path.join(folder, name), mmap_mode='r')
+        for name in os.listdir(folder) if name.endswith('.npy')
+    }
+
+
+def columns(year, month, table='sales'):
+    """Memory-mapped column arrays of one archived month."""
+    folder = os.path.join(month_dir(year, month), table)
+    return _load(folder, os.path.getmtime(os.path.join(month_dir(year, month), 'manifest.json')))
+
+
+def _sales_in(start_date, end_date, seller_id=None, category_id=None, completed_only=True):
+    """Yields (columns, row mask) for archived sales between two dates."""
+    low, high = start_date.toordinal(), end_date.toordinal()
+    for year, month in archived_months():
+        first, last, _, _ = _month_bounds(year, month)
+        if last < start_date or first > end_date:
+            continue
+        cols = columns(year, month)
+        if not len(cols['id']):
+            continue
+        mask = (cols['day'] >= low) & (cols['day'] <= high)
+        if completed_only:
+            mask &= cols['completed']
+        if seller_id is not None:
+            mask &= cols['seller_id'] == seller_id
+        if category_id is not None:
+            mask &= cols['category_id'] == category_id
+        yield cols, mask
+
+
+def sales_figures(start_date, end_date, seller_id=None, completed_only=True):
+    """Archived revenue, cost, units and transactions between two dates (inclusive)."""
+    revenue = cost = units = transactions = 0
+    for cols, mask in _sales_in(start_date, end_date, seller_id, completed_only=completed_only):
+        revenue += int(cols['amount'][mask].sum())
+        cost += int(cols['cost'][mask].sum())
+        units += int(cols['quantity'][mask].sum())
+        transactions += int(mask.sum())
+    return {
+        'revenue': revenue / 100, 'cost': cost / 100,
+        'units': units, 'transactions': transactions,
+    }
+
+
+def sales_by_category(start_date, end_date, completed_only=True):
+    """{category id or None: sales_figures()-style totals} of archived sales between two dates."""
+    groups = {}
+    for cols, mask in _sales_in(start_date, end_date, completed_only=completed_only):
+        ids, slot = np.unique(cols['category_id'][mask], return_inverse=True)
+        sums = {
+            'revenue': np.bincount(slot, weights=cols['amount'][mask], minlength=len(ids)),
+            'cost': np.bincount(slot, weights=cols['cost'][mask], minlength=len(ids)),
+            'units': np.bincount(slot, weights=cols['quantity'][mask], minlength=len(ids)),
+            'transactions': np.bincount(slot, minlength=len(ids)),
+        }
+        for index, category_id in enumerate(ids.tolist()):
+            group = groups.setdefault(None if category_id == -1 else category_id, {
+                'revenue': 0, 'cost': 0, 'units': 0, 'transactions': 0,
+            })
+            group['revenue'] += int(sums['revenue'][index]) / 100
+            group['cost'] += int(sums['cost'][index]) / 100
+            group['units'] += int(sums['units'][index])
+            group['transactions'] += int(sums['transactions'][index])
+    return groups
+
+
+def daily_sales(start_date, end_date, seller_id=None, category_id=None):
+    """
+    {date: {'total_revenue', 'transactions', 'units', 'cash_total', 'momo_total', 'cost_total'}}
+    for archived completed sales, in the shape of reporting.daily_totals().
+    """
+    days = {}
+    for cols, mask in _sales_in(start_date, end_date, seller_id, category_id):
+        day = cols['day'][mask]
+        if not len(day):
+            continue
+        base = int(day.min())
+        slot = day - base
+        size = int(slot.max()) + 1
+        amount = cols['amount'][mask]
+        payment = cols['payment'][mask]
+        sums = {
+            'total_revenue': np.bincount(slot, weights=amount, minlength=size) / 100,
+            'transactions': np.bincount(slot, minlength=size),
+            'units': np.bincount(slot, weights=cols['quantity'][mask], minlength=size),
+            'cash_total': np.bincount(slot, weights=amount * (payment == PAYMENT_CODES['cash']), minlength=size) / 100,
+            'momo_total': np.bincount(slot, weights=amount * (payment == PAYMENT_CODES['mobile_money']), minlength=size) / 100,
+            'cost_total': np.bincount(slot, weights=cols['cost'][mask], minlength=size) / 100,
+        }
+        for offset in np.flatnonzero(sums['transactions']):
+            days[date.fromordinal(base + int(offset))] = {
+                key: (int(values[offset]) if key in ('transactions', 'units') else float(values[offset]))
+                for key, values in sums.items()
+            }
+    return days
+
+
+def restore_month(year, month):
+    """Loads an archived month back into the hot tables and removes its files."""
+    from django.core.management import call_command
+
+    folder = month_dir(year, month)
+    if not os.path.exists(os.path.join(folder, 'manifest.json')):
+        raise ColdStorageError(f"{year:04d}-{month:02d} is not archived.")
+    with transaction.atomic():
+        call_command('loaddata', os.path.join(folder, 'rows.jsonl.gz'), verbosity=0)
+    shutil.rmtree(folder)
+    _load.cache_clear()
@@ -0,0 +1,153 @@
+"""
+Server-side PDF receipts and sales report documents.
+
+Documents are built from plain data snapshots (dicts), rendered to PDF by a
+process pool outside the request/response cycle, and stored on disk under
+the SHA-256 of their content. The same content always maps to the same
+file, so a PDF is generated once and served as a static file afterwards.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import pdf
+from .models import SalesReport
+from .receipts import get_receipt_order
+
+# Bump when the layout changes so old files are not served for new content
+LAYOUT_VERSION = 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# --- Snapshots (run in the web process: one or two queries each) ---
+
+def receipt_data(order_number):
+    order = get_receipt_order(order_number)
+    user = order.customer.user
+    return {
+        'order_number': order.order_number,
+        'order_date': order.order_date.strftime("%d %b %Y"),
+        'customer': (user.get_full_name() if user else '') or str(order.customer),
+        'town': order.town,
+        'city': order.city,
+        'phone': order.phone_number,
+        'items': [
+            (item.product.name, item.quantity, str(item.price_at_purchase),
+             str(item.quantity * item.price_at_purchase))
+            for item in order.items.all()
+        ],
+        'total': str(order.total_amount),
+    }
+
+
+def report_data(report):
+    user = report.generated_by.user
+    return {
+        'report_date': report.report_date.strftime("%A, %B %d, %Y"),
+        'generated_by': user.get_full_name() or user.username,
+        'cash_sales': str(report.cash_sales),
+        'mobile_money_sales': str(report.mobile_money_sales),
+        'total_sales': str(report.total_sales),
+        'total_customers': report.total_customers,
+        'total_products_sold': report.total_products_sold,
+    }
+
+
+def document_path(kind, data):
+    """Content address: same kind + layout + data always gives the same file."""
+    digest = hashlib.sha256(
+        json.dumps([kind, LAYOUT_VERSION, data], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    return os.path.join(settings.DOCUMENT_CACHE_DIR, kind, digest[:2], f"{digest}.pdf")
+
+
+# --- Worker pool ---
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.DOCUMENT_WORKERS)
+        return _pool
+
+
+def discard_pool(pool):
+    """
+    Drops `pool` once a worker died in it (BrokenProcessPool): a broken
+    executor refuses every later job, so the next get_pool() starts a new one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(kind, data):
+    """
+    Queues generation of a document and returns (path, future).
+    The future is None when the file already exists.
+    """
+    path = document_path(kind, data)
+    if os.path.exists(path):
+        return path, None
+    pool = get_pool()
+    try:
+        future = pool.submit(pdf.write_document, kind, data, path)
+    except BrokenProcessPool:
+        discard_pool(pool)
+        pool = get_pool()
+        future = pool.submit(pdf.write_document, kind, data, path)
+    # Remembered so wait() knows which pool to discard if the worker dies
+    future.pool = pool
+    return path, future
+
+
+def wait(future, timeout):
+    """
+    Waits for a submitted document. Raises TimeoutError while it is still being
+    rendered and re-raises whatever the worker raised, after discarding the pool
+    if the worker process died.
+    """
+    try:
+        return future.result(timeout=timeout)
+    except BrokenProcessPool:
+        discard_pool(future.pool)
+        raise
+
+
+def submit_receipt(order_number):
+    return submit('receipt', receipt_data(order_number))
+
+
+def submit_report(report):
+    return submit('report', report_data(report))
+
+
+def generate_reports(reports):
+    """
+    Renders many reports in parallel across the pool (e.g. a whole month).
+    Returns the list of file paths, in the same order as `reports`.
+    """
+    snapshots = [report_data(report) for report in reports]
+    paths = [document_path('report', data) for data in snapshots]
+    pool = get_pool()
+    try:
+        list(pool.map(pdf.write_document, ['report'] * len(snapshots), snapshots, paths))
+    except BrokenProcessPool:
+        discard_pool(pool)
+        raise
+    return paths
+
+
+def reports_for_month(year, month):
+    return SalesReport.objects.select_related('generated_by__user').filter(
+        report_date__year=year, report_date__month=month
+    ).order_by('report_date')
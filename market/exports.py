@@ -0,0 +1,236 @@
+"""
+Streaming CSV exports for the admin dashboard (sales, orders, expenses).
+
+Rows are read in keyset-paginated chunks (WHERE id > last_id LIMIT n) so
+memory stays flat whatever the size of the table. The MySQL/TiDB driver
+buffers a whole result set client-side, so a plain .iterator() would not
+be enough on our database.
+"""
+import csv
+import zlib
+from datetime import timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Sale, OrderItem, Expenses
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object that hands back whatever csv.writer writes into it."""
+    def write(self, value):
+        return value
+
+
+def iterate_in_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields values_list() tuples for `fields`, fetching `chunk_size` rows per query
+    ordered by primary key. Each query only touches the index range it needs.
+    """
+    last_pk = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', *fields)[:chunk_size]
+        )
+        if not rows:
+            return
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+# --- Filters (kept in sync with the HTML views) ---
+
+def _date_param(params, name):
+    """The YYYY-MM-DD value of `name`, None when absent; ValueError when malformed."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+    return parsed
+
+
+def filter_sales(params, seller_id=None):
+    """
+    Same filters as seller_sales_report: seller, `days` or an explicit date range.
+    Raises ValueError on a malformed `days`, `seller` or date.
+    """
+    sales = Sale.objects.all()
+
+    seller_id = seller_id or params.get('seller')
+    if seller_id:
+        if not str(seller_id).isdigit():
+            raise ValueError("seller must be an id")
+        sales = sales.filter(seller_id=seller_id)
+
+    start_date = _date_param(params, 'start_date')
+    end_date = _date_param(params, 'end_date')
+    days = params.get('days')
+    if days and not (start_date or end_date):
+        if not days.isdigit():
+            raise ValueError("days must be a whole number")
+        end_date = timezone.now().date()
+        try:
+            start_date = end_date - timedelta(days=int(days))
+        except OverflowError:
+            raise ValueError("days is out of range")
+
+    if start_date:
+        sales = sales.filter(sale_date__date__gte=start_date)
+    if end_date:
+        sales = sales.filter(sale_date__date__lte=end_date)
+
+    payment_method = params.get('payment_method')
+    if payment_method:
+        sales = sales.filter(payment_method=payment_method)
+
+    if params.get('completed') == '1':
+        sales = sales.filter(is_completed=True)
+
+    return sales
+
+
+def filter_order_items(params):
+    """Order date range and pending/processed status. Raises ValueError on a malformed date."""
+    items = OrderItem.objects.all()
+
+    start_date = _date_param(params, 'start_date')
+    end_date = _date_param(params, 'end_date')
+    if start_date:
+        items = items.filter(order__order_date__date__gte=start_date)
+    if end_date:
+        items = items.filter(order__order_date__date__lte=end_date)
+
+    status = params.get('status')
+    if status == 'pending':
+        items = items.filter(order__is_processed=False)
+    elif status == 'processed':
+        items = items.filter(order__is_processed=True)
+
+    return items
+
+
+def filter_expenses(params):
+    """
+    Same filters as manage_expenses: expense type and date range.
+    Raises ValueError on a malformed date.
+    """
+    expenses = Expenses.objects.all()
+
+    expense_type = params.get('type')
+    start_date = _date_param(params, 'start_date')
+    end_date = _date_param(params, 'end_date')
+
+    if expense_type:
+        expenses = expenses.filter(expenses_type=expense_type)
+    if start_date:
+        expenses = expenses.filter(expenses_date__gte=start_date)
+    if end_date:
+        expenses = expenses.filter(expenses_date__lte=end_date)
+
+    return expenses
+
+
+# --- Column definitions: (header, values_list lookup) ---
+
+SALE_COLUMNS = [
+    ('Sale Number', 'sale_number'),
+    ('Date', 'sale_date'),
+    ('Seller', 'seller__user__username'),
+    ('Product', 'products__name'),
+    ('Quantity', 'quantity'),
+    ('Amount (XAF)', 'sale_amount'),
+    ('Cost (XAF)', 'cost_amount'),
+    ('Payment Method', 'payment_method'),
+    ('Completed', 'is_completed'),
+]
+
+ORDER_ITEM_COLUMNS = [
+    ('Order Number', 'order__order_number'),
+    ('Order Date', 'order__order_date'),
+    ('Customer First Name', 'order__customer__first_name'),
+    ('Customer Last Name', 'order__customer__last_name'),
+    ('Phone', 'order__phone_number'),
+    ('City', 'order__city'),
+    ('Town', 'order__town'),
+    ('Status', 'order__status'),
+    ('Product', 'product__name'),
+    ('Quantity', 'quantity'),
+    ('Unit Price (XAF)', 'price_at_purchase'),
+    ('Unit Cost (XAF)', 'cost_at_purchase'),
+    ('Order Total (XAF)', 'order__total_amount'),
+]
+
+EXPENSE_COLUMNS = [
+    ('Expense Number', 'expenses_number'),
+    ('Date', 'expenses_date'),
+    ('Type', 'expenses_type'),
+    ('Description', 'description'),
+    ('Amount (XAF)', 'amount'),
+]
+
+
+# --- Response building ---
+
+def csv_lines(columns, queryset, excel=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the CSV document as text blocks, one block per database chunk
+    (instead of one tiny string per row).
+    """
+    writer = csv.writer(Echo())
+    header = writer.writerow([label for label, _ in columns])
+    # Excel only detects UTF-8 (accents in "Yaoundé", "Ngaoundéré") with a BOM
+    yield ('﻿' + header) if excel else header
+
+    block = []
+    lookups = [lookup for _, lookup in columns]
+    for row in iterate_in_chunks(queryset, lookups, chunk_size):
+        block.append(writer.writerow(row))
+        if len(block) >= chunk_size:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def gzip_stream(text_blocks):
+    """Compresses the text blocks on the fly into a single gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for block in text_blocks:
+        data = compressor.compress(block.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_csv_response(filename, columns, queryset, params):
+    """
+    Builds the StreamingHttpResponse for an export.
+    ?format=excel adds a BOM for Excel, ?compress=gzip returns a .csv.gz file.
+    """
+    lines = csv_lines(columns, queryset, excel=params.get('format') == 'excel')
+
+    if params.get('compress') == 'gzip':
+        response = StreamingHttpResponse(gzip_stream(lines), content_type='application/gzip')
+        filename = f"{filename}.csv.gz"
+    else:
+        response = StreamingHttpResponse(
+            (block.encode('utf-8') for block in lines),
+            content_type='text/csv; charset=utf-8'
+        )
+        filename = f"{filename}.csv"
+
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -167,7 +167,7 @@ class CustomerRegistrationForm(forms.ModelForm):
     
 # app_name/forms.py
 from django import forms
-from .models import Product, Seller, Expenses, Customer, Supplier, Category
+from .models import Product, ProductBarcode, Seller, Expenses, Customer, Supplier, Category
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 
@@ -202,10 +202,20 @@ class ProductForm(forms.ModelForm):
         })
     )
 
+    extra_barcodes = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 2,
+            'placeholder': 'One code per line'
+        }),
+        help_text="Other barcodes that should ring up this product (optional)"
+    )
+
     class Meta:
         model = Product
         # Include all fields the admin needs to manage
-        fields = ['name', 'description', 'buying_price', 'selling_price', 'unit', 'quantity', 'min_stock_level', 'image']
+        fields = ['name', 'description', 'buying_price', 'selling_price', 'unit', 'quantity', 'min_stock_level', 'barcode', 'image']
         # Apply Bootstrap's 'form-control' class for styling
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
@@ -215,6 +225,7 @@ class ProductForm(forms.ModelForm):
             'unit': forms.TextInput(attrs={'class': 'form-control'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control'}),
             'min_stock_level': forms.NumberInput(attrs={'class': 'form-control'}),
+            'barcode': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Scan or type the barcode'}),
             'image': forms.FileInput(attrs={
                 'class': 'form-control',
                 'accept': 'image/*'  # Accept only image files
@@ -234,6 +245,9 @@ class ProductForm(forms.ModelForm):
             if self.instance.supplier:
                 self.fields['supplier_name'].initial = self.instance.supplier.name
                 self.fields['supplier_phone'].initial = self.instance.supplier.phone
+            self.fields['extra_barcodes'].initial = "\n".join(
+                self.instance.barcodes.values_list('code', flat=True)
+            )
         
         # Add initial stock field for new products
         if not self.instance.pk:
@@ -263,6 +277,19 @@ class ProductForm(forms.ModelForm):
             raise ValidationError("Supplier name is required when phone number is provided.")
         return supplier_name
     
+    def clean_barcode(self):
+        # Empty codes are stored as NULL so the unique index allows many of them
+        return (self.cleaned_data.get('barcode') or '').strip() or None
+
+    def clean_extra_barcodes(self):
+        codes = []
+        for code in self.cleaned_data.get('extra_barcodes', '').split():
+            if len(code) > 64:
+                raise ValidationError(f"Barcode '{code}' is too long (max 64 characters).")
+            if code not in codes:
+                codes.append(code)
+        return codes
+
     def clean(self):
         cleaned_data = super().clean()
         buying_price = cleaned_data.get('buying_price')
@@ -273,17 +300,33 @@ class ProductForm(forms.ModelForm):
             if selling_price <= buying_price:
                 raise ValidationError("Selling price must be higher than buying price for profitability.")
         
-        # Validate barcode uniqueness
+        # Validate barcode uniqueness (main codes and extra codes share one namespace)
         barcode = cleaned_data.get('barcode')
-        if barcode:
-            existing_product = Product.objects.filter(barcode=barcode)
+        extra_barcodes = cleaned_data.get('extra_barcodes') or []
+        codes = ([barcode] if barcode else []) + extra_barcodes
+        if barcode and barcode in extra_barcodes:
+            raise forms.ValidationError(f"Barcode '{barcode}' is listed twice.")
+        if codes:
+            existing_product = Product.objects.filter(barcode__in=codes)
+            existing_extra = ProductBarcode.objects.filter(code__in=codes)
             if self.instance.pk:
                 existing_product = existing_product.exclude(pk=self.instance.pk)
+                existing_extra = existing_extra.exclude(product_id=self.instance.pk)
             
-            if existing_product.exists():
-                raise forms.ValidationError(f"A product with barcode '{barcode}' already exists.")
+            taken = list(existing_product.values_list('barcode', flat=True)) + list(existing_extra.values_list('code', flat=True))
+            if taken:
+                raise forms.ValidationError(f"A product with barcode '{taken[0]}' already exists.")
         
         return cleaned_data
+
+    def save_barcodes(self, product):
+        """Replaces the product's extra barcodes (call after the product is saved)."""
+        codes = self.cleaned_data.get('extra_barcodes') or []
+        product.barcodes.exclude(code__in=codes).delete()
+        existing = set(product.barcodes.values_list('code', flat=True))
+        ProductBarcode.objects.bulk_create([
+            ProductBarcode(product=product, code=code) for code in codes if code not in existing
+        ])
     
     def save(self, commit=True):
         # Get or create category
@@ -315,6 +358,39 @@ class ProductForm(forms.ModelForm):
         
         return super().save(commit)     
 
+class ProductImportForm(ProductForm):
+    """
+    Validates one CSV row with the same rules as ProductForm (no image upload).
+    """
+    class Meta(ProductForm.Meta):
+        fields = ['name', 'description', 'buying_price', 'selling_price', 'unit', 'quantity', 'min_stock_level']
+
+class ProductImportUploadForm(forms.Form):
+    STOCK_MODES = [
+        ('add', 'Add quantity to current stock (supplier delivery)'),
+        ('set', 'Replace current stock with quantity (stock count)'),
+    ]
+
+    csv_file = forms.FileField(
+        widget=forms.FileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,text/csv'
+        }),
+        help_text="Columns: name, category, supplier, buying_price, selling_price, unit, quantity "
+                  "(optional: description, supplier_phone, min_stock_level, image)"
+    )
+    stock_mode = forms.ChoiceField(
+        choices=STOCK_MODES,
+        initial='add',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        help_text="Validate the file and show what would change without saving anything."
+    )
+
 class ExpensesForm(forms.ModelForm):
     class Meta:
         model = Expenses
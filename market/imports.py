@@ -0,0 +1,262 @@
+"""
+Bulk product import and stock update from a supplier CSV.
+
+The file is read line by line and handled in batches. For each batch:
+  1. every row is validated with ProductImportForm (same rules as ProductForm),
+  2. categories and suppliers are resolved once per distinct name,
+  3. existing products (matched by name, ignoring case) are updated with bulk_update and
+     new ones are inserted with bulk_create.
+A dry run does all of the above inside a transaction that is rolled back.
+"""
+import codecs
+import csv
+import time
+from contextlib import nullcontext
+
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import scan, stock, typeahead
+from .forms import ProductImportForm
+from .models import Product, Category, Supplier
+
+IMPORT_BATCH_SIZE = 500
+
+# Product fields refreshed on existing rows (quantity is handled by stock_mode)
+UPDATE_FIELDS = [
+    'description', 'buying_price', 'selling_price', 'unit',
+    'min_stock_level', 'category', 'supplier', 'quantity', 'updated_at',
+]
+
+
+class ImportReport:
+    """Counters, per-row errors and timing of one import run."""
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.categories_created = 0
+        self.suppliers_created = 0
+        self.errors = []  # (line number, message)
+        self.seconds = 0.0
+
+    def add_error(self, line_number, message):
+        self.errors.append((line_number, message))
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.seconds) if self.seconds else 0
+
+    def summary(self):
+        prefix = "[DRY RUN] " if self.dry_run else ""
+        return (
+            f"{prefix}{self.rows} rows in {self.seconds:.2f}s ({self.rows_per_second} rows/s): "
+            f"{self.created} created, {self.updated} updated, {len(self.errors)} rejected, "
+            f"{self.categories_created} new categories, {self.suppliers_created} new suppliers."
+        )
+
+
+class UnreadableFile(ValueError):
+    """The CSV cannot be read past `line_number` (bad encoding or quoting)."""
+    def __init__(self, line_number, message):
+        super().__init__(message)
+        self.line_number = line_number
+
+
+def read_rows(binary_file):
+    """
+    Yields (line number, row dict) from an uploaded or opened binary CSV file,
+    one line at a time. Headers are lower-cased, values stripped.
+    Raises UnreadableFile when the rest of the file cannot be decoded or parsed.
+    """
+    reader = csv.DictReader(codecs.iterdecode(binary_file, 'utf-8-sig'))
+    try:
+        for row in reader:
+            yield reader.line_num, {
+                (key or '').strip().lower(): (value or '').strip()
+                for key, value in row.items()
+            }
+    except UnicodeDecodeError:
+        raise UnreadableFile(reader.line_num + 1, "File is not UTF-8 text; save it as CSV UTF-8 and retry.")
+    except csv.Error as e:
+        raise UnreadableFile(reader.line_num, f"Malformed CSV: {e}")
+
+
+def _form_data(row):
+    return {
+        'name': row.get('name', ''),
+        'description': row.get('description', ''),
+        'category_name': row.get('category', ''),
+        'supplier_name': row.get('supplier', ''),
+        'supplier_phone': row.get('supplier_phone', ''),
+        'buying_price': row.get('buying_price', ''),
+        'selling_price': row.get('selling_price', ''),
+        'unit': row.get('unit') or 'piece',
+        'quantity': row.get('quantity') or 0,
+        'min_stock_level': row.get('min_stock_level') or 10,
+    }
+
+
+def _by_name(model, keys):
+    """Rows of `model` whose name, ignoring case, is one of the lower-cased `keys`."""
+    return model.objects.annotate(name_key=Lower('name')).filter(name_key__in=list(keys))
+
+
+def _resolve(model, names, cache, defaults_for):
+    """
+    Maps lower-cased names to ids, creating the missing rows with one
+    bulk_create. Returns how many rows were created.
+    """
+    missing = {key: name for key, name in names.items() if key not in cache}
+    if not missing:
+        return 0
+
+    for pk, key in _by_name(model, missing).order_by('id').values_list('id', 'name_key'):
+        cache.setdefault(key, pk)
+
+    to_create = {key: name for key, name in missing.items() if key not in cache}
+    if to_create:
+        model.objects.bulk_create([model(name=name, **defaults_for(name)) for name in to_create.values()])
+        # MySQL does not return primary keys from bulk_create, so read them back
+        for pk, key in _by_name(model, to_create).order_by('id').values_list('id', 'name_key'):
+            cache.setdefault(key, pk)
+    return len(to_create)
+
+
+def _import_batch(batch, report, stock_mode, categories, suppliers):
+    # 1. Validate every row; duplicated names inside the batch are merged
+    valid = {}
+    for line_number, row in batch:
+        form = ProductImportForm(data=_form_data(row))
+        if not form.is_valid():
+            messages = []
+            for field, errors in form.errors.items():
+                label = 'row' if field == '__all__' else field
+                messages.extend(f"{label}: {error}" for error in errors)
+            report.add_error(line_number, "; ".join(messages))
+            continue
+
+        data = form.cleaned_data
+        data['image'] = row.get('image', '')
+        key = data['name'].lower()
+        if key in valid and stock_mode == 'add':
+            data['quantity'] += valid[key]['quantity']
+        valid[key] = data
+
+    if not valid:
+        return
+
+    # 2. One lookup (and at most one bulk insert) per model for the whole batch
+    category_names = {d['category_name'].lower(): d['category_name'] for d in valid.values()}
+    supplier_phones = {d['supplier_name'].lower(): d.get('supplier_phone', '') for d in valid.values()}
+    supplier_names = {d['supplier_name'].lower(): d['supplier_name'] for d in valid.values()}
+
+    report.categories_created += _resolve(
+        Category, category_names, categories,
+        lambda name: {'description': f'Category for {name}'}
+    )
+    report.suppliers_created += _resolve(
+        Supplier, supplier_names, suppliers,
+        lambda name: {
+            'phone': supplier_phones.get(name.lower(), ''),
+            'contact_person': 'Not specified',
+            'address': 'Address not provided',
+            'city': 'Douala',
+        }
+    )
+
+    # 3. Upsert products, matched by name
+    existing = {}
+    for product in _by_name(Product, valid).select_for_update().order_by('id'):
+        existing.setdefault(product.name_key, product)
+
+    now = timezone.now()
+    to_create, to_update, new_images, movements = [], [], [], []
+    movement_kind = 'restock' if stock_mode == 'add' else 'adjustment'
+    for key, data in valid.items():
+        product = existing.get(key)
+        if product is None:
+            product = Product(name=data['name'], image=data['image'] or '', quantity=data['quantity'])
+            to_create.append(product)
+        else:
+            old_quantity = product.quantity
+            if stock_mode == 'add':
+                product.quantity += data['quantity']
+            else:
+                product.quantity = data['quantity']
+            movements.append(stock.movement(product, movement_kind, product.quantity - old_quantity, 'csv import'))
+            product.updated_at = now
+            if data['image']:
+                product.image = data['image']
+                new_images.append(product)
+            to_update.append(product)
+
+        if data['description']:
+            product.description = data['description']
+        product.buying_price = data['buying_price']
+        product.selling_price = data['selling_price']
+        product.unit = data['unit']
+        product.min_stock_level = data['min_stock_level']
+        product.category_id = categories[data['category_name'].lower()]
+        product.supplier_id = suppliers[data['supplier_name'].lower()]
+
+    if to_create:
+        Product.objects.bulk_create(to_create)
+        # MySQL does not return primary keys from bulk_create, so read them back
+        if any(product.pk is None for product in to_create):
+            new_ids = dict(_by_name(
+                Product, [product.name.lower() for product in to_create]
+            ).order_by('id').values_list('name_key', 'id'))
+            for product in to_create:
+                product.pk = new_ids[product.name.lower()]
+        movements += [stock.movement(product, 'opening', product.quantity, 'csv import') for product in to_create]
+    if to_update:
+        Product.objects.bulk_update(to_update, UPDATE_FIELDS)
+    if new_images:
+        Product.objects.bulk_update(new_images, ['image'])
+    stock.record(movements)
+    if to_update:
+        scan.invalidate_on_commit(product.id for product in to_update)
+    if to_create or to_update:
+        transaction.on_commit(typeahead.invalidate)
+
+    report.created += len(to_create)
+    report.updated += len(to_update)
+
+
+def import_products(rows, stock_mode='add', dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports (line number, row) pairs as produced by read_rows().
+    stock_mode 'add' adds the CSV quantity to existing stock (supplier delivery),
+    'set' overwrites it (stock count). Returns an ImportReport.
+    """
+    report = ImportReport(dry_run=dry_run)
+    categories, suppliers = {}, {}
+    started = time.perf_counter()
+
+    # A dry run keeps everything in one transaction and throws it away at the
+    # end; a real run commits batch by batch so locks are held briefly.
+    with transaction.atomic() if dry_run else nullcontext():
+        batch = []
+        try:
+            for line_number, row in rows:
+                report.rows += 1
+                batch.append((line_number, row))
+                if len(batch) >= batch_size:
+                    with transaction.atomic():
+                        _import_batch(batch, report, stock_mode, categories, suppliers)
+                    batch = []
+        except UnreadableFile as e:
+            # The rows read before the bad line are still imported
+            report.add_error(e.line_number, str(e))
+        if batch:
+            with transaction.atomic():
+                _import_batch(batch, report, stock_mode, categories, suppliers)
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    report.seconds = time.perf_counter() - started
+    return report
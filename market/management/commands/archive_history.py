@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from market import coldstore
+
+
+def _month(value):
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        if not 1 <= month <= 12:
+            raise ValueError
+    except ValueError:
+        raise CommandError(f"Invalid month '{value}', expected YYYY-MM.")
+    return year, month
+
+
+class Command(BaseCommand):
+    help = "Moves closed months of sales and processed orders to cold storage (or restores one)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-months', type=int,
+                            help="Archive months that ended this long ago (default: COLD_STORAGE_AFTER_MONTHS)")
+        parser.add_argument('--month', help="Archive only this month (YYYY-MM)")
+        parser.add_argument('--restore', help="Load an archived month (YYYY-MM) back into the database")
+        parser.add_argument('--dry-run', action='store_true', help="List the months without archiving them")
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            year, month = _month(options['restore'])
+            try:
+                coldstore.restore_month(year, month)
+            except coldstore.ColdStorageError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"{year:04d}-{month:02d} restored."))
+            return
+
+        if options['month']:
+            months = [_month(options['month'])]
+        else:
+            archived = set(coldstore.archived_months())
+            months = [m for m in coldstore.closed_months(options['older_than_months']) if m not in archived]
+        if not months:
+            self.stdout.write("Nothing to archive.")
+            return
+
+        for year, month in months:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {year:04d}-{month:02d}")
+                continue
+            try:
+                manifest = coldstore.archive_month(year, month)
+            except coldstore.ColdStorageError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f"{manifest['month']}: {manifest['sales']} sales, {manifest['orders']} orders, "
+                f"{manifest['items']} order items archived"
+            )
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{len(months)} month(s) moved to cold storage."))
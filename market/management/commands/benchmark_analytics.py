@@ -0,0 +1,166 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from market import analytics, coldstore
+from market.models import Sale, Seller, Product, Expenses, OrderItem
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the vectorized monthly reports against the same figures computed with one ORM "
+        "aggregate per month/category, on the current data. With --synthetic, generated sales are "
+        "inserted first in a transaction that is rolled back; that holds locks on the Sale table "
+        "for the whole run, so only use it on a copy of the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--synthetic', action='store_true',
+            help="Insert --rows generated sales first (rolled back at the end; not on a live database)",
+        )
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Synthetic sales to insert (default 1,000,000)")
+        parser.add_argument('--months', type=int, default=24, help="Months the sales are spread over (default 24)")
+
+    def handle(self, *args, **options):
+        months = options['months']
+        if months < 2:
+            raise CommandError("--months must be at least 2.")
+        last_month = analytics.month_of(timezone.localdate())
+        first_month = last_month - months + 1
+        if any(analytics.month_index(y, m) >= first_month - 12 for y, m in coldstore.archived_months()):
+            self.stdout.write(self.style.WARNING(
+                "Some of these months are in cold storage: only the vectorized reports include them."
+            ))
+
+        with transaction.atomic():
+            if options['synthetic']:
+                self._insert(options['rows'], first_month, last_month)
+            self._compare(first_month, last_month, months)
+            transaction.set_rollback(True)
+
+    # --- Data ---
+
+    def _insert(self, rows, first_month, last_month):
+        sellers = list(Seller.objects.values_list('id', flat=True))
+        products = list(Product.objects.values_list('id', 'category_id', 'buying_price', 'selling_price'))
+        if not sellers or not products:
+            raise CommandError("Needs at least one seller and one product to generate sales.")
+
+        started = time.perf_counter()
+        first_pk = Sale.objects.aggregate(last=Max('pk'))['last'] or 0
+        for offset in range(0, rows, BATCH):
+            batch = []
+            for _ in range(min(BATCH, rows - offset)):
+                product_id, category_id, buying, selling = random.choice(products)
+                quantity = random.randint(1, 5)
+                batch.append(Sale(
+                    seller_id=random.choice(sellers), products_id=product_id, category_id=category_id,
+                    quantity=quantity, sale_amount=(selling or Decimal('1')) * quantity,
+                    cost_amount=(buying or Decimal('0')) * quantity * Decimal(random.uniform(0.9, 1.1)).quantize(Decimal('0.01')),
+                    is_completed=random.random() > 0.05,
+                ))
+            Sale.objects.bulk_create(batch)
+        new_pks = list(Sale.objects.filter(pk__gt=first_pk).order_by('pk').values_list('pk', flat=True))
+
+        # sale_date is auto_now_add: spread the new rows over the period, one UPDATE per day
+        start = analytics.month_start(first_month)
+        days = (analytics.month_end(last_month) - start).days + 1
+        per_day = -(-len(new_pks) // days)
+        for day in range(days):
+            block = new_pks[day * per_day:(day + 1) * per_day]
+            if not block:
+                break
+            moment = timezone.make_aware(datetime.combine(start + timedelta(days=day), datetime.min.time()) + timedelta(hours=12))
+            Sale.objects.filter(pk__gte=block[0], pk__lte=block[-1]).update(sale_date=moment)
+        self.stdout.write(f"Inserted {len(new_pks):,} sales over {days} days in {time.perf_counter() - started:.1f}s")
+
+    # --- ORM-only equivalents ---
+
+    def _orm_overview(self, first_month, last_month):
+        load_from = first_month - 12
+        revenue, cost, spent, online, categories = [], [], [], [], {}
+        for month in range(load_from, last_month + 1):
+            period = [analytics.month_start(month), analytics.month_end(month)]
+            sales = Sale.objects.filter(is_completed=True, sale_date__date__range=period)
+            totals = sales.aggregate(revenue=Sum('sale_amount'), cost=Sum('cost_amount'))
+            revenue.append(float(totals['revenue'] or 0))
+            cost.append(float(totals['cost'] or 0))
+            spent.append(float(Expenses.objects.filter(expenses_date__range=period).aggregate(t=Sum('amount'))['t'] or 0))
+            items = OrderItem.objects.filter(order__is_processed=True, order__order_date__date__range=period)
+            online.append(float(sum(i.price_at_purchase * i.quantity for i in items.only('price_at_purchase', 'quantity'))))
+            for row in sales.values('category_id').annotate(total=Sum('sale_amount')).order_by():
+                categories.setdefault(row['category_id'], {})[month] = float(row['total'] or 0)
+        return np.array(revenue), np.array(cost), np.array(spent), np.array(online), categories
+
+    def _orm_margins(self, month, base_month):
+        margins = {}
+        for which in (base_month, month):
+            period = [analytics.month_start(which), analytics.month_end(which)]
+            rows = (
+                Sale.objects.filter(is_completed=True, sale_date__date__range=period)
+                .values('products_id').annotate(revenue=Sum('sale_amount'), cost=Sum('cost_amount')).order_by()
+            )
+            for row in rows:
+                revenue, cost = float(row['revenue'] or 0), float(row['cost'] or 0)
+                if revenue:
+                    margins.setdefault(row['products_id'], {})[which] = (revenue - cost) * 100 / revenue
+        return {
+            product: values[month] - values[base_month]
+            for product, values in margins.items() if len(values) == 2
+        }
+
+    # --- Timing ---
+
+    def _timed(self, label, compute):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = compute()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {label:<28} {elapsed:8.3f}s  {len(queries):6d} queries")
+        return result, elapsed
+
+    def _compare(self, first_month, last_month, months):
+        self.stdout.write(f"Monthly overview, {months} months (+12 for YoY):")
+        report, fast = self._timed("vectorized", lambda: analytics.monthly_overview(last_month, months))
+        (revenue, cost, spent, online, categories), slow = self._timed(
+            "ORM per month/category", lambda: self._orm_overview(first_month, last_month)
+        )
+        shown = slice(12, None)
+        matches = all([
+            np.allclose([row['revenue'] for row in report['rows']], revenue[shown], atol=0.1),
+            np.allclose([row['cost'] for row in report['rows']], cost[shown], atol=0.1),
+            np.allclose([row['expenses'] for row in report['rows']], spent[shown], atol=0.1),
+            np.allclose([row['online'] for row in report['rows']], online[shown], atol=0.1),
+            np.isclose(
+                sum(row['total'] for row in report['categories']),
+                sum(v for per_month in categories.values() for m, v in per_month.items() if m >= first_month),
+                atol=len(report['categories']),
+            ),
+        ])
+        self._summary(fast, slow, matches)
+
+        self.stdout.write("Margin changes by product (YoY):")
+        margins, fast = self._timed("vectorized", lambda: analytics.margin_changes(last_month, 'yoy', limit=None))
+        expected, slow = self._timed("ORM per month", lambda: self._orm_margins(last_month, last_month - 12))
+        matches = margins['compared'] == len(expected) and np.allclose(
+            sorted(row['change'] for row in margins['products']), sorted(expected.values()), atol=0.1,
+        )
+        self._summary(fast, slow, matches)
+
+    def _summary(self, fast, slow, matches):
+        speedup = slow / fast if fast else float('inf')
+        if matches:
+            self.stdout.write(self.style.SUCCESS(f"  same figures, {speedup:.1f}x faster"))
+        else:
+            self.stdout.write(self.style.ERROR(f"  FIGURES DIFFER ({speedup:.1f}x faster)"))
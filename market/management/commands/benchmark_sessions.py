@@ -0,0 +1,89 @@
+import time
+from importlib import import_module
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from market import sessions
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+    'market.sessions',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a shopping workload against the stock session engines and market.sessions and "
+        "counts the queries on django_session. Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--visitors', type=int, default=200)
+        parser.add_argument('--page-views', type=int, default=10, help="Views per visitor that mark the session modified without changing it")
+        parser.add_argument('--burst', type=int, default=5, help="Quick successive real changes per visitor")
+        parser.add_argument(
+            '--assume-shared-cache', action='store_true',
+            help="Coalesce even though the session cache is process-local (this command is one process)",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{options['visitors']} visitors: login, {options['page_views']} page views, "
+                          f"{options['burst']} quick changes each")
+        shared = options['assume_shared_cache'] or sessions.coalescing()
+        self.stdout.write(f"market.sessions coalescing: {'on' if shared else 'off (process-local session cache)'}")
+        self.stdout.write(f"  {'engine':<45} {'writes':>7} {'reads':>7} {'seconds':>8} {'stale rows':>10}")
+        for engine in ENGINES:
+            with transaction.atomic(), mock.patch.object(sessions, 'coalescing', return_value=shared):
+                caches[settings.SESSION_CACHE_ALIAS].clear()
+                writes, reads, elapsed, stale = self._replay(import_module(engine).SessionStore, options)
+                transaction.set_rollback(True)
+            self.stdout.write(f"  {engine:<45} {writes:>7} {reads:>7} {elapsed:>8.2f} {stale:>10}")
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+
+    def _replay(self, store_class, options):
+        def request(key, change):
+            # What SessionMiddleware does around one request
+            store = store_class(key)
+            change(store)
+            if store.modified:
+                store.save()
+            return store.session_key
+
+        counts = {'writes': 0, 'reads': 0}
+        keys = []
+
+        def count(execute, sql, params, many, context):
+            if 'django_session' in sql:
+                counts['reads' if sql.lstrip().upper().startswith('SELECT') else 'writes'] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            for visitor in range(options['visitors']):
+                login = store_class()
+                login.cycle_key()
+                login.update({SESSION_KEY: str(visitor), BACKEND_SESSION_KEY: 'backend', HASH_SESSION_KEY: 'hash'})
+                login.save()
+                key = login.session_key
+
+                for _ in range(options['page_views']):
+                    # e.g. the replica pin or a list re-assigned with the same value
+                    key = request(key, lambda s: s.__setitem__('chat_tasks', s.get('chat_tasks', [])))
+                for n in range(options['burst']):
+                    key = request(key, lambda s: s.__setitem__('chat_tasks', s.get('chat_tasks', []) + [n]))
+                keys.append(key)
+            sessions.flush_dirty(force=True)
+            elapsed = time.perf_counter() - started
+
+        # Rows that do not hold the visitor's last change (lost with an evicted cache entry)
+        expected = list(range(options['burst']))
+        rows = Session.objects.filter(session_key__in=keys)
+        stale = len(keys) - sum(1 for row in rows if row.get_decoded().get('chat_tasks', []) == expected)
+        return counts['writes'], counts['reads'], elapsed, stale
@@ -0,0 +1,89 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from market.catalogue import FRAGMENT_CACHE
+from market.models import Product
+
+
+def _templates(cached_loader):
+    templates = [dict(engine, OPTIONS=dict(engine['OPTIONS'])) for engine in settings.TEMPLATES]
+    loaders = settings.TEMPLATE_LOADERS
+    templates[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', loaders)] if cached_loader else loaders
+    return templates
+
+
+def _caches(fragments):
+    caches = dict(settings.CACHES)
+    if not fragments:
+        caches[FRAGMENT_CACHE] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    return caches
+
+
+# (label, template loader cached, fragment cache on)
+MODES = [
+    ('before', False, False),
+    ('after', True, True),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the storefront pages without the cached template loader and fragment caches "
+        "(before) and with them (after). Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Requests per page and mode")
+        parser.add_argument('--username', help="Log this user in first (default: anonymous visitor)")
+
+    def handle(self, *args, **options):
+        product = Product.objects.order_by('id').first()
+        pages = ['home', 'shop', 'about', 'contact']
+        urls = [reverse(name) for name in pages]
+        if product is not None:
+            pages.append('product_details')
+            urls.append(reverse('product_details', args=[product.pk]))
+
+        self.stdout.write(f"{options['requests']} requests per page, as {options['username'] or 'an anonymous visitor'}")
+        self.stdout.write(f"  {'page':<17}" + ''.join(f" {label + ' ms':>10} {'queries':>8}" for label, *_ in MODES))
+        results = {page: [] for page in pages}
+        with transaction.atomic():
+            for label, cached_loader, fragments in MODES:
+                with override_settings(TEMPLATES=_templates(cached_loader), CACHES=_caches(fragments)):
+                    client = Client()
+                    if options['username']:
+                        try:
+                            client.force_login(User.objects.get(username=options['username']))
+                        except User.DoesNotExist:
+                            raise CommandError(f"No user {options['username']!r}")
+                    for page, url in zip(pages, urls):
+                        results[page].append(self._time(client, url, options['requests']))
+            transaction.set_rollback(True)
+
+        for page in pages:
+            self.stdout.write(f"  {page:<17}" + ''.join(f" {ms:>10.2f} {queries:>8}" for ms, queries in results[page]))
+
+    def _time(self, client, url, requests):
+        """(mean ms per request, queries per request) after one warm-up request."""
+        client.get(url)
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f"{url} answered {response.status_code}")
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000 / requests, len(queries) // requests
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from market.models import Seller
+from market.reporting import build_reports
+
+
+class Command(BaseCommand):
+    help = "Builds (or backfills) daily SalesReport rows for a date range in one grouped pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help="First day, YYYY-MM-DD (default: 30 days ago)")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day, YYYY-MM-DD (default: today)")
+        parser.add_argument('--seller', help="Username recorded as generated_by on new reports")
+        parser.add_argument('--force', action='store_true', help="Recompute days whose report looks up to date")
+
+    def handle(self, *args, **options):
+        end = options['end'] or date.today()
+        start = options['start'] or end - timedelta(days=30)
+        if start > end:
+            raise CommandError("--start must be before --end")
+
+        sellers = Seller.objects.select_related('user')
+        if options['seller']:
+            seller = sellers.filter(user__username=options['seller']).first()
+        else:
+            seller = sellers.filter(is_active=True).order_by('id').first()
+        if seller is None:
+            raise CommandError("No seller found to record as the report author.")
+
+        written = build_reports(start, end, seller, force=options['force'])
+        for day in written:
+            self.stdout.write(f"  {day}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(written)} daily reports written for {start} → {end}."
+        ))
@@ -0,0 +1,36 @@
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from market import documents
+
+
+class Command(BaseCommand):
+    help = "Pre-generates the PDF of every daily sales report of a month, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help="Month to render, as YYYY-MM")
+
+    def handle(self, *args, **options):
+        try:
+            month = datetime.strptime(options['month'], '%Y-%m')
+        except ValueError:
+            raise CommandError("--month must look like 2026-01")
+
+        reports = list(documents.reports_for_month(month.year, month.month))
+        if not reports:
+            self.stdout.write(f"No sales reports for {options['month']}.")
+            return
+
+        started = time.perf_counter()
+        paths = documents.generate_reports(reports)
+        elapsed = time.perf_counter() - started
+
+        for report, path in zip(reports, paths):
+            self.stdout.write(f"{report.report_date}  {path}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(paths)} reports rendered in {elapsed:.2f}s "
+            f"with up to {settings.DOCUMENT_WORKERS} workers."
+        ))
@@ -0,0 +1,59 @@
+import io
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from market.imports import import_products, read_rows, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Bulk import products / update stock from a CSV file (same format as the dashboard upload)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', nargs='?', help="Path to the CSV file")
+        parser.add_argument('--stock-mode', choices=['add', 'set'], default='add')
+        parser.add_argument('--dry-run', action='store_true', help="Validate and roll back")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--benchmark', type=int, metavar='ROWS',
+            help="Generate a synthetic CSV with ROWS rows and import it as a dry run"
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            source = self.synthetic_csv(options['benchmark'])
+            options['dry_run'] = True
+        elif options['csv_path']:
+            try:
+                source = open(options['csv_path'], 'rb')
+            except OSError as e:
+                raise CommandError(str(e))
+        else:
+            raise CommandError("Give a CSV path or --benchmark ROWS.")
+
+        with source:
+            report = import_products(
+                read_rows(source),
+                stock_mode=options['stock_mode'],
+                dry_run=options['dry_run'],
+                batch_size=options['batch_size'],
+            )
+
+        for line_number, message in report.errors[:50]:
+            self.stderr.write(f"line {line_number}: {message}")
+        if len(report.errors) > 50:
+            self.stderr.write(f"... and {len(report.errors) - 50} more rejected rows")
+        self.stdout.write(self.style.SUCCESS(report.summary()))
+
+    def synthetic_csv(self, rows):
+        """Supplier-delivery shaped file: ~1% invalid rows, 20 categories, 50 suppliers."""
+        out = io.StringIO()
+        out.write("name,category,supplier,buying_price,selling_price,unit,quantity\n")
+        for i in range(rows):
+            buying = random.randint(100, 5000)
+            selling = buying + random.randint(50, 1000) if i % 100 else buying - 1
+            out.write(
+                f"Product {i},Category {i % 20},Supplier {i % 50},"
+                f"{buying},{selling},piece,{random.randint(1, 200)}\n"
+            )
+        return io.BytesIO(out.getvalue().encode('utf-8'))
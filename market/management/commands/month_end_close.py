@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from market import closing
+from market.management.commands.archive_history import _month
+
+
+class Command(BaseCommand):
+    help = (
+        "Closes a month: seller statements, category P&L, expense summary and inventory valuation, "
+        "computed in parallel. Rerun after an interruption to resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Month to close, YYYY-MM (default: last month)")
+        parser.add_argument('--workers', type=int, help="Worker processes (default: CLOSE_WORKERS)")
+        parser.add_argument('--restart', action='store_true', help="Discard finished partitions and recompute everything")
+
+    def handle(self, *args, **options):
+        if options['month']:
+            year, month = _month(options['month'])
+        else:
+            previous = timezone.localdate().replace(day=1) - timedelta(days=1)
+            year, month = previous.year, previous.month
+
+        try:
+            close = closing.plan(year, month, restart=options['restart'])
+            if close.status == 'done':
+                self.stdout.write(f"{year:04d}-{month:02d} is already closed (use --restart to recompute).")
+                return
+            remaining = close.partitions - close.finished_partitions
+            self.stdout.write(f"Closing {year:04d}-{month:02d}: {remaining} of {close.partitions} partitions to run")
+            close = closing.close_month(year, month, workers=options['workers'], log=self.stdout.write)
+        except closing.ClosingError as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            raise CommandError("Interrupted: finished partitions are kept, run the command again to resume.")
+
+        self.stdout.write(
+            f"Revenue {close.total_revenue}, cost {close.total_cost}, expenses {close.total_expenses}, "
+            f"stock at cost {close.inventory_value}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{year:04d}-{month:02d} closed."))
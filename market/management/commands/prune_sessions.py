@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from market import sessions
+
+
+class Command(BaseCommand):
+    help = "Writes pending session changes to the database, then deletes expired sessions in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=sessions.PRUNE_BATCH, help="Sessions per DELETE")
+
+    def handle(self, *args, **options):
+        deleted = sessions.prune(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} expired sessions deleted."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from market import purge
+from market.models import PurgeJob
+
+
+class Command(BaseCommand):
+    help = "Deletes all sales, sales reports or orders in small primary-key batches (optionally archiving them first)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=sorted(purge.TARGETS))
+        parser.add_argument('--archive', action='store_true', help="Write the rows to a gzip JSON-lines fixture first")
+        parser.add_argument('--batch-size', type=int, help="Rows per DELETE (default: PURGE_BATCH_SIZE)")
+        parser.add_argument('--yes', action='store_true', help="Do not ask for confirmation")
+
+    def handle(self, *args, **options):
+        target = options['target']
+        if not options['yes']:
+            answer = input(f"Delete ALL {target}? This cannot be undone. Type 'yes' to continue: ")
+            if answer.strip().lower() != 'yes':
+                raise CommandError("Aborted.")
+
+        def progress(job):
+            self.stdout.write(f"  {job.deleted}/{job.total} ({job.percent}%)")
+
+        job = PurgeJob.objects.create(target=target)
+        purge.run(job, batch_size=options['batch_size'], archive=options['archive'], progress=progress)
+
+        self.stdout.write(self.style.SUCCESS(f"{job.deleted} {target} deleted."))
+        if job.archive_path:
+            self.stdout.write(f"Archive: {job.archive_path} (restore with: manage.py loaddata {job.archive_path})")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from market.stock import reconcile
+
+
+class Command(BaseCommand):
+    help = "Checks every product's stock ledger total against its on-hand quantity in one pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Record a correction movement for each mismatch")
+        parser.add_argument('--fail', action='store_true', help="Exit with an error when mismatches are found")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mismatches = reconcile(fix=options['fix'])
+
+        for product_id, name, on_hand, ledger in mismatches:
+            self.stdout.write(f"  #{product_id} {name}: on hand {on_hand}, ledger {ledger} ({on_hand - ledger:+d})")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Ledger matches on-hand stock for every product."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"{len(mismatches)} corrections recorded."))
+        elif options['fail']:
+            raise CommandError(f"{len(mismatches)} products do not match their ledger.")
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(mismatches)} products do not match their ledger."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from market.watchlist import refresh
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the low-stock watchlist (velocity, days to stockout, reorder quantities) for every product."
+
+    def handle(self, *args, **options):
+        watched = refresh()
+        self.stdout.write(self.style.SUCCESS(f"{watched} products on the low-stock watchlist."))
@@ -0,0 +1,29 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from market import taskqueue
+
+
+class Command(BaseCommand):
+    help = "Runs queued background tasks (uploads, reports, chatbot replies, periodic upkeep)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Tasks run at once (default: TASK_WORKER_CONCURRENCY)")
+        parser.add_argument('--processes', action='store_true', help="Use a process pool instead of threads")
+        parser.add_argument('--burst', action='store_true', help="Exit once no task is due")
+
+    def handle(self, *args, **options):
+        worker = taskqueue.Worker(concurrency=options['concurrency'], processes=options['processes'])
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping after the running tasks finish...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        pool = 'processes' if options['processes'] else 'threads'
+        self.stdout.write(f"Worker {worker.name}: {worker.concurrency} {pool}, {len(taskqueue.registry)} task types")
+        worker.run(burst=options['burst'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS("Worker stopped."))
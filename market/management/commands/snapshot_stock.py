@@ -0,0 +1,16 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from market.stock import build_snapshots
+
+
+class Command(BaseCommand):
+    help = "Writes daily stock snapshots for every day since the last one (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', type=date.fromisoformat, help="Last day to snapshot, YYYY-MM-DD (default: yesterday)")
+
+    def handle(self, *args, **options):
+        written = build_snapshots(until=options['until'])
+        self.stdout.write(self.style.SUCCESS(f"{written} stock snapshots written."))
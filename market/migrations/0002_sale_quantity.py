@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-19 05:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    # Existing stock enters the ledger as one opening movement per product
+    Product = apps.get_model('market', 'Product')
+    StockMovement = apps.get_model('market', 'StockMovement')
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=pid, kind='opening', quantity_change=quantity, reference='ledger start')
+        for pid, quantity in Product.objects.exclude(quantity=0).values_list('id', 'quantity').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0005_product_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(choices=[('opening', 'Opening Balance'), ('sale', 'Sale'), ('order', 'Order Fulfilment'), ('restock', 'Restock'), ('adjustment', 'Manual Adjustment'), ('correction', 'Reconciliation Correction')], max_length=20)),
+                ('quantity_change', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='market.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='movement_product_idx'), models.Index(fields=['created_at'], name='movement_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('snapshot_date', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('received', models.IntegerField(default=0)),
+                ('issued', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='market.product')),
+            ],
+            options={
+                'unique_together': {('product', 'snapshot_date')},
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 05:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0006_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quantity', models.IntegerField()),
+                ('min_stock_level', models.IntegerField()),
+                ('below_minimum', models.BooleanField(db_index=True, default=False)),
+                ('daily_velocity', models.FloatField(default=0)),
+                ('days_to_stockout', models.FloatField(blank=True, null=True)),
+                ('reorder_quantity', models.IntegerField(default=0)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_alert', to='market.product')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='market.supplier')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
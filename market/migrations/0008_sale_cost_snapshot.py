@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-19 05:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+
+BACKFILL_CHUNK = 5000
+
+
+def backfill_costs(apps, schema_editor):
+    # History predates the snapshot, so today's buying price is the best estimate
+    Product = apps.get_model('market', 'Product')
+    Sale = apps.get_model('market', 'Sale')
+    OrderItem = apps.get_model('market', 'OrderItem')
+
+    buying_price = Product.objects.filter(pk=OuterRef('products_id')).values('buying_price')[:1]
+    category = Product.objects.filter(pk=OuterRef('products_id')).values('category_id')[:1]
+    last = Sale.objects.aggregate(last=Max('id'))['last'] or 0
+    for start in range(0, last + 1, BACKFILL_CHUNK):
+        Sale.objects.filter(id__gte=start, id__lt=start + BACKFILL_CHUNK).update(
+            cost_amount=Subquery(buying_price) * F('quantity'),
+            category_id=Subquery(category),
+        )
+
+    item_price = Product.objects.filter(pk=OuterRef('product_id')).values('buying_price')[:1]
+    last = OrderItem.objects.aggregate(last=Max('id'))['last'] or 0
+    for start in range(0, last + 1, BACKFILL_CHUNK):
+        OrderItem.objects.filter(id__gte=start, id__lt=start + BACKFILL_CHUNK).update(
+            cost_at_purchase=Subquery(item_price),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0007_low_stock_watchlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='cost_at_purchase',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='market.category'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='cost_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_costs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 6.0 on 2026-10-19 05:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0010_background_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthEndClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.DateField(unique=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('partitions', models.IntegerField(default=0)),
+                ('finished_partitions', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('inventory_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('error', models.TextField(blank=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryValuation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('products', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('cost_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('retail_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='market.category')),
+                ('close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='market.monthendclose')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryProfitLoss',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gross_profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('allocated_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net_profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='market.category')),
+                ('close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_results', to='market.monthendclose')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ExpenseSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expenses_type', models.CharField(choices=[('transport', 'Transport Cost'), ('electricity', 'Electricity Bill'), ('rent', 'Rent'), ('salary', 'Salaries'), ('maintenance', 'Maintenance'), ('other', 'Other')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_summaries', to='market.monthendclose')),
+            ],
+            options={
+                'unique_together': {('close', 'expenses_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ClosePartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(choices=[('sales', 'Sales (seller x day range)'), ('expenses', 'Expenses (day range)'), ('inventory', 'Inventory (category)')], max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('params', models.JSONField(default=dict)),
+                ('done', models.BooleanField(default=False)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='work', to='market.monthendclose')),
+            ],
+            options={
+                'unique_together': {('close', 'kind', 'key')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SellerStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gross_profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transactions', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('cash_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mobile_money_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('card_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_statements', to='market.monthendclose')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='market.seller')),
+            ],
+            options={
+                'unique_together': {('close', 'seller')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+INDEX = models.Index(fields=['email'], name='auth_user_email_idx')
+
+
+def create_index(apps, schema_editor):
+    # auth_user belongs to django.contrib.auth, so its index is added here by hand
+    schema_editor.execute(INDEX.create_sql(apps.get_model('auth', 'User'), schema_editor))
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(INDEX.remove_sql(apps.get_model('auth', 'User'), schema_editor))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('market', '0012_cart'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -96,10 +97,89 @@ class Product(BaseModel):
     image = CloudinaryField('image') # Replaces models.ImageField
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
+    barcode = models.CharField(max_length=64, unique=True, null=True, blank=True)  # main EAN/UPC printed on the pack
+    
+    class Meta:
+        indexes = [
+            # Delta sync walks products in (updated_at, id) order
+            models.Index(fields=['updated_at', 'id'], name='product_sync_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
+class StockMovement(BaseModel):
+    # Append-only: every change to Product.quantity writes one row here, so the
+    # sum of quantity_change per product always equals its on-hand quantity.
+    KINDS = [
+        ('opening', 'Opening Balance'),
+        ('sale', 'Sale'),
+        ('order', 'Order Fulfilment'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Manual Adjustment'),
+        ('correction', 'Reconciliation Correction'),
+    ]
+
+    product = models.ForeignKey(Product, related_name='movements', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    quantity_change = models.IntegerField()  # negative when stock leaves
+    reference = models.CharField(max_length=100, blank=True)  # sale / order number, import file, ...
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='movement_product_idx'),
+            models.Index(fields=['created_at'], name='movement_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity_change:+d} {self.product.name}"
+
+class StockSnapshot(BaseModel):
+    # On-hand quantity at the end of a day, written for products that moved that day
+    product = models.ForeignKey(Product, related_name='snapshots', on_delete=models.CASCADE)
+    snapshot_date = models.DateField()
+    quantity = models.IntegerField()
+    received = models.IntegerField(default=0)  # units in that day
+    issued = models.IntegerField(default=0)    # units out that day
+
+    class Meta:
+        unique_together = ('product', 'snapshot_date')
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.snapshot_date}: {self.quantity}"
+
+class LowStockAlert(BaseModel):
+    # Materialized watchlist: products at/below their minimum or about to run
+    # out at their current sales velocity. Kept current by market.watchlist.
+    product = models.OneToOneField(Product, related_name='low_stock_alert', on_delete=models.CASCADE)
+    supplier = models.ForeignKey(Supplier, null=True, blank=True, on_delete=models.SET_NULL)
+    quantity = models.IntegerField()
+    min_stock_level = models.IntegerField()
+    below_minimum = models.BooleanField(default=False, db_index=True)
+    daily_velocity = models.FloatField(default=0)  # units sold per day, recent days weigh more
+    days_to_stockout = models.FloatField(null=True, blank=True)  # None when nothing sells
+    reorder_quantity = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Low stock: {self.product.name} ({self.quantity})"
+
+class ProductTombstone(BaseModel):
+    # Left behind when a product is deleted so synced clients can drop it too
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Deleted product #{self.product_id}"
+
+class ProductBarcode(BaseModel):
+    # Extra codes for the same product (new packaging, supplier labels, ...)
+    product = models.ForeignKey(Product, related_name='barcodes', on_delete=models.CASCADE)
+    code = models.CharField(max_length=64, unique=True)
+
+    def __str__(self):
+        return f"{self.code} -> {self.product.name}"
+
 class Sale(BaseModel):
     PAYMENT_METHODS = [
         ('cash', 'Cash'),
@@ -111,13 +191,30 @@ class Sale(BaseModel):
     seller = models.ForeignKey(Seller, on_delete=models.CASCADE)
     products = models.ForeignKey(Product, on_delete=models.CASCADE)
     sale_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    quantity = models.PositiveIntegerField(default=1)  # units covered by sale_amount
+    cost_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # buying cost of those units when sold
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL)  # product category when sold
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, default='cash')
     sale_date = models.DateTimeField(auto_now_add=True)
     is_completed = models.BooleanField(default=True)
+    pos_transaction = models.ForeignKey('PosTransaction', null=True, blank=True, related_name='sales', on_delete=models.SET_NULL)
     
     def __str__(self):
         return f"Sale {self.sale_number}"
 
+class PosTransaction(BaseModel):
+    # One basket rung up on a seller terminal; its lines are stored as Sale rows.
+    # The client-generated key lets terminals resend queued baskets safely.
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE)
+    payment_method = models.CharField(max_length=20, choices=Sale.PAYMENT_METHODS, default='cash')
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    recorded_at = models.DateTimeField(null=True, blank=True)  # terminal clock, for offline sales
+
+    def __str__(self):
+        return f"POS {self.idempotency_key}"
+
 class Order(models.Model):
     # This stores the "Header" - info common to all items
     order_number = models.CharField(max_length=50, unique=True)
@@ -129,6 +226,7 @@ class Order(models.Model):
     order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, default='Pending') # Pending, Processed, Shipped
     is_processed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)  # versions the cached receipt
 
 class OrderItem(models.Model):
     # This stores the "Details" - the specific products
@@ -136,6 +234,27 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_at_purchase = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # unit buying price at order time
+
+class Cart(models.Model):
+    # Keyed by the user, so lines can be written without looking the cart up first
+    user = models.OneToOneField(User, primary_key=True, related_name='cart', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Cart of {self.user}"
+
+class CartLine(models.Model):
+    cart = models.ForeignKey(Cart, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('cart', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
 
 class Credit(BaseModel):
     CREDIT_STATUS = [
@@ -230,4 +349,172 @@ class Messages(BaseModel):
     customer=models.ForeignKey(Customer, on_delete=models.CASCADE)
 
     def __str__(self):
-        return f"Messages {self.last_name}"      
\ No newline at end of file
+        return f"Messages {self.last_name}"
+
+class PurgeJob(BaseModel):
+    # Progress of a chunked purge (market.purge), polled by the admin status page
+    TARGETS = [
+        ('sales', 'All Sales'),
+        ('reports', 'All Sales Reports'),
+        ('orders', 'All Orders'),
+    ]
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    target = models.CharField(max_length=20, choices=TARGETS)
+    status = models.CharField(max_length=20, choices=STATUSES, default='pending')
+    total = models.IntegerField(default=0)
+    deleted = models.IntegerField(default=0)
+    archive_path = models.CharField(max_length=255, blank=True)  # gzip JSON-lines fixture, empty if not archived
+    error = models.TextField(blank=True)
+    started_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def percent(self):
+        return 100 if not self.total else min(100, round(self.deleted * 100 / self.total))
+
+    def __str__(self):
+        return f"Purge {self.target} ({self.status})"
+
+class BackgroundTask(BaseModel):
+    # One job of the DB-backed task queue (market.taskqueue), run by `manage.py runworker`
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100, db_index=True)  # registered task name
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0)  # higher runs first
+    status = models.CharField(max_length=20, choices=STATUSES, default='queued')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    periodic = models.BooleanField(default=False)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'], name='task_claim_idx')]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+class StagedUpload(BaseModel):
+    # A file waiting for a background task (e.g. a product image before its Cloudinary
+    # upload); kept in the database so the worker service can read it
+    name = models.CharField(max_length=255)
+    content = models.BinaryField()
+
+    def __str__(self):
+        return self.name
+
+class MonthEndClose(BaseModel):
+    # One month-end close run by `manage.py month_end_close` (market.closing)
+    STATUSES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    month = models.DateField(unique=True)  # first day of the closed month
+    status = models.CharField(max_length=20, choices=STATUSES, default='running')
+    partitions = models.IntegerField(default=0)
+    finished_partitions = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    inventory_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Close {self.month:%Y-%m} ({self.status})"
+
+class ClosePartition(BaseModel):
+    # One unit of close work; its partial aggregate is kept so an interrupted close resumes
+    KINDS = [
+        ('sales', 'Sales (seller x day range)'),
+        ('expenses', 'Expenses (day range)'),
+        ('inventory', 'Inventory (category)'),
+    ]
+
+    close = models.ForeignKey(MonthEndClose, related_name='work', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    key = models.CharField(max_length=100)  # e.g. "seller=3 days=1-8"
+    params = models.JSONField(default=dict)
+    done = models.BooleanField(default=False)
+    result = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('close', 'kind', 'key')
+
+    def __str__(self):
+        return f"{self.close} {self.kind} {self.key}"
+
+class SellerStatement(BaseModel):
+    close = models.ForeignKey(MonthEndClose, related_name='seller_statements', on_delete=models.CASCADE)
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gross_profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transactions = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    cash_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    mobile_money_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    card_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('close', 'seller')
+
+    def __str__(self):
+        return f"{self.seller} {self.close.month:%Y-%m}"
+
+class CategoryProfitLoss(BaseModel):
+    # Shop expenses are allocated to categories in proportion to their revenue
+    close = models.ForeignKey(MonthEndClose, related_name='category_results', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gross_profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    allocated_expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.category or 'Uncategorised'} {self.close.month:%Y-%m}"
+
+class ExpenseSummary(BaseModel):
+    close = models.ForeignKey(MonthEndClose, related_name='expense_summaries', on_delete=models.CASCADE)
+    expenses_type = models.CharField(max_length=20, choices=Expenses.EXPENSES_TYPES)
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('close', 'expenses_type')
+
+    def __str__(self):
+        return f"{self.get_expenses_type_display()} {self.close.month:%Y-%m}"
+
+class InventoryValuation(BaseModel):
+    # Stock on hand at the end of the closed month, valued at buying and selling price
+    close = models.ForeignKey(MonthEndClose, related_name='inventory', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL)
+    products = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    cost_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    retail_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Stock {self.category or 'Uncategorised'} {self.close.month:%Y-%m}"
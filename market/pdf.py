@@ -0,0 +1,183 @@
+"""
+PDF rendering for receipts and sales reports.
+
+Deliberately free of Django imports: these functions run inside the document
+worker processes and only receive plain data.
+"""
+import os
+
+SHIPPING_FEE = 1000
+
+
+# --- Minimal PDF writer (no third-party dependency) ---
+
+class SimplePdf:
+    """
+    Tiny PDF 1.4 writer: A4 pages with Helvetica text and horizontal rules.
+    That is all a receipt or a daily report needs.
+    """
+    WIDTH, HEIGHT = 595, 842
+    MARGIN = 50
+
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.pages.append([])
+        self.y = self.HEIGHT - self.MARGIN
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    def text(self, x, y, value, size=10, bold=False, align='left'):
+        if align == 'right':
+            # Helvetica digits are 0.556 em wide; close enough for amounts and labels
+            x -= len(str(value)) * size * 0.556
+        font = 'F2' if bold else 'F1'
+        self.pages[-1].append(f"BT /{font} {size} Tf {x:.1f} {y:.1f} Td ({self._escape(value)}) Tj ET")
+
+    def rule(self, y, x1=None, x2=None):
+        x1 = self.MARGIN if x1 is None else x1
+        x2 = self.WIDTH - self.MARGIN if x2 is None else x2
+        self.pages[-1].append(f"0.5 w {x1:.1f} {y:.1f} m {x2:.1f} {y:.1f} l S")
+
+    def line_feed(self, height=16):
+        """Moves the cursor down, starting a new page when the bottom is reached."""
+        self.y -= height
+        if self.y < self.MARGIN + 40:
+            self.new_page()
+        return self.y
+
+    def render(self):
+        # Object numbers: 1 catalog, 2 page tree, 3-4 fonts, then (page, content) pairs
+        page_ids = [5 + 2 * i for i in range(len(self.pages))]
+        objects = [
+            "<< /Type /Catalog /Pages 2 0 R >>",
+            f"<< /Type /Pages /Kids [{' '.join(f'{pid} 0 R' for pid in page_ids)}] /Count {len(page_ids)} >>",
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        ]
+        for pid, operations in zip(page_ids, self.pages):
+            stream = "\n".join(operations).encode('cp1252', errors='replace')
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.WIDTH} {self.HEIGHT}] "
+                f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {pid + 1} 0 R >>"
+            )
+            objects.append((stream, len(stream)))
+
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += f"{number} 0 obj\n".encode()
+            if isinstance(body, tuple):
+                stream, length = body
+                out += f"<< /Length {length} >>\nstream\n".encode() + stream + b"\nendstream"
+            else:
+                out += body.encode('cp1252', errors='replace')
+            out += b"\nendobj\n"
+
+        xref = len(out)
+        out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+        for offset in offsets:
+            out += f"{offset:010d} 00000 n \n".encode()
+        out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        return bytes(out)
+
+
+# --- Layouts (run inside the worker processes: plain data in, bytes out) ---
+
+def _shop_header(pdf, title):
+    left, right = pdf.MARGIN, pdf.WIDTH - pdf.MARGIN
+    pdf.text(left, pdf.y, "MOM'SHOP", size=20, bold=True)
+    pdf.text(right, pdf.y, title, size=14, bold=True, align='right')
+    for line in ("Makepe St Tropez, Douala", "+237 620 513 728", "momshop@gmail.com", "RCCM: RC/DLA/2025/B/1234"):
+        pdf.text(left, pdf.line_feed(13), line, size=9)
+    pdf.rule(pdf.line_feed(10))
+    pdf.line_feed(20)
+
+
+def build_receipt_pdf(data):
+    pdf = SimplePdf()
+    left, right = pdf.MARGIN, pdf.WIDTH - pdf.MARGIN
+    _shop_header(pdf, "OFFICIAL RECEIPT")
+
+    pdf.text(left, pdf.y, "BILLED TO:", size=9, bold=True)
+    pdf.text(right, pdf.y, "ORDER DETAILS:", size=9, bold=True, align='right')
+    pdf.text(left, pdf.line_feed(14), data['customer'], bold=True)
+    pdf.text(right, pdf.y, f"ID: #{data['order_number']}", align='right')
+    pdf.text(left, pdf.line_feed(14), f"{data['town']}, {data['city']}", size=9)
+    pdf.text(right, pdf.y, f"Date: {data['order_date']}", align='right')
+    pdf.text(left, pdf.line_feed(14), f"Tel: {data['phone']}", size=9)
+    pdf.line_feed(24)
+
+    columns = (left, left + 290, left + 390, right)
+    pdf.text(columns[0], pdf.y, "Item Description", bold=True)
+    pdf.text(columns[1], pdf.y, "Qty", bold=True)
+    pdf.text(columns[2] + 50, pdf.y, "Price", bold=True, align='right')
+    pdf.text(columns[3], pdf.y, "Subtotal", bold=True, align='right')
+    pdf.rule(pdf.line_feed(6))
+
+    for name, quantity, price, subtotal in data['items']:
+        y = pdf.line_feed(18)
+        pdf.text(columns[0], y, name if quantity else f"{name} (out of stock)")
+        pdf.text(columns[1], y, quantity)
+        pdf.text(columns[2] + 50, y, price, align='right')
+        pdf.text(columns[3], y, f"{subtotal} XAF", align='right')
+
+    y = pdf.line_feed(18)
+    pdf.text(columns[0], y, "Shipping", bold=True)
+    pdf.text(columns[3], y, f"{SHIPPING_FEE} XAF", align='right')
+    pdf.rule(pdf.line_feed(8))
+    y = pdf.line_feed(24)
+    pdf.text(columns[2] - 40, y, "Amount Paid:", size=12, bold=True)
+    pdf.text(columns[3], y, f"{data['total']} XAF", size=12, bold=True, align='right')
+
+    pdf.line_feed(40)
+    pdf.text(left, pdf.y, "1. Goods once sold are not returnable.", size=8)
+    pdf.text(left, pdf.line_feed(12), f"2. This is a system-generated receipt for Order #{data['order_number']}.", size=8)
+    return pdf.render()
+
+
+def build_report_pdf(data):
+    pdf = SimplePdf()
+    left, right = pdf.MARGIN, pdf.WIDTH - pdf.MARGIN
+    _shop_header(pdf, "DAILY SALES REPORT")
+
+    pdf.text(left, pdf.y, f"Date: {data['report_date']}", bold=True)
+    pdf.text(left, pdf.line_feed(14), f"Generated by: {data['generated_by']}", size=9)
+    pdf.line_feed(24)
+
+    rows = [
+        ("Cash Sales", f"{data['cash_sales']} XAF", False),
+        ("Mobile Money Sales", f"{data['mobile_money_sales']} XAF", False),
+        ("Total Revenue", f"{data['total_sales']} XAF", True),
+        ("Transactions", data['total_customers'], False),
+        ("Items Sold", data['total_products_sold'], False),
+    ]
+    for label, value, bold in rows:
+        y = pdf.line_feed(20)
+        pdf.text(left, y, label, bold=bold)
+        pdf.text(right, y, value, bold=bold, align='right')
+        pdf.rule(y - 6)
+    return pdf.render()
+
+
+BUILDERS = {
+    'receipt': build_receipt_pdf,
+    'report': build_report_pdf,
+}
+
+
+def write_document(kind, data, path):
+    """Worker entry point: renders the PDF and moves it into place atomically."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(BUILDERS[kind](data))
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,246 @@
+"""
+JSON sale ingestion for seller terminals.
+
+A request carries one basket or a batch of baskets queued while the terminal
+was offline. Every basket has a client-generated idempotency key, so a batch
+can be resent after a dropped connection without duplicating sales. All
+products of the batch are fetched (and locked) in one query, baskets are
+priced server-side, and every accepted basket is written in one transaction.
+"""
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import charts, scan, stock
+from .models import Product, Sale, PosTransaction
+
+MAX_BATCH_SIZE = 200
+MAX_OFFLINE_AGE = timedelta(days=7)
+PAYMENT_METHODS = {value for value, _ in Sale.PAYMENT_METHODS}
+
+
+class BasketError(ValueError):
+    pass
+
+
+def _integer(value):
+    """`value` as an int if it is a whole JSON number or a string of digits."""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    raise ValueError(value)
+
+
+def _parse_basket(raw, now):
+    if not isinstance(raw, dict):
+        raise BasketError("Basket must be a JSON object.")
+
+    key = str(raw.get('idempotency_key') or '').strip()
+    if not key or len(key) > 64:
+        raise BasketError("idempotency_key is required (max 64 characters).")
+
+    payment_method = raw.get('payment_method') or 'cash'
+    if payment_method not in PAYMENT_METHODS:
+        raise BasketError(f"Unknown payment method '{payment_method}'.")
+
+    try:
+        discount = Decimal(str(raw.get('discount_percent') or 0))
+    except InvalidOperation:
+        raise BasketError("discount_percent must be a number.")
+    if not 0 <= discount <= 100:
+        raise BasketError("discount_percent must be between 0 and 100.")
+
+    items = {}
+    for line in raw.get('items') or []:
+        try:
+            product_id = _integer(line['product_id'])
+            quantity = _integer(line['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise BasketError("Each item needs an integer product_id and quantity.")
+        if quantity <= 0:
+            raise BasketError("Quantities must be positive.")
+        items[product_id] = items.get(product_id, 0) + quantity
+    if not items:
+        raise BasketError("Basket has no items.")
+
+    is_completed = raw.get('is_completed', True)
+    if not isinstance(is_completed, bool):
+        raise BasketError("is_completed must be true or false.")
+
+    recorded_at = None
+    if raw.get('recorded_at'):
+        recorded_at = parse_datetime(str(raw['recorded_at']))
+        if recorded_at is None:
+            raise BasketError("recorded_at must be an ISO 8601 datetime.")
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at)
+        # Only trust the terminal clock for plausible offline delays
+        if not now - MAX_OFFLINE_AGE <= recorded_at <= now:
+            recorded_at = None
+
+    return {
+        'key': key,
+        'payment_method': payment_method,
+        'discount': discount,
+        'items': items,
+        'is_completed': is_completed,
+        'recorded_at': recorded_at,
+    }
+
+
+def ingest_baskets(seller, raw_baskets):
+    """
+    Records the given baskets for `seller`. Returns one result per basket, in
+    order, with status 'created', 'duplicate' or 'rejected'.
+    """
+    now = timezone.now()
+    results = [None] * len(raw_baskets)
+
+    # 1. Parse and drop keys repeated inside the batch itself
+    pending, seen = [], {}
+    for index, raw in enumerate(raw_baskets):
+        try:
+            basket = _parse_basket(raw, now)
+        except BasketError as e:
+            key = raw.get('idempotency_key') if isinstance(raw, dict) else None
+            results[index] = {'idempotency_key': key, 'status': 'rejected', 'error': str(e)}
+            continue
+        if basket['key'] in seen:
+            results[index] = {'idempotency_key': basket['key'], 'status': 'duplicate'}
+            continue
+        seen[basket['key']] = index
+        pending.append((index, basket))
+
+    if not pending:
+        return results
+
+    with transaction.atomic():
+        # 2. Baskets already recorded by an earlier (maybe interrupted) upload
+        already = {
+            t.idempotency_key: t
+            for t in PosTransaction.objects.filter(idempotency_key__in=list(seen))
+        }
+
+        # 3. One locked fetch for every product of the batch
+        product_ids = {pid for _, basket in pending for pid in basket['items']}
+        products = Product.objects.select_for_update().in_bulk(product_ids)
+        on_hand = {pid: product.quantity for pid, product in products.items()}
+
+        accepted = []
+        for index, basket in pending:
+            done = already.get(basket['key'])
+            if done is not None:
+                results[index] = {
+                    'idempotency_key': basket['key'], 'status': 'duplicate',
+                    'total_amount': str(done.total_amount),
+                }
+                continue
+
+            missing = [pid for pid in basket['items'] if pid not in products]
+            short = [
+                products[pid].name for pid, qty in basket['items'].items()
+                if pid in products and basket['is_completed'] and on_hand[pid] < qty
+            ]
+            if missing or short:
+                error = f"Unknown product(s): {missing}" if missing else f"Not enough stock for: {', '.join(short)}"
+                results[index] = {'idempotency_key': basket['key'], 'status': 'rejected', 'error': error}
+                continue
+
+            # Credits (is_completed=False) do not move stock, like process_sale
+            if basket['is_completed']:
+                for pid, qty in basket['items'].items():
+                    on_hand[pid] -= qty
+
+            factor = (Decimal(100) - basket['discount']) / Decimal(100)
+            basket['lines'] = [
+                (pid, qty, (products[pid].selling_price * qty * factor).quantize(Decimal('0.01')))
+                for pid, qty in basket['items'].items()
+            ]
+            basket['total'] = sum(amount for _, _, amount in basket['lines'])
+            accepted.append((index, basket))
+
+        if accepted:
+            _write(seller, accepted, products, on_hand, now, results)
+
+    return results
+
+
+def _write(seller, accepted, products, on_hand, now, results):
+    PosTransaction.objects.bulk_create([
+        PosTransaction(
+            idempotency_key=basket['key'],
+            seller=seller,
+            payment_method=basket['payment_method'],
+            total_amount=basket['total'],
+            item_count=sum(basket['items'].values()),
+            recorded_at=basket['recorded_at'],
+        )
+        for _, basket in accepted
+    ])
+    # MySQL does not hand back primary keys from bulk_create
+    transaction_ids = dict(
+        PosTransaction.objects.filter(
+            idempotency_key__in=[basket['key'] for _, basket in accepted]
+        ).values_list('idempotency_key', 'id')
+    )
+
+    Sale.objects.bulk_create([
+        Sale(
+            seller=seller,
+            products_id=pid,
+            sale_amount=amount,
+            quantity=qty,
+            cost_amount=products[pid].buying_price * qty,
+            category_id=products[pid].category_id,
+            payment_method=basket['payment_method'],
+            is_completed=basket['is_completed'],
+            pos_transaction_id=transaction_ids[basket['key']],
+        )
+        for _, basket in accepted
+        for pid, qty, amount in basket['lines']
+    ])
+    charts.invalidate_on_commit()
+
+    # Offline baskets keep the time they were rung up, so daily reports stay right
+    for _, basket in accepted:
+        if basket['recorded_at']:
+            Sale.objects.filter(pos_transaction_id=transaction_ids[basket['key']]).update(
+                sale_date=basket['recorded_at']
+            )
+
+    changed = [p for pid, p in products.items() if on_hand[pid] != p.quantity]
+    for product in changed:
+        product.quantity = on_hand[product.id]
+        product.updated_at = now
+    if changed:
+        Product.objects.bulk_update(changed, ['quantity', 'updated_at'])
+        scan.invalidate_on_commit(p.id for p in changed)
+    stock.record([
+        stock.movement(pid, 'sale', -qty, reference=basket['key'], user=seller.user)
+        for _, basket in accepted if basket['is_completed']
+        for pid, qty, _ in basket['lines']
+    ])
+
+    sale_numbers = {}
+    for transaction_id, sale_id, sale_number in Sale.objects.filter(
+        pos_transaction_id__in=transaction_ids.values()
+    ).order_by('id').values_list('pos_transaction_id', 'id', 'sale_number'):
+        sale_numbers.setdefault(transaction_id, (sale_id, sale_number))
+
+    for index, basket in accepted:
+        sale_id, sale_number = sale_numbers[transaction_ids[basket['key']]]
+        results[index] = {
+            'idempotency_key': basket['key'],
+            'status': 'created',
+            'sale_id': sale_id,
+            'sale_number': sale_number,
+            'total_amount': str(basket['total']),
+        }
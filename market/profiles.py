@@ -0,0 +1,89 @@
+"""
+Role profiles (Seller, Customer, DeliveryAgent) resolved once per request.
+
+ProfileMiddleware (after AuthenticationMiddleware) wraps request.user so
+that, when the user is first touched, its three reverse one-to-one relations
+are filled in from one select_related query, or from a per-user cache entry
+kept for CACHE_TIMEOUT seconds. After that `request.user.seller`,
+`hasattr(user, 'deliveryagent')` and friends never query, however often a
+view or template asks.
+
+Cached profiles are stored without their related objects, and any save or
+delete of a profile drops its user's entry once the transaction commits
+(signals.py).
+"""
+from copy import copy
+
+from django.contrib.auth.middleware import get_user
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+ROLES = ('seller', 'customer', 'deliveryagent')
+CACHE_TIMEOUT = 60
+
+
+def _cache_key(user_id):
+    return f'profiles:{user_id}'
+
+
+def _relation(role):
+    return User._meta.get_field(role)
+
+
+def load(user_id):
+    """{role: profile or None} for one user, from the cache or one query."""
+    key = _cache_key(user_id)
+    profiles = cache.get(key)
+    if profiles is None:
+        user = User.objects.select_related(*ROLES).filter(pk=user_id).first()
+        profiles = {}
+        for role in ROLES:
+            profile = _relation(role).get_cached_value(user, None) if user else None
+            if profile is not None:
+                # Cache the row alone, not the user it was joined with
+                profile = copy(profile)
+                profile._state = copy(profile._state)
+                profile._state.fields_cache = {}
+            profiles[role] = profile
+        cache.set(key, profiles, CACHE_TIMEOUT)
+    return profiles
+
+
+def attach(user):
+    """Fills the user's profile relations so reading them costs no query; returns the user."""
+    if not user.is_authenticated or getattr(user, '_profiles_attached', False):
+        return user
+    for role, profile in load(user.pk).items():
+        relation = _relation(role)
+        if profile is not None:
+            relation.field.set_cached_value(profile, user)
+        relation.set_cached_value(user, profile)
+    user._profiles_attached = True
+    return user
+
+
+def profile_or_404(user, role):
+    """The user's `role` profile; Http404 if they have none."""
+    profile = _relation(role).get_cached_value(attach(user), None) if user.is_authenticated else None
+    if profile is None:
+        raise Http404(f"No {role} profile for this user.")
+    return profile
+
+
+def invalidate_on_commit(user_id):
+    if user_id is not None:
+        transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+class ProfileMiddleware:
+    """Attaches the role profiles to request.user when it is first used."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user = SimpleLazyObject(lambda: attach(get_user(request)))
+        return self.get_response(request)
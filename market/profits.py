@@ -0,0 +1,85 @@
+"""
+Profit and margin figures from the cost captured on each Sale.
+
+Sale.cost_amount holds the buying cost of the units sold at the time of the
+sale, so profit is sale_amount - cost_amount summed over one table: no join
+to Product, and editing a buying price never rewrites history. Breakdowns
+group by a Sale column and only look up labels for the rows returned.
+"""
+from decimal import Decimal
+
+from django.db.models import Sum, Count
+
+from .models import Product, Category, Seller
+
+# Sale column to group by -> how to label each group
+BREAKDOWNS = {
+    'product': ('products_id', lambda ids: {p.id: p.name for p in Product.objects.filter(id__in=ids).only('name')}),
+    'category': ('category_id', lambda ids: dict(Category.objects.filter(id__in=ids).values_list('id', 'name'))),
+    'seller': ('seller_id', lambda ids: {
+        s.id: s.user.get_full_name() or s.user.username
+        for s in Seller.objects.filter(id__in=ids).select_related('user')
+    }),
+}
+
+
+def _figures(revenue, cost, units, transactions):
+    revenue, cost = revenue or Decimal('0'), cost or Decimal('0')
+    profit = revenue - cost
+    return {
+        'revenue': revenue,
+        'cost': cost,
+        'profit': profit,
+        'margin': round(profit * 100 / revenue, 1) if revenue else None,
+        'units': units or 0,
+        'transactions': transactions or 0,
+    }
+
+
+def summary(sales):
+    """Totals for a Sale queryset: revenue, cost, profit, margin (%), units."""
+    totals = sales.aggregate(
+        revenue=Sum('sale_amount'), cost=Sum('cost_amount'),
+        units=Sum('quantity'), transactions=Count('id'),
+    )
+    return _figures(**totals)
+
+
+def breakdown(sales, by, limit=None, archived=None):
+    """
+    Profit per product, category or seller for a Sale queryset, most
+    profitable first: [{'id', 'label', 'revenue', 'cost', 'profit', ...}].
+    `archived` ({id: coldstore figures}, e.g. coldstore.sales_by_category())
+    is added to the matching groups.
+    """
+    column, labels_for = BREAKDOWNS[by]
+    rows = list(
+        sales.values(column)
+        .annotate(revenue=Sum('sale_amount'), cost=Sum('cost_amount'), units=Sum('quantity'), transactions=Count('id'))
+        .order_by()
+    )
+    results = {
+        row[column]: _figures(row['revenue'], row['cost'], row['units'], row['transactions'])
+        for row in rows
+    }
+    for group_id, cold in (archived or {}).items():
+        results[group_id] = with_archived(results.get(group_id, _figures(None, None, 0, 0)), cold)
+    results = [{'id': group_id, **figures} for group_id, figures in results.items()]
+    results.sort(key=lambda r: r['profit'], reverse=True)
+    if limit:
+        results = results[:limit]
+
+    labels = labels_for([r['id'] for r in results if r['id'] is not None])
+    for result in results:
+        result['label'] = labels.get(result['id'], 'Uncategorised' if by == 'category' else 'Unknown')
+    return results
+
+
+def with_archived(figures, archived):
+    """Adds coldstore.sales_figures() to a summary() result."""
+    return _figures(
+        figures['revenue'] + Decimal(str(archived['revenue'])),
+        figures['cost'] + Decimal(str(archived['cost'])),
+        figures['units'] + archived['units'],
+        figures['transactions'] + archived['transactions'],
+    )
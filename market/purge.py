@@ -0,0 +1,114 @@
+"""
+Chunked purge of whole tables (sales, sales reports, orders).
+
+Instead of one .delete() over the table, which makes Django load every
+related row and hold one long transaction, rows are removed in primary-key
+ranges of PURGE_BATCH_SIZE, each in its own short transaction, with a short
+pause in between so POS writes are not starved. Each range can first be
+written to a gzip JSON-lines archive (Django's "jsonl" serializer), which
+`manage.py loaddata <file>.jsonl.gz` can restore.
+
+Progress is stored on a PurgeJob row so the admin page can poll it while the
+purge runs as a task-queue job (tasks.purge_table). A purge interrupted by a
+worker restart is picked up again by the queue and carries on with the rows
+that are left, appending to the same archive. release_abandoned() fails
+jobs that nothing has worked on for STALE_AFTER, so a lost one cannot block
+later purges.
+"""
+import gzip
+import os
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import charts
+from .models import Sale, SalesReport, Order, OrderItem, PurgeJob
+
+PAUSE_SECONDS = 0.05
+STALE_AFTER = timedelta(hours=1)  # longer than the queue takes to requeue a dead worker's task
+
+# target -> (model, child rows archived with each chunk: (model, fk field))
+TARGETS = {
+    'sales': (Sale, []),
+    'reports': (SalesReport, []),
+    'orders': (Order, [(OrderItem, 'order_id')]),
+}
+
+
+def archive_path(target):
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(settings.PURGE_ARCHIVE_DIR, f"{target}-{stamp}.jsonl.gz")
+
+
+def run(job, batch_size=None, archive=False, progress=None):
+    """
+    Purges job.target chunk by chunk, updating `job` after every chunk.
+    `progress(job)` is called after each chunk too (used by the command).
+    Running it again on an interrupted job resumes it.
+    """
+    model, children = TARGETS[job.target]
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+
+    job.status = 'running'
+    job.error = ''
+    job.total = job.deleted + model.objects.count()
+    if archive and job.total and not job.archive_path:
+        job.archive_path = archive_path(job.target)
+        os.makedirs(os.path.dirname(job.archive_path), exist_ok=True)
+    job.save(update_fields=['status', 'error', 'total', 'archive_path', 'updated_at'])
+
+    # Appending adds a gzip member; readers see one stream
+    out = gzip.open(job.archive_path, 'at', encoding='utf-8') if job.archive_path else None
+    try:
+        low = bounds['low']
+        while low is not None and low <= bounds['high']:
+            high = low + batch_size
+            with transaction.atomic():
+                chunk = model.objects.filter(pk__gte=low, pk__lt=high)
+                if out is not None:
+                    rows = list(chunk)
+                    out.write(serializers.serialize('jsonl', rows))
+                    for child, fk in children:
+                        out.write(serializers.serialize(
+                            'jsonl', child.objects.filter(**{f"{fk}__gte": low, f"{fk}__lt": high})
+                        ))
+                # Children go first with plain range deletes; the parent delete
+                # then has nothing left to collect beyond its own rows
+                for child, fk in children:
+                    child.objects.filter(**{f"{fk}__gte": low, f"{fk}__lt": high}).delete()
+                deleted = chunk.delete()[1].get(model._meta.label, 0)
+
+            job.deleted += deleted
+            job.save(update_fields=['deleted', 'updated_at'])
+            if progress:
+                progress(job)
+            low = high
+            time.sleep(PAUSE_SECONDS)
+
+        job.status = 'done'
+    except Exception:
+        job.status = 'failed'
+        job.error = traceback.format_exc(limit=5)
+        raise
+    finally:
+        if out is not None:
+            out.close()
+        if job.target == 'sales':
+            charts.invalidate()
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def release_abandoned():
+    """Fails running purges nothing has updated for STALE_AFTER; returns how many."""
+    return PurgeJob.objects.filter(status='running', updated_at__lt=timezone.now() - STALE_AFTER).update(
+        status='failed', error='Interrupted: no progress for too long.', finished_at=timezone.now(),
+    )
@@ -0,0 +1,111 @@
+"""
+Receipt rendering for customer orders.
+
+A receipt is rendered from one order query plus one items query. The HTML
+of a processed order is cached (and optionally written to RECEIPT_CACHE_DIR)
+under its order_number and the order's updated_at, so reprints cost one
+primary-key lookup. Editing the order moves updated_at, which every worker
+process sees; copies of older versions are never read again and expire
+after RECEIPT_CACHE_TIMEOUT.
+"""
+import os
+import re
+import shutil
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Order, OrderItem
+
+RECEIPT_TEMPLATES = {
+    'order': 'partials/order_receipt.html',        # seller and admin dashboards
+    'customer': 'partials/customer_receipt.html',  # storefront
+}
+
+RECEIPT_CACHE_TIMEOUT = 7 * 24 * 3600
+
+# Order numbers are 8 upper-case hex chars; anything else never reaches the disk
+SAFE_ORDER_NUMBER = re.compile(r'^[A-Za-z0-9_-]{1,50}$')
+
+
+def _version(order_number):
+    """The order's updated_at as a key part; Http404 if there is no such order."""
+    updated_at = Order.objects.filter(order_number=order_number).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        raise Http404("No order matches the given query.")
+    return updated_at.strftime('%Y%m%d%H%M%S%f')
+
+
+def _cache_key(kind, order_number, version):
+    return f"receipt:{kind}:{order_number}:{version}"
+
+
+def _disk_dir(kind, order_number):
+    cache_dir = getattr(settings, 'RECEIPT_CACHE_DIR', None)
+    if not cache_dir or not SAFE_ORDER_NUMBER.match(order_number):
+        return None
+    return os.path.join(cache_dir, kind, order_number)
+
+
+def _disk_path(kind, order_number, version):
+    folder = _disk_dir(kind, order_number)
+    return os.path.join(folder, f"{version}.html") if folder else None
+
+
+def get_receipt_order(order_number):
+    """The order with customer, items and products loaded in two queries."""
+    items = OrderItem.objects.select_related('product').order_by('id')
+    try:
+        return (
+            Order.objects.select_related('customer__user')
+            .prefetch_related(Prefetch('items', queryset=items))
+            .get(order_number=order_number)
+        )
+    except Order.DoesNotExist:
+        raise Http404("No order matches the given query.")
+
+
+def render_receipt(order_number, kind='order'):
+    """
+    Returns the receipt HTML fragment for `order_number`.
+    Processed orders are served from the cache, then from disk, then rendered.
+    """
+    version = _version(order_number)
+    key = _cache_key(kind, order_number, version)
+    html = cache.get(key)
+    if html is not None:
+        return mark_safe(html)
+
+    path = _disk_path(kind, order_number, version)
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        cache.set(key, html, RECEIPT_CACHE_TIMEOUT)
+        return mark_safe(html)
+
+    order = get_receipt_order(order_number)
+    html = render_to_string(RECEIPT_TEMPLATES[kind], {'order': order})
+
+    # Only under the version that was read: a concurrent edit gets its own key
+    if order.is_processed and order.updated_at.strftime('%Y%m%d%H%M%S%f') == version:
+        cache.set(key, str(html), RECEIPT_CACHE_TIMEOUT)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+
+    return html
+
+
+def invalidate_receipt(order_number):
+    """Removes the files of an order's older receipt versions from disk."""
+    for kind in RECEIPT_TEMPLATES:
+        folder = _disk_dir(kind, order_number)
+        if folder:
+            shutil.rmtree(folder, ignore_errors=True)
@@ -0,0 +1,127 @@
+"""
+Daily SalesReport builder.
+
+All days of a date range are aggregated in one grouped query (TruncDay with
+conditional sums per payment method) and written back with a single bulk
+upsert. Only days that have no report yet, or whose sales changed after their
+report was last written, are touched; running it twice is a no-op. A deleted
+sale does not move the newest updated_at, so the day's sale count is compared
+too, and a report whose sales are all gone is zeroed.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, router
+from django.db.models import Sum, Count, Max, Q
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from . import coldstore
+from .models import Sale, SalesReport
+
+# Refreshed on existing reports; generated_by keeps its original author
+REPORT_FIELDS = [
+    'total_sales', 'total_customers', 'total_products_sold',
+    'cash_sales', 'mobile_money_sales', 'updated_at',
+]
+
+CATCH_UP_DAYS = 31
+
+
+def daily_totals(start_date, end_date):
+    """
+    One row per day with completed sales: totals, payment split and units.
+    Days moved to cold storage are included; their last_change is None.
+    """
+    hot = (
+        Sale.objects.filter(is_completed=True, sale_date__date__range=[start_date, end_date])
+        .annotate(day=TruncDay('sale_date'))
+        .values('day')
+        .annotate(
+            total_revenue=Sum('sale_amount'),
+            transactions=Count('id'),
+            units=Sum('quantity'),
+            cash_total=Sum('sale_amount', filter=Q(payment_method='cash')),
+            momo_total=Sum('sale_amount', filter=Q(payment_method='mobile_money')),
+            last_change=Max('updated_at'),
+        )
+        .order_by('day')
+    )
+    rows = {}
+    for row in hot:
+        row['day'] = timezone.localtime(row['day']).date() if timezone.is_aware(row['day']) else row['day'].date()
+        rows[row['day']] = row
+
+    for day, cold in coldstore.daily_sales(start_date, end_date).items():
+        row = rows.setdefault(day, {'day': day, 'last_change': None})
+        for key, value in cold.items():
+            row[key] = (row.get(key) or 0) + (Decimal(str(value)) if isinstance(value, float) else value)
+    return [rows[day] for day in sorted(rows)]
+
+
+def build_reports(start_date, end_date, generated_by, force=False):
+    """
+    Creates or refreshes the SalesReport of every day in [start_date, end_date]
+    that has completed sales, and zeroes the reports of days that no longer
+    have any. With force=False, days whose report is newer than their latest
+    sale change and counts the same sales are skipped. Returns the list of
+    written dates.
+    """
+    existing = {
+        report.report_date: report
+        for report in SalesReport.objects.filter(report_date__range=[start_date, end_date])
+    }
+
+    reports = []
+    rows = daily_totals(start_date, end_date)
+    for row in rows:
+        day = row['day']
+        current = existing.get(day)
+        # Archived days cannot change any more, so an existing report stands
+        if current and not force and current.total_customers == (row['transactions'] or 0) and (
+            row['last_change'] is None or current.updated_at >= row['last_change']
+        ):
+            continue
+
+        reports.append(SalesReport(
+            report_date=day,
+            total_sales=row['total_revenue'] or 0,
+            total_customers=row['transactions'] or 0,
+            total_products_sold=row['units'] or 0,
+            cash_sales=row['cash_total'] or 0,
+            mobile_money_sales=row['momo_total'] or 0,
+            generated_by_id=current.generated_by_id if current else generated_by.id,
+        ))
+
+    days_with_sales = {row['day'] for row in rows}
+    for day, current in existing.items():
+        if day not in days_with_sales and (force or current.total_customers or current.total_sales):
+            reports.append(SalesReport(
+                report_date=day, total_sales=0, total_customers=0, total_products_sold=0,
+                cash_sales=0, mobile_money_sales=0, generated_by_id=current.generated_by_id,
+            ))
+
+    if reports:
+        # MySQL/TiDB upsert on any unique key and refuse an explicit conflict target
+        features = connections[router.db_for_write(SalesReport)].features
+        SalesReport.objects.bulk_create(
+            reports,
+            update_conflicts=True,
+            unique_fields=['report_date'] if features.supports_update_conflicts_with_target else None,
+            update_fields=REPORT_FIELDS,
+        )
+    return [report.report_date for report in reports]
+
+
+def catch_up(generated_by, today=None, force_today=True):
+    """
+    Builds every missing or stale report since the last one (at most
+    CATCH_UP_DAYS back), so a day nobody clicked 'generate' for still gets one.
+    """
+    today = today or timezone.now().date()
+    last = SalesReport.objects.filter(report_date__lt=today).aggregate(last=Max('report_date'))['last']
+    start = max(last or today, today - timedelta(days=CATCH_UP_DAYS))
+
+    written = build_reports(start, today - timedelta(days=1), generated_by) if start < today else []
+    written += build_reports(today, today, generated_by, force=force_today)
+    return written
@@ -0,0 +1,162 @@
+"""
+Read-replica routing for the reporting views.
+
+When settings.DATABASES has a 'replica' alias, views wrapped in
+@read_from_replica run their market queries (GET/HEAD only) against it; every
+other query and every write goes to 'default' as before. Three things keep
+that safe:
+
+  stickiness  a request that writes pins its session to the primary for
+              REPLICA_STICKY_SECONDS, so users see their own changes
+  health      the replica is pinged at most every REPLICA_HEALTH_INTERVAL
+              seconds; while it is down (or a query on it fails) reads fall
+              back to the primary
+  scope       only the market app is read from the replica; sessions and
+              auth always come from the primary
+
+ReplicaRouter goes in DATABASE_ROUTERS and ReplicaMiddleware after the
+session middleware.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, connections
+
+REPLICA = 'replica'
+REPLICA_APPS = {'market'}
+PIN_SESSION_KEY = '_replica_pin_until'
+
+_reading = ContextVar('replica_reading', default=False)
+_wrote = ContextVar('replica_wrote', default=None)
+
+# alias -> (healthy, checked at)
+_health = {}
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def replica_healthy():
+    """Pings the replica, remembering the answer for REPLICA_HEALTH_INTERVAL seconds."""
+    healthy, checked_at = _health.get(REPLICA, (True, 0))
+    if time.monotonic() - checked_at < settings.REPLICA_HEALTH_INTERVAL:
+        return healthy
+    try:
+        with connections[REPLICA].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        healthy = True
+    except DatabaseError:
+        healthy = False
+    _health[REPLICA] = (healthy, time.monotonic())
+    return healthy
+
+
+def mark_unhealthy():
+    _health[REPLICA] = (False, time.monotonic())
+
+
+def is_pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+def pin(request):
+    if hasattr(request, 'session'):
+        request.session[PIN_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+
+
+def _use_replica(request):
+    return (
+        replica_configured()
+        and request.method in ('GET', 'HEAD')
+        and not is_pinned(request)
+        and replica_healthy()
+    )
+
+
+def _stream_from_replica(content):
+    # Set around each chunk: the server may pull chunks from different contexts
+    content = iter(content)
+    while True:
+        token = _reading.set(True)
+        try:
+            chunk = next(content)
+        except StopIteration:
+            return
+        finally:
+            _reading.reset(token)
+        yield chunk
+
+
+def read_from_replica(view):
+    """
+    Opts a read-only view into the replica. If the replica fails mid-view it
+    is marked down and the view runs again on the primary. Streaming
+    responses keep reading from the replica while they are consumed.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _use_replica(request):
+            return view(request, *args, **kwargs)
+
+        token = _reading.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+        except (OperationalError, InterfaceError):
+            mark_unhealthy()
+            _reading.reset(token)
+            return view(request, *args, **kwargs)
+        _reading.reset(token)
+
+        if response.streaming:
+            response.streaming_content = _stream_from_replica(response.streaming_content)
+        return response
+    return wrapper
+
+
+@contextmanager
+def primary():
+    """Reads inside the block go to the primary, even in a replica view."""
+    token = _reading.set(False)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reading.get() and model._meta.app_label in REPLICA_APPS:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if wrote is not None and model._meta.app_label in REPLICA_APPS:
+            wrote.append(model._meta.label)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+class ReplicaMiddleware:
+    """Pins the session to the primary after any request that wrote market data."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote.set([])
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and replica_configured():
+                pin(request)
+        finally:
+            _wrote.reset(token)
+        return response
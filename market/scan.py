@@ -0,0 +1,96 @@
+"""
+Barcode lookup for the POS scanner.
+
+Codes resolve through an in-process LRU cache, so a repeated scan is a dict
+lookup and never reaches the database. Entries are dropped when their product
+changes (signals for normal saves, invalidate() after bulk writes) and expire
+after SCAN_CACHE_TTL seconds, which bounds how stale another worker process
+can be. A row read while an invalidation ran is returned but not cached, so
+a scan racing a write cannot put the old row back. Stock in a scan result is
+advisory: sales re-check it when written.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import transaction
+
+from .models import Product, ProductBarcode
+
+SCAN_CACHE_SIZE = 5000
+SCAN_CACHE_TTL = 60
+
+_entries = OrderedDict()    # code -> (expires_at, result or None)
+_codes_by_product = {}      # product id -> codes cached for it
+_generation = 0             # bumped by every invalidate()
+_lock = threading.Lock()
+
+
+def _snapshot(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': str(product.selling_price),
+        'stock': product.quantity,
+        'unit': product.unit,
+    }
+
+
+def _load(code):
+    product = Product.objects.filter(barcode=code).first()
+    if product is None:
+        extra = ProductBarcode.objects.select_related('product').filter(code=code).first()
+        product = extra.product if extra else None
+    return _snapshot(product) if product else None
+
+
+def lookup(code):
+    """Returns the product snapshot for a scanned code, or None if unknown."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(code)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(code)
+            return entry[1]
+        generation = _generation
+
+    result = _load(code)
+
+    with _lock:
+        if generation != _generation:
+            # Invalidated while loading: the row read may predate that write
+            return result
+        _entries[code] = (now + SCAN_CACHE_TTL, result)
+        _entries.move_to_end(code)
+        if result is not None:
+            _codes_by_product.setdefault(result['id'], set()).add(code)
+        while len(_entries) > SCAN_CACHE_SIZE:
+            old_code, (_, old_result) = _entries.popitem(last=False)
+            if old_result is not None:
+                _codes_by_product.get(old_result['id'], set()).discard(old_code)
+    return result
+
+
+def invalidate(product_ids=None):
+    """
+    Forgets cached scans of the given products, plus every unknown-code entry
+    (a changed product may now own one of those codes). None clears everything.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        if product_ids is None:
+            _entries.clear()
+            _codes_by_product.clear()
+            return
+        for product_id in product_ids:
+            for code in _codes_by_product.pop(product_id, ()):
+                _entries.pop(code, None)
+        for code in [code for code, (_, result) in _entries.items() if result is None]:
+            del _entries[code]
+
+
+def invalidate_on_commit(product_ids):
+    # Invalidating before commit would let a concurrent scan re-cache old rows
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: invalidate(product_ids))
@@ -0,0 +1,166 @@
+"""
+Session engine over the cache that writes django_session only for real changes.
+
+A drop-in for django.contrib.sessions.backends.cached_db (same cache keys,
+same table) with three differences:
+
+  unchanged   a session marked modified whose data is the same as when it
+              was loaded is not saved at all (no DB write, no cache write)
+  coalescing  a change to a session written to the DB less than
+              SESSION_WRITE_COALESCE seconds ago only goes to the cache and
+              the session is listed as dirty; five quick clicks cost one
+              DB write instead of five. Logins, logouts and new sessions
+              are always written through.
+  expiry      prune() deletes expired rows in small batches instead of the
+              single DELETE of `clearsessions` (`manage.py prune_sessions`,
+              also run daily by the task queue)
+
+Dirty sessions are written to the DB by the next write-through save in the
+same cache (of any session) once their window has passed, and by prune().
+Until then only the cache holds the newest data, so coalescing is done only
+when SESSION_CACHE_ALIAS is a cache shared by every process (web workers and
+the task worker that runs prune). With a process-local cache (LocMem, dummy)
+every change is written through, as with cached_db. If a shared cache is
+lost, changes newer than the window are lost with it.
+
+stats counts loads and saves per outcome in this process;
+`manage.py benchmark_sessions` compares the DB writes with the stock engines.
+"""
+import hashlib
+import json
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+AUTH_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+DIRTY_KEY = 'sessions:dirty'
+WRITTEN_PREFIX = 'sessions:written:'
+PRUNE_BATCH = 1000
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+# loaded / skipped / coalesced / written / flushed, since the process started
+stats = Counter()
+
+
+def _fingerprint(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _auth(data):
+    return tuple(data.get(key) for key in AUTH_KEYS)
+
+
+def coalescing():
+    """Whether changes may wait in the cache: only if every process sees that cache."""
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    return settings.SESSION_WRITE_COALESCE > 0 and not isinstance(cache, PROCESS_LOCAL_CACHES)
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded = None  # (fingerprint, auth keys) of the data as loaded or last saved
+
+    def load(self):
+        data = super().load()
+        self._loaded = (_fingerprint(data), _auth(data))
+        stats['loaded'] += 1
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create or self._loaded is None:
+            return self._write_through(must_create)
+
+        data = self._get_session()
+        fingerprint = _fingerprint(data)
+        if fingerprint == self._loaded[0]:
+            stats['skipped'] += 1
+            return
+
+        if coalescing() and self._recently_written() and _auth(data) == self._loaded[1]:
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+            self._mark_dirty()
+            self._loaded = (fingerprint, _auth(data))
+            stats['coalesced'] += 1
+            return
+        self._write_through(must_create)
+
+    def _write_through(self, must_create):
+        super().save(must_create)
+        data = self._get_session(no_load=True)
+        self._loaded = (_fingerprint(data), _auth(data))
+        stats['written'] += 1
+        if coalescing():
+            self._cache.set(WRITTEN_PREFIX + self.session_key, time.time(), settings.SESSION_WRITE_COALESCE)
+            flush_dirty(written=self.session_key)
+
+    def _recently_written(self):
+        return self._cache.get(WRITTEN_PREFIX + self.session_key) is not None
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        super().delete(session_key)
+        if key:
+            self._cache.delete(WRITTEN_PREFIX + key)
+
+    def _mark_dirty(self):
+        # Read-modify-write: a lost update only leaves that session to its next write-through
+        dirty = self._cache.get(DIRTY_KEY) or {}
+        dirty.setdefault(self.session_key, time.time())
+        self._cache.set(DIRTY_KEY, dirty, None)
+
+
+def flush_dirty(written=None, force=False):
+    """
+    Writes the cached data of dirty sessions whose window has passed (all of
+    them with force=True) to the DB; `written` was just saved and is only
+    taken off the list. Returns how many rows were updated.
+    """
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    dirty = cache.get(DIRTY_KEY)
+    if not dirty:
+        return 0
+    cutoff = time.time() - settings.SESSION_WRITE_COALESCE
+    due = [key for key, since in dirty.items() if key != written and (force or since <= cutoff)]
+    if not due and written not in dirty:
+        return 0
+
+    flushed = 0
+    for key in due:
+        store = SessionStore(key)
+        data = cache.get(store.cache_key)
+        if data is None:
+            continue  # logged out or evicted: nothing newer than the DB row
+        store._session_cache = data
+        # update(), not save(): a row deleted meanwhile (logout) stays deleted
+        flushed += Session.objects.filter(session_key=key).update(
+            session_data=store.encode(data), expire_date=store.get_expiry_date(),
+        )
+    remaining = cache.get(DIRTY_KEY) or {}
+    for key in due + [written]:
+        remaining.pop(key, None)
+    cache.set(DIRTY_KEY, remaining, None)
+    stats['flushed'] += flushed
+    return flushed
+
+
+def prune(batch_size=PRUNE_BATCH):
+    """Flushes every dirty session, then deletes expired ones batch by batch."""
+    flush_dirty(force=True)
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=timezone.now())
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
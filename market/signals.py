@@ -0,0 +1,72 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import carts, charts, profiles, scan, typeahead
+from .models import Category, Customer, DeliveryAgent, Expenses, Order, Product, ProductBarcode, ProductTombstone, Sale, Seller
+from .sync import prune_tombstones
+from .receipts import invalidate_receipt
+
+
+@receiver([post_save, post_delete], sender=Order)
+def drop_receipt_cache(sender, instance, **kwargs):
+    # Cached receipts are keyed by updated_at, so this only tidies the disk:
+    # files of an edited order's old version or of a deleted order
+    invalidate_receipt(instance.order_number)
+
+
+@receiver(post_save, sender=Sale)
+@receiver([post_save, post_delete], sender=Expenses)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Seller)
+@receiver(post_delete, sender=Category)
+def drop_chart_cache(sender, instance, **kwargs):
+    # No post_delete for Sale: it would make purge's chunk deletes fetch every row;
+    # market.purge invalidates once instead. Deleting a product or seller deletes
+    # their sales, deleting a category uncategorises them.
+    charts.invalidate_on_commit()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def drop_product_scans(sender, instance, **kwargs):
+    scan.invalidate_on_commit([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ProductBarcode)
+def drop_barcode_scans(sender, instance, **kwargs):
+    scan.invalidate_on_commit([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def refresh_search_index(sender, instance, **kwargs):
+    # Stock-only saves (every sale) keep the index; renames and new products rebuild it
+    typeahead.product_saved(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def drop_search_index(sender, instance, **kwargs):
+    # Category names are searchable too
+    transaction.on_commit(typeahead.invalidate)
+
+
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    # Delta sync clients learn about deletions from these rows
+    ProductTombstone.objects.create(product_id=instance.pk)
+    prune_tombstones()
+
+
+@receiver(user_logged_in)
+def merge_visitor_cart(sender, request, user, **kwargs):
+    # What was put in the cart before logging in stays in it
+    if request is not None:
+        carts.merge_cookie_cart(request, user)
+
+
+@receiver([post_save, post_delete], sender=Seller)
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=DeliveryAgent)
+def drop_cached_profiles(sender, instance, **kwargs):
+    profiles.invalidate_on_commit(instance.user_id)
@@ -0,0 +1,193 @@
+"""
+Stock movement ledger and daily on-hand snapshots.
+
+Every change to Product.quantity is written as a StockMovement in the same
+transaction (in bulk where the caller changes many products), so the ledger
+always sums to the on-hand quantity. StockSnapshot stores the closing quantity
+of each product on each day it moved; questions like "stock at date X",
+shrinkage or velocity then read the nearest snapshot plus the movements after
+it instead of replaying the whole history.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connections, router
+from django.db.models import Max, Min, Sum, Q
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from . import watchlist
+from .models import Product, StockMovement, StockSnapshot
+
+SNAPSHOT_FIELDS = ['quantity', 'received', 'issued', 'updated_at']
+
+
+def movement(product, kind, change, reference='', user=None):
+    """An unsaved movement; `product` may be a Product or its id."""
+    product_id = product if isinstance(product, int) else product.pk
+    return StockMovement(
+        product_id=product_id, kind=kind, quantity_change=change,
+        reference=str(reference)[:100], user=user if user and user.is_authenticated else None,
+    )
+
+
+def record(movements):
+    """
+    Writes movements in one INSERT, skipping zero changes, and refreshes the
+    low-stock watchlist of every product passed once the transaction commits.
+    """
+    watchlist.refresh_on_commit(m.product_id for m in movements)
+    movements = [m for m in movements if m.quantity_change]
+    if movements:
+        StockMovement.objects.bulk_create(movements)
+    return len(movements)
+
+
+def end_of_day(day):
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def stock_at(day, product_ids=None):
+    """
+    {product id: on-hand quantity at the end of `day`}, from each product's
+    latest snapshot on or before `day` plus the movements after it. Products
+    without such a snapshot are worked back from their current quantity.
+    """
+    products = Product.objects.all()
+    snapshots = StockSnapshot.objects.filter(snapshot_date__lte=day)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        snapshots = snapshots.filter(product_id__in=product_ids)
+
+    latest = dict(snapshots.values('product_id').annotate(d=Max('snapshot_date')).values_list('product_id', 'd'))
+    base = {
+        s.product_id: s
+        for s in snapshots.filter(snapshot_date__in=set(latest.values())).only(
+            'product_id', 'snapshot_date', 'quantity'
+        )
+        if latest[s.product_id] == s.snapshot_date
+    }
+    oldest = min(latest.values(), default=day)
+
+    # Movement totals per product: after its snapshot (up to `day`) and after `day`
+    moves = StockMovement.objects.filter(created_at__gte=end_of_day(oldest))
+    if product_ids is not None:
+        moves = moves.filter(product_id__in=product_ids)
+    daily = moves.annotate(day=TruncDay('created_at')).values('product_id', 'day').annotate(change=Sum('quantity_change'))
+
+    since_snapshot, after_day = {}, {}
+    for row in daily:
+        moved_on = timezone.localtime(row['day']).date() if timezone.is_aware(row['day']) else row['day'].date()
+        pid = row['product_id']
+        if moved_on > day:
+            after_day[pid] = after_day.get(pid, 0) + row['change']
+        elif pid in base and moved_on > base[pid].snapshot_date:
+            since_snapshot[pid] = since_snapshot.get(pid, 0) + row['change']
+
+    result = {}
+    for pid, quantity in products.values_list('id', 'quantity'):
+        if pid in base:
+            result[pid] = base[pid].quantity + since_snapshot.get(pid, 0)
+        else:
+            result[pid] = quantity - after_day.get(pid, 0)
+    return result
+
+
+def build_snapshots(until=None):
+    """
+    Writes the snapshots of every day since the last one, up to `until`
+    (default: yesterday), in one grouped query and one bulk upsert. Closing
+    quantities are worked back from the current on-hand quantity.
+    Returns the number of rows written.
+    """
+    until = until or timezone.localdate() - timedelta(days=1)
+    last = StockSnapshot.objects.aggregate(last=Max('snapshot_date'))['last']
+    if last is not None:
+        start = last + timedelta(days=1)
+    else:
+        first = StockMovement.objects.aggregate(first=Min('created_at'))['first']
+        if first is None:
+            return 0
+        start = timezone.localtime(first).date()
+    if start > until:
+        return 0
+
+    rows = (
+        StockMovement.objects.filter(created_at__gte=end_of_day(start - timedelta(days=1)))
+        .annotate(day=TruncDay('created_at'))
+        .values('product_id', 'day')
+        .annotate(
+            change=Sum('quantity_change'),
+            received=Sum('quantity_change', filter=Q(quantity_change__gt=0)),
+            issued=Sum('quantity_change', filter=Q(quantity_change__lt=0)),
+        )
+        .order_by('product_id', '-day')
+    )
+    by_product = {}
+    for row in rows:
+        moved_on = timezone.localtime(row['day']).date() if timezone.is_aware(row['day']) else row['day'].date()
+        by_product.setdefault(row['product_id'], []).append((moved_on, row))
+
+    current = dict(Product.objects.filter(id__in=by_product).values_list('id', 'quantity'))
+    snapshots = []
+    for pid, days in by_product.items():
+        if pid not in current:
+            continue
+        # Newest day first: closing(D) = current - movements after D
+        quantity = current[pid]
+        for moved_on, row in days:
+            if moved_on <= until:
+                snapshots.append(StockSnapshot(
+                    product_id=pid, snapshot_date=moved_on, quantity=quantity,
+                    received=row['received'] or 0, issued=-(row['issued'] or 0),
+                ))
+            quantity -= row['change']
+
+    if snapshots:
+        # MySQL/TiDB upsert on any unique key and refuse an explicit conflict target
+        features = connections[router.db_for_write(StockSnapshot)].features
+        StockSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['product', 'snapshot_date'] if features.supports_update_conflicts_with_target else None,
+            update_fields=SNAPSHOT_FIELDS,
+        )
+    return len(snapshots)
+
+
+def movement_totals(start, end, product_ids=None):
+    """
+    {product id: {kind: units}} for movements in [start, end] (dates); shrinkage
+    is the 'adjustment'/'correction' share, velocity the 'sale'/'order' share.
+    """
+    moves = StockMovement.objects.filter(created_at__gte=end_of_day(start - timedelta(days=1)),
+                                         created_at__lt=end_of_day(end))
+    if product_ids is not None:
+        moves = moves.filter(product_id__in=product_ids)
+    totals = {}
+    for pid, kind, units in moves.values('product_id', 'kind').annotate(units=Sum('quantity_change')).values_list(
+        'product_id', 'kind', 'units'
+    ):
+        totals.setdefault(pid, {})[kind] = units
+    return totals
+
+
+def reconcile(fix=False, user=None):
+    """
+    Compares every product's ledger total with its on-hand quantity in one
+    grouped query. Returns [(product id, name, on hand, ledger)] for the ones
+    that differ; with fix=True a 'correction' movement closes each gap.
+    """
+    ledger = dict(
+        StockMovement.objects.values('product_id').annotate(total=Sum('quantity_change')).values_list('product_id', 'total')
+    )
+    mismatches = [
+        (pid, name, quantity, ledger.get(pid, 0))
+        for pid, name, quantity in Product.objects.order_by('id').values_list('id', 'name', 'quantity')
+        if ledger.get(pid, 0) != quantity
+    ]
+    if fix:
+        record([
+            movement(pid, 'correction', quantity - total, reference='reconcile_stock', user=user)
+            for pid, _, quantity, total in mismatches
+        ])
+    return mismatches
@@ -0,0 +1,125 @@
+"""
+Delta sync of the product catalogue for POS terminals and delivery agents.
+
+A client keeps a local copy of the catalogue and asks for what changed since
+its last `since` token: products created or updated after it (by updated_at)
+and ids deleted after it (from ProductTombstone). An empty token, or one older
+than the tombstone retention, returns a full snapshot flagged `full` so the
+client replaces its copy instead of merging.
+
+Delta tokens are "<microseconds since epoch>-<product id>". Snapshot tokens
+are "s<snapshot start>-<microseconds>-<product id>": they page through the
+whole catalogue in (updated_at, id) order however old the rows are, and only
+delta tokens are checked against the tombstone retention. A page ends on a
+product so large snapshots and deltas can be fetched in several requests.
+The last page of a snapshot hands out a delta token from the snapshot's
+start, so rows changed or deleted while it was paged come with the next
+delta. On the last page the token trails the clock by SYNC_OVERLAP, so rows
+whose transaction committed late are sent again next time instead of being
+skipped. Re-applying a row is harmless for the client.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Product, ProductTombstone
+
+PAGE_SIZE = 500
+SYNC_OVERLAP = timedelta(seconds=30)
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Order of the values in each row of 'products'
+FIELDS = ['id', 'name', 'price', 'stock', 'unit', 'image']
+
+
+class SyncTokenError(ValueError):
+    pass
+
+
+def _micros(moment):
+    return int(moment.timestamp() * 1_000_000)
+
+
+def _moment(micros):
+    return datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+
+
+def encode_token(moment, product_id=0, snapshot=None):
+    """A delta token, or the next page of the snapshot started at `snapshot`."""
+    token = f"{_micros(moment)}-{product_id}"
+    return f"s{_micros(snapshot)}-{token}" if snapshot is not None else token
+
+
+def decode_token(token):
+    """Returns (datetime, product id, snapshot start or None); (None, 0, None) for an empty token."""
+    if not token:
+        return None, 0, None
+    try:
+        if token.startswith('s'):
+            started, micros, product_id = token[1:].split('-')
+            return _moment(micros), int(product_id), _moment(started)
+        micros, product_id = token.split('-')
+        return _moment(micros), int(product_id), None
+    except (ValueError, OverflowError, OSError):
+        raise SyncTokenError("Invalid since token.")
+
+
+def _image_url(product):
+    return product.image.url if product.image else None
+
+
+def prune_tombstones(now=None):
+    cutoff = (now or timezone.now()) - TOMBSTONE_RETENTION
+    return ProductTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
+
+
+def changes(since_token, page_size=PAGE_SIZE):
+    """
+    Catalogue changes after `since_token`:
+    {'full', 'products', 'deleted', 'has_more', 'next'} plus an 'etag' that
+    only depends on the token and the rows returned.
+    """
+    now = timezone.now()
+    since, after_id, snapshot = decode_token(since_token)
+    full = snapshot is None and (since is None or since < now - TOMBSTONE_RETENTION)
+    if full:
+        since, after_id, snapshot = None, 0, now
+
+    products = Product.objects.order_by('updated_at', 'id').only(
+        'id', 'name', 'selling_price', 'quantity', 'unit', 'image', 'updated_at'
+    )
+    deleted = ProductTombstone.objects.none()
+    if since is not None:
+        products = products.filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=after_id))
+        if snapshot is None:
+            deleted = ProductTombstone.objects.filter(deleted_at__gt=since)
+
+    page = list(products[:page_size + 1])
+    has_more = len(page) > page_size
+    page = page[:page_size]
+
+    rows = [
+        [p.id, p.name, str(p.selling_price), p.quantity, p.unit, _image_url(p)]
+        for p in page
+    ]
+    deleted_ids = sorted(set(deleted.values_list('product_id', flat=True)))
+
+    if has_more:
+        next_token = encode_token(page[-1].updated_at, page[-1].id, snapshot)
+    elif snapshot is not None:
+        next_token = encode_token(snapshot - SYNC_OVERLAP)
+    else:
+        next_token = encode_token(max(since, now - SYNC_OVERLAP))
+
+    digest = hashlib.sha256(repr((since_token, full, rows, deleted_ids)).encode('utf-8')).hexdigest()
+    return {
+        'full': full,
+        'fields': FIELDS,
+        'products': rows,
+        'deleted': deleted_ids,
+        'has_more': has_more,
+        'next': next_token,
+        'etag': f'"{digest[:32]}"',
+    }
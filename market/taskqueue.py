@@ -0,0 +1,234 @@
+"""
+Durable background tasks stored in the database (no external broker).
+
+Functions become tasks with @task; calling `fn.enqueue(*args)` (or
+`fn.enqueue_on_commit(...)` inside a transaction) writes a BackgroundTask row
+and returns at once. `manage.py runworker` claims due rows, highest priority
+first, and runs them on a thread or process pool:
+
+  claiming    an UPDATE ... WHERE status='queued' per row, so several workers
+              never run the same task (works on TiDB, MySQL and SQLite alike)
+  retries     a failing task is queued again after TASK_RETRY_DELAY * 2**n
+              seconds (plus jitter) until max_attempts, then marked failed
+  stale locks the worker refreshes the lock of its running tasks every
+              TASK_LOCK_TIMEOUT / HEARTBEATS seconds; a task whose lock is
+              older than TASK_LOCK_TIMEOUT (worker killed mid-task) goes
+              back to the queue, however long a live one runs
+  periodic    @task(every=seconds) keeps exactly one queued row per task;
+              each run schedules the next
+
+Task arguments and results must be JSON-serialisable. Tests and scripts can
+drain the queue synchronously with run_pending().
+"""
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BackgroundTask
+
+MAX_RETRY_DELAY = 3600
+HEARTBEATS = 5  # lock refreshes per TASK_LOCK_TIMEOUT
+
+# name -> Task
+registry = {}
+
+
+class Task:
+    def __init__(self, fn, name, priority=0, max_attempts=3, every=None):
+        self.fn = fn
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.every = every
+
+    def __call__(self, *args, **kwargs):
+        return self.fn(*args, **kwargs)
+
+    def enqueue(self, *args, delay=None, run_at=None, priority=None, **kwargs):
+        """Queues one run; `delay` (seconds) or `run_at` schedule it for later."""
+        if run_at is None:
+            run_at = timezone.now() + timedelta(seconds=delay or 0)
+        return BackgroundTask.objects.create(
+            name=self.name, args=list(args), kwargs=kwargs,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts, run_at=run_at, periodic=bool(self.every),
+        )
+
+    def enqueue_on_commit(self, *args, **kwargs):
+        transaction.on_commit(lambda: self.enqueue(*args, **kwargs))
+
+
+def task(name=None, priority=0, max_attempts=3, every=None):
+    """Registers a function as a task (name defaults to module.function)."""
+    def register(fn):
+        registered = Task(fn, name or f"{fn.__module__}.{fn.__name__}", priority, max_attempts, every)
+        registry[registered.name] = registered
+        return registered
+    return register
+
+
+def retry_delay(attempts):
+    delay = min(MAX_RETRY_DELAY, settings.TASK_RETRY_DELAY * 2 ** (attempts - 1))
+    return delay + random.uniform(0, delay / 10)
+
+
+# --- Claiming ---
+
+def schedule_periodic():
+    """Queues the first run of every periodic task that has none pending."""
+    pending = set(
+        BackgroundTask.objects.filter(periodic=True, status__in=['queued', 'running'])
+        .values_list('name', flat=True)
+    )
+    for registered in registry.values():
+        if registered.every and registered.name not in pending:
+            registered.enqueue()
+
+
+def release_stale():
+    """Puts tasks whose worker died mid-run back in the queue."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    return BackgroundTask.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_by='', locked_at=None, updated_at=timezone.now(),
+    )
+
+
+def heartbeat(worker, task_ids):
+    """Refreshes the locks of tasks `worker` is still running, so they are not taken for dead."""
+    return BackgroundTask.objects.filter(id__in=task_ids, status='running', locked_by=worker).update(
+        locked_at=timezone.now(),
+    )
+
+
+def claim(worker, limit):
+    """Marks up to `limit` due tasks as running for `worker`; returns their ids."""
+    now = timezone.now()
+    candidates = list(
+        BackgroundTask.objects.filter(status='queued', run_at__lte=now)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('id', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for task_id in candidates:
+        # Another worker may have taken it since the SELECT: only one UPDATE wins
+        won = BackgroundTask.objects.filter(id=task_id, status='queued').update(
+            status='running', locked_by=worker, locked_at=now,
+            attempts=F('attempts') + 1, updated_at=now,
+        )
+        if won:
+            claimed.append(task_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+# --- Running ---
+
+def execute(task_id):
+    """Runs one claimed task and records the outcome (retry, done or failed)."""
+    close_old_connections()
+    job = BackgroundTask.objects.get(pk=task_id)
+    registered = registry.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f"Unknown task '{job.name}'")
+        result = registered.fn(*job.args, **job.kwargs)
+    except Exception:
+        job.error = traceback.format_exc(limit=5)
+        if job.attempts < job.max_attempts and registered is not None:
+            job.status = 'queued'
+            job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+    else:
+        job.status = 'done'
+        job.result = result
+        job.finished_at = timezone.now()
+    job.locked_by, job.locked_at = '', None
+    job.save(update_fields=['status', 'result', 'error', 'run_at', 'finished_at', 'locked_by', 'locked_at', 'updated_at'])
+
+    if job.periodic and job.status != 'queued' and registered is not None:
+        # Schedule the next run unless one is already waiting (e.g. queued by hand)
+        pending = BackgroundTask.objects.filter(name=job.name, periodic=True, status__in=['queued', 'running'])
+        if not pending.exclude(pk=job.pk).exists():
+            registered.enqueue(delay=registered.every)
+    close_old_connections()
+    return job.status
+
+
+def run_pending(limit=None):
+    """Runs every due task in this thread (tests, scripts); returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        claimed = claim('inline', 1)
+        if not claimed:
+            return ran
+        execute(claimed[0])
+        ran += 1
+    return ran
+
+
+class Worker:
+    """Polls the queue and keeps up to `concurrency` tasks running on a pool."""
+
+    def __init__(self, concurrency=None, processes=False, poll_interval=None):
+        self.concurrency = concurrency or settings.TASK_WORKER_CONCURRENCY
+        self.processes = processes
+        self.poll_interval = poll_interval or settings.TASK_POLL_INTERVAL
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+
+    def run(self, burst=False, log=None):
+        """Runs until stop() (or, with burst=True, until nothing is due)."""
+        if self.processes:
+            # Spawned (not forked) children set Django up afresh with their own connections
+            pool = ProcessPoolExecutor(
+                max_workers=self.concurrency, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='task')
+        running = {}
+        beat_every = settings.TASK_LOCK_TIMEOUT / HEARTBEATS
+        last_beat = time.monotonic()
+        try:
+            schedule_periodic()
+            while not self.stopping.is_set():
+                if running and time.monotonic() - last_beat >= beat_every:
+                    heartbeat(self.name, list(running.values()))
+                    last_beat = time.monotonic()
+                if release_stale() and log:
+                    log("Requeued stale tasks")
+                free = self.concurrency - len(running)
+                claimed = claim(self.name, free) if free else []
+                for task_id in claimed:
+                    running[pool.submit(execute, task_id)] = task_id
+
+                if running:
+                    done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task_id = running.pop(future)
+                        if log:
+                            log(f"Task {task_id}: {future.exception() or future.result()}")
+                elif burst:
+                    break
+                else:
+                    close_old_connections()
+                    self.stopping.wait(self.poll_interval)
+        finally:
+            pool.shutdown(wait=True)
+
+    def stop(self):
+        self.stopping.set()
@@ -0,0 +1,112 @@
+"""
+Background tasks run by `manage.py runworker` (see market.taskqueue).
+
+Views queue these instead of doing slow work inline: Cloudinary uploads and
+deletes, daily report aggregation and chatbot calls. The periodic ones keep
+derived tables (snapshots, watchlist, tombstones) fresh and expired sessions
+pruned without a cron job.
+"""
+import io
+import os
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from . import chatbot, documents, purge, reporting, sessions, stock, sync, watchlist
+from .models import BackgroundTask, Product, PurgeJob, Seller, SalesReport, StagedUpload
+from .taskqueue import task
+
+DAY = 24 * 60 * 60
+
+
+# --- Product images ---
+
+def stash_upload(uploaded):
+    """
+    Keeps an uploaded file for a task and returns its id. It goes to the
+    database, not the local disk, since the worker runs as its own service.
+    """
+    return StagedUpload.objects.create(name=os.path.basename(uploaded.name), content=b''.join(uploaded.chunks())).pk
+
+
+@task(priority=5, max_attempts=5)
+def upload_product_image(product_id, upload_id):
+    staged = StagedUpload.objects.filter(pk=upload_id).first()
+    if staged is None:
+        return None  # already uploaded by an earlier attempt
+    product = Product.objects.filter(pk=product_id).first()
+    if product is not None:
+        # CloudinaryField uploads UploadedFile values when the model is saved
+        content = bytes(staged.content)
+        product.image = UploadedFile(io.BytesIO(content), name=staged.name, size=len(content))
+        product.save(update_fields=['image', 'updated_at'])
+    staged.delete()
+    return product.image.public_id if product is not None else None
+
+
+@task(priority=5, max_attempts=5)
+def delete_cloudinary_image(public_id):
+    import cloudinary.uploader
+    return cloudinary.uploader.destroy(public_id)
+
+
+# --- Reports ---
+
+@task()
+def build_daily_reports(seller_id, day):
+    """Today's report plus any missed day since the last one, then their PDFs."""
+    seller = Seller.objects.get(pk=seller_id)
+    written = reporting.catch_up(seller, today=date.fromisoformat(day))
+    for report in SalesReport.objects.select_related('generated_by__user').filter(report_date__in=written):
+        documents.submit_report(report)
+    return [d.isoformat() for d in written]
+
+
+# --- Purges ---
+
+@task(max_attempts=3)
+def purge_table(job_id, archive=False):
+    """Runs (or, after a worker restart or a failed attempt, resumes) a PurgeJob."""
+    job = PurgeJob.objects.get(pk=job_id)
+    if job.status != 'done':
+        purge.run(job, archive=archive)
+    return job.deleted
+
+
+# --- Chatbot ---
+
+@task(priority=10, max_attempts=1)
+def chatbot_reply(message):
+    return {'reply': chatbot.reply(message)}
+
+
+# --- Periodic upkeep ---
+
+@task(every=DAY)
+def snapshot_stock():
+    return stock.build_snapshots()
+
+
+@task(every=DAY)
+def refresh_watchlist():
+    return watchlist.refresh()
+
+
+@task(every=DAY)
+def prune_tombstones():
+    return sync.prune_tombstones()
+
+
+@task(every=DAY)
+def prune_finished_tasks():
+    cutoff = timezone.now() - timedelta(days=settings.TASK_KEEP_DAYS)
+    # Uploads still staged by then belong to tasks that failed for good
+    StagedUpload.objects.filter(created_at__lt=cutoff).delete()
+    return BackgroundTask.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff).delete()[0]
+
+
+@task(every=DAY)
+def prune_sessions():
+    return sessions.prune()
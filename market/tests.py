@@ -1,3 +1,1167 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, authenticate
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from . import analytics, authentication, carts, charts, closing, coldstore, documents, imports, pos, profiles, profits, purge, receipts, reporting, routers, scan, sessions, stock, sync, taskqueue, tasks, typeahead, views, watchlist
+from .models import BackgroundTask, CartLine, Category, ClosePartition, Customer, Expenses, LowStockAlert, Order, Product, PurgeJob, Sale, SalesReport, Seller, StagedUpload, Supplier
+from .routers import ReplicaMiddleware, read_from_replica
+
+
+def make_product(name, quantity=10, **fields):
+    category = Category.objects.get_or_create(name=fields.pop('category_name', 'General'))[0]
+    supplier = Supplier.objects.get_or_create(name='Acme', defaults={'contact_person': 'A', 'phone': '1', 'address': 'x'})[0]
+    fields.setdefault('buying_price', 1)
+    fields.setdefault('selling_price', 2)
+    return Product.objects.create(
+        name=name, unit='piece', quantity=quantity, image='sample', category=category, supplier=supplier, **fields
+    )
+
+
+def make_seller(username):
+    user = User.objects.create_user(username, password='pw')
+    return Seller.objects.create(user=user, phone='1', address='x', hire_date=timezone.localdate())
+
+
+def make_sale(seller, product, quantity=1, **fields):
+    fields.setdefault('sale_amount', product.selling_price * quantity)
+    fields.setdefault('cost_amount', product.buying_price * quantity)
+    return Sale.objects.create(
+        seller=seller, products=product, category=product.category, quantity=quantity, **fields
+    )
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(routers, '_use_replica', return_value=False))
+        self.seller, product = make_seller('s'), make_product('Tea')
+        make_sale(self.seller, product)
+        make_sale(self.seller, product, is_completed=False)
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+
+    def rows(self, response):
+        return b''.join(response.streaming_content).decode('utf-8-sig').splitlines()[1:]
+
+    def test_bad_filters_are_rejected(self):
+        for query in ('days=abc', 'days=-3', 'days=99999999999', 'start_date=yesterday', 'end_date=2024-13-01', 'seller=x'):
+            response = self.client.get(f'/dashboard/export/sales/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+        for url in ('/dashboard/export/orders/', '/dashboard/export/expenses/', '/dashboard/expenses/'):
+            for query in ('start_date=yesterday', 'end_date=2024-02-30'):
+                self.assertEqual(self.client.get(f'{url}?{query}').status_code, 400, url + query)
+            self.assertEqual(self.client.get(f'{url}?start_date=2024-01-01').status_code, 200, url)
+
+    def test_date_range(self):
+        today = timezone.localdate().isoformat()
+        response = self.client.get(f'/dashboard/export/sales/?start_date={today}&end_date={today}')
+        self.assertEqual(len(self.rows(response)), 2)
+
+    def test_seller_report_export_matches_the_report(self):
+        response = self.client.get(f'/dashboard/sellers/report/{self.seller.pk}/')
+        link = f'/dashboard/export/sales/{self.seller.pk}/?days=30&completed=1&format=excel'
+        self.assertContains(response, link)
+        export = self.client.get(link)
+        self.assertEqual(len(self.rows(export)), 1)
+
+
+class PosIngestTests(TestCase):
+    def setUp(self):
+        self.seller, self.product = make_seller('s'), make_product('Tea', quantity=5)
+
+    def basket(self, key, quantity, **fields):
+        return {'idempotency_key': key, 'items': [{'product_id': self.product.pk, 'quantity': quantity}], **fields}
+
+    def test_replayed_batch_is_not_recorded_twice(self):
+        batch = [self.basket('a', 2), self.basket('b', 1)]
+        first = pos.ingest_baskets(self.seller, batch)
+        self.assertEqual([r['status'] for r in first], ['created', 'created'])
+        again = pos.ingest_baskets(self.seller, batch + [self.basket('a', 2)])
+        self.assertEqual([r['status'] for r in again], ['duplicate', 'duplicate', 'duplicate'])
+        self.assertEqual(again[0]['total_amount'], '4.00')
+        self.assertEqual(Sale.objects.count(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 2)
+
+    def test_stock_conflict_inside_a_batch(self):
+        results = pos.ingest_baskets(self.seller, [self.basket('a', 4), self.basket('b', 2), self.basket('c', 2, is_completed=False)])
+        self.assertEqual([r['status'] for r in results], ['created', 'rejected', 'created'])
+        self.assertIn('Not enough stock for: Tea', results[1]['error'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1)
+
+    def test_terminal_resend_is_recorded_once(self):
+        self.client.force_login(self.seller.user)
+
+        def post(body):
+            return self.client.post('/seller/process-sale/', json.dumps(body), content_type='application/json')
+
+        keyless = {'items': [{'product_id': self.product.pk, 'quantity': 1}]}
+        response = post(keyless)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('idempotency_key', json.loads(response.content)['error'])
+
+        first, again = post(self.basket('k1', 1)), post(self.basket('k1', 1))
+        self.assertEqual([json.loads(r.content)['status'] for r in (first, again)], ['created', 'duplicate'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_strict_values(self):
+        bad = [
+            self.basket('a', 1.5), self.basket('b', '2x'), self.basket('c', True),
+            self.basket('d', 1, is_completed='false'), self.basket('e', 1, is_completed=0),
+        ]
+        results = pos.ingest_baskets(self.seller, bad)
+        self.assertEqual({r['status'] for r in results}, {'rejected'})
+        self.assertEqual(pos.ingest_baskets(self.seller, [self.basket('f', '2', is_completed=False)])[0]['status'], 'created')
+        self.assertFalse(Sale.objects.get().is_completed)
+
+
+class ImportTests(TestCase):
+    header = 'name,category,supplier,buying_price,selling_price,quantity\n'
+
+    def run_import(self, body, **options):
+        return imports.import_products(imports.read_rows(io.BytesIO(self.header.encode() + body)), **options)
+
+    def test_names_match_ignoring_case(self):
+        product = make_product('Green Tea', quantity=3)
+        report = self.run_import(b'GREEN TEA,general,ACME,1,2,4\nCoffee,GENERAL,acme,1,2,5\n')
+        self.assertEqual((report.created, report.updated, report.errors), (1, 1, []))
+        self.assertEqual((report.categories_created, report.suppliers_created), (0, 0))
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 7)
+        self.assertEqual(Product.objects.get(name='Coffee').category, product.category)
+
+    def test_unreadable_file_is_reported(self):
+        report = self.run_import(b'Tea,General,Acme,1,2,4\nCaf\xe9,General,Acme,1,2,4\n', batch_size=1)
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.errors[0][0], 3)
+        self.assertIn('UTF-8', report.errors[0][1])
+
+        report = self.run_import(b'Tea,' + b'x' * (csv.field_size_limit() + 1) + b',Acme,1,2,4\n')
+        self.assertIn('Malformed CSV', report.errors[0][1])
+
+
+class DocumentPoolTests(TestCase):
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        self.enterContext(self.settings(DOCUMENT_CACHE_DIR=folder))
+        self.enterContext(mock.patch.object(documents, '_pool', None))
+        self.executor = self.enterContext(mock.patch.object(documents, 'ProcessPoolExecutor'))
+
+    def test_broken_pool_is_replaced(self):
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool()
+        fresh = mock.Mock()
+        self.executor.side_effect = [broken, fresh]
+        path, future = documents.submit('report', {'total_sales': '1'})
+        self.assertIs(future, fresh.submit.return_value)
+        self.assertIs(documents._pool, fresh)
+        broken.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+    def test_dead_worker_drops_the_pool(self):
+        pool = documents.get_pool()
+        future = Future()
+        future.pool = pool
+        future.set_exception(BrokenProcessPool())
+        with self.assertRaises(BrokenProcessPool):
+            documents.wait(future, 1)
+        self.assertIsNone(documents._pool)
+
+    def test_worker_error_is_not_a_server_error(self):
+        for error in (ValueError('bad data'), BrokenProcessPool()):
+            future = Future()
+            future.pool = documents.get_pool()
+            future.set_exception(error)
+            response = views._serve_document('missing.pdf', future, 'report.pdf')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(json.loads(response.content)['status'], 'failed')
+
+
+class WatchlistTests(TestCase):
+    def test_command_fills_the_watchlist(self):
+        low, fine = make_product('Salt', quantity=2, min_stock_level=5), make_product('Rice', quantity=50, min_stock_level=5)
+        call_command('refresh_watchlist', stdout=io.StringIO())
+        self.assertEqual(list(LowStockAlert.objects.values_list('product_id', 'below_minimum')), [(low.pk, True)])
+        self.assertFalse(LowStockAlert.objects.filter(product=fine).exists())
+
+    def test_fast_seller_is_watched_before_the_minimum(self):
+        seller, product = make_seller('s'), make_product('Tea', quantity=30, min_stock_level=5)
+        make_sale(seller, product, quantity=120)
+        watchlist.refresh()
+        alert = LowStockAlert.objects.get(product=product)
+        self.assertFalse(alert.below_minimum)
+        self.assertLess(alert.days_to_stockout, watchlist.WATCH_HORIZON_DAYS)
+        self.assertGreater(alert.reorder_quantity, 0)
+
+    def test_restock_drops_the_alert(self):
+        product = make_product('Salt', quantity=2, min_stock_level=5)
+        watchlist.refresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(quantity=40)
+            stock.record([stock.movement(product, 'restock', 38)])
+        self.assertFalse(LowStockAlert.objects.exists())
+
+
+class DailyReportTests(TestCase):
+    def setUp(self):
+        self.seller, product = make_seller('s'), make_product('Tea')
+        self.sales = [make_sale(self.seller, product) for _ in range(3)]
+        self.today = timezone.localdate()
+
+    def build(self):
+        return reporting.build_reports(self.today, self.today, self.seller)
+
+    def test_deleted_sale_refreshes_the_report(self):
+        self.assertEqual(self.build(), [self.today])
+        self.assertEqual(self.build(), [])
+
+        self.sales[0].delete()
+        self.assertEqual(self.build(), [self.today])
+        report = SalesReport.objects.get(report_date=self.today)
+        self.assertEqual((report.total_customers, report.total_sales), (2, 4))
+
+    def test_report_of_a_day_without_sales_is_zeroed(self):
+        self.build()
+        Sale.objects.all().delete()
+        self.assertEqual(self.build(), [self.today])
+        report = SalesReport.objects.get(report_date=self.today)
+        self.assertEqual((report.total_customers, report.total_sales), (0, 0))
+        self.assertEqual(self.build(), [])
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller('s')
+        self.tea, self.salt = make_product('Tea', selling_price=10, buying_price=6), make_product('Salt', category_name='Spices')
+        self.month = analytics.month_of(timezone.localdate())
+
+    def sell(self, product, quantity, months_ago=0):
+        sale = make_sale(self.seller, product, quantity)
+        day = analytics.month_start(self.month - months_ago) + timedelta(days=3)
+        Sale.objects.filter(pk=sale.pk).update(sale_date=timezone.make_aware(datetime.combine(day, datetime.min.time())))
+
+    def test_load_reads_in_chunks(self):
+        for quantity in range(1, 6):
+            self.sell(self.tea, quantity)
+        make_sale(self.seller, self.tea, is_completed=False)
+        with mock.patch.object(analytics, 'LOAD_CHUNK', 2):
+            sales = analytics.load_sales(self.month, self.month)
+        self.assertEqual(len(sales['month']), 5)
+        self.assertEqual(sales['revenue'].sum(), 150)
+        self.assertEqual(sales['cost'].sum(), 90)
+        self.assertEqual(set(sales['month'].tolist()), {self.month})
+
+    def test_change_and_moving_average(self):
+        series = np.array([[100, 50, 0, 30]])
+        np.testing.assert_allclose(analytics.change(series, 1), [[np.nan, -50, -100, np.nan]])
+        np.testing.assert_allclose(analytics.moving_average(series, 2), [[100, 75, 25, 15]])
+        np.testing.assert_allclose(analytics.moving_average(series, 10), [[100, 75, 50, 45]])
+
+    def test_monthly_overview(self):
+        self.sell(self.tea, 2, months_ago=12)
+        self.sell(self.tea, 3)
+        self.sell(self.salt, 1, months_ago=1)
+        report = analytics.monthly_overview(self.month, months=2)
+        last = report['rows'][-1]
+        self.assertEqual((last['revenue'], last['cost'], last['profit'], last['margin']), (30, 18, 12, 40))
+        self.assertEqual(last['yoy'], 50)
+        self.assertEqual(last['mom'], 1400)
+        self.assertEqual([row['label'] for row in report['categories']], ['General', 'Spices'])
+        self.assertEqual(report['categories'][0]['revenue'], [0, 30])
+        self.assertEqual(report['rows_loaded'], 3)
+
+
+class ReceiptCacheTests(TestCase):
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        self.enterContext(self.settings(RECEIPT_CACHE_DIR=folder))
+        self.addCleanup(caches['default'].clear)
+        user = User.objects.create_user('ama', password='pw', first_name='Ama')
+        customer = Customer.objects.create(user=user, username='ama', first_name='A', last_name='B', phone='677000002', address='x')
+        self.order = Order.objects.create(
+            order_number='AB12CD34', customer=customer, total_amount=4, city='Douala', town='Akwa', phone_number='1',
+            is_processed=True,
+        )
+        self.order.items.create(product=make_product('Tea'), quantity=2, price_at_purchase=2, cost_at_purchase=1)
+
+    def path(self):
+        return receipts._disk_path('order', self.order.order_number, receipts._version(self.order.order_number))
+
+    def test_processed_receipt_is_served_from_the_cache(self):
+        html = receipts.render_receipt(self.order.order_number)
+        self.assertIn('Akwa', html)
+        self.assertTrue(os.path.exists(self.path()))
+        with self.assertNumQueries(1):
+            self.assertEqual(receipts.render_receipt(self.order.order_number), html)
+
+    def test_edited_order_gets_a_new_receipt(self):
+        receipts.render_receipt(self.order.order_number)
+        old_path = self.path()
+        self.order.town = 'Bonapriso'
+        self.order.save()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertIn('Bonapriso', receipts.render_receipt(self.order.order_number))
+
+    def test_edit_from_another_process_is_seen(self):
+        receipts.render_receipt(self.order.order_number)
+        # No signal here: this process's cache and the disk still hold the old version
+        Order.objects.filter(pk=self.order.pk).update(town='Bonapriso', updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertIn('Bonapriso', receipts.render_receipt(self.order.order_number))
+
+    def test_deleted_order_drops_its_receipt(self):
+        receipts.render_receipt(self.order.order_number)
+        path = self.path()
+        self.order.delete()
+        self.assertFalse(os.path.exists(path))
+        with self.assertRaises(Http404):
+            receipts.render_receipt(self.order.order_number)
+
+    def test_pending_order_is_not_cached(self):
+        Order.objects.filter(pk=self.order.pk).update(is_processed=False)
+        receipts.render_receipt(self.order.order_number)
+        self.assertFalse(os.path.exists(self.path()))
+        version = receipts._version(self.order.order_number)
+        self.assertIsNone(caches['default'].get(receipts._cache_key('order', self.order.order_number, version)))
+
+
+class ScanCacheTests(TestCase):
+    def setUp(self):
+        scan.invalidate()
+        self.addCleanup(scan.invalidate)
+        self.product = make_product('Tea', barcode='6001')
+
+    def test_repeated_scan_skips_the_database(self):
+        self.assertEqual(scan.lookup('6001')['name'], 'Tea')
+        with self.assertNumQueries(0):
+            self.assertEqual(scan.lookup('6001')['name'], 'Tea')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Green Tea'
+            self.product.save()
+        self.assertEqual(scan.lookup('6001')['name'], 'Green Tea')
+
+    def test_scan_racing_a_write_is_not_cached(self):
+        load = scan._load
+
+        def load_then_write(code):
+            # The old row is read, then a write commits and invalidates
+            result = load(code)
+            Product.objects.filter(pk=self.product.pk).update(name='Green Tea')
+            scan.invalidate([self.product.pk])
+            return result
+
+        with mock.patch.object(scan, '_load', side_effect=load_then_write):
+            self.assertEqual(scan.lookup('6001')['name'], 'Tea')
+        self.assertEqual(scan.lookup('6001')['name'], 'Green Tea')
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        typeahead.invalidate()
+        self.addCleanup(typeahead.invalidate)
+        self.product = make_product('Jasmine Tea', category_name='Drinks')
+
+    def names(self, query):
+        return [row['name'] for row in typeahead.search(query)['results']]
+
+    def test_rename_rebuilds_the_index(self):
+        self.assertEqual(self.names('jasm'), ['Jasmine Tea'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Mint Tea'
+            self.product.save()
+        self.assertEqual(self.names('mint'), ['Mint Tea'])
+        self.assertEqual(self.names('jasm'), [])
+
+    def test_category_rename_rebuilds_the_index(self):
+        self.assertEqual(self.names('drin'), ['Jasmine Tea'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.category.name = 'Beverages'
+            self.product.category.save()
+        self.assertEqual(self.names('bever'), ['Jasmine Tea'])
+
+    def test_stock_change_keeps_the_index(self):
+        index = typeahead._get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.quantity = 3
+            self.product.save()
+        self.assertIs(typeahead._get_index(), index)
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.product = make_product('Tea', quantity=10)
+        stock.record([stock.movement(self.product, 'opening', 10)])
+        self.seller = make_seller('s')
+
+    def assertLedgerBalances(self):
+        self.assertEqual(stock.reconcile(), [])
+
+    def test_product_form_edit(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        self.client.post(f'/product/edit/{self.product.pk}/', {
+            'name': 'Tea', 'description': '', 'buying_price': 1, 'selling_price': 2, 'unit': 'piece',
+            'quantity': 25, 'min_stock_level': 5, 'category_name': 'General', 'supplier_name': 'Acme',
+        })
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 25)
+        self.assertEqual(self.product.movements.latest('id').quantity_change, 15)
+        self.assertLedgerBalances()
+
+    def test_counter_and_terminal_sales(self):
+        self.client.force_login(self.seller.user)
+        self.client.post('/seller/process_sale/', {
+            'product_ids': [self.product.pk], 'quantities': [3], 'payment_method': 'cash', 'is_completed': 'on',
+        })
+        pos.ingest_baskets(self.seller, [{'idempotency_key': 'a', 'items': [{'product_id': self.product.pk, 'quantity': 2}]}])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+        self.assertLedgerBalances()
+
+    def test_reconcile_closes_gaps(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=7)
+        self.assertEqual(stock.reconcile(fix=True), [(self.product.pk, 'Tea', 7, 10)])
+        self.assertLedgerBalances()
+
+
+class ProfitTests(TestCase):
+    def setUp(self):
+        self.ama, self.bob = make_seller('ama'), make_seller('bob')
+        self.tea = make_product('Tea', buying_price=6, selling_price=10)
+        self.salt = make_product('Salt', category_name='Spices', buying_price=1, selling_price=2)
+        make_sale(self.ama, self.tea, 3)
+        make_sale(self.bob, self.salt, 5)
+        make_sale(self.bob, self.tea, 1, sale_amount=8)
+
+    def test_summary(self):
+        totals = profits.summary(Sale.objects.all())
+        self.assertEqual((totals['revenue'], totals['cost'], totals['profit']), (48, 29, 19))
+        self.assertEqual((totals['margin'], totals['units'], totals['transactions']), (Decimal('39.6'), 9, 3))
+        self.assertIsNone(profits.summary(Sale.objects.none())['margin'])
+
+    def test_buying_price_edit_keeps_past_profit(self):
+        Product.objects.filter(pk=self.tea.pk).update(buying_price=9)
+        self.assertEqual(profits.summary(Sale.objects.all())['profit'], 19)
+
+    def test_breakdowns(self):
+        by_product = profits.breakdown(Sale.objects.all(), 'product')
+        self.assertEqual([(r['label'], r['profit'], r['units']) for r in by_product], [('Tea', 14, 4), ('Salt', 5, 5)])
+        by_seller = profits.breakdown(Sale.objects.all(), 'seller', limit=1)
+        self.assertEqual([(r['label'], r['profit']) for r in by_seller], [('ama', 12)])
+
+        archived = {self.salt.category_id: {'revenue': 20.0, 'cost': 5.0, 'units': 10, 'transactions': 2}, None: {
+            'revenue': 3.0, 'cost': 1.0, 'units': 1, 'transactions': 1,
+        }}
+        by_category = profits.breakdown(Sale.objects.all(), 'category', archived=archived)
+        self.assertEqual(
+            [(r['label'], r['profit'], r['transactions']) for r in by_category],
+            [('Spices', 20, 3), ('General', 14, 2), ('Uncategorised', 2, 1)],
+        )
+
+
+class CatalogueSyncTests(TestCase):
+    def setUp(self):
+        self.products = [make_product(name) for name in ('Rice', 'Beans', 'Salt')]
+        # Older than the tombstone retention: snapshots must still page through them
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=40))
+
+    def test_snapshot_pages_through_old_rows(self):
+        first = sync.changes('', page_size=2)
+        self.assertTrue(first['full'])
+        self.assertTrue(first['has_more'])
+        self.assertEqual([row[0] for row in first['products']], [p.pk for p in self.products[:2]])
+
+        second = sync.changes(first['next'], page_size=2)
+        self.assertFalse(second['full'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual([row[0] for row in second['products']], [self.products[2].pk])
+
+        # The snapshot ends with a delta token that picks up later changes
+        deleted_id = self.products[1].pk
+        self.products[0].save()
+        self.products[1].delete()
+        delta = sync.changes(second['next'])
+        self.assertFalse(delta['full'])
+        self.assertEqual([row[0] for row in delta['products']], [self.products[0].pk])
+        self.assertEqual(delta['deleted'], [deleted_id])
+
+    def test_delta_pages(self):
+        token = sync.encode_token(timezone.now() - timedelta(days=1))
+        for product in self.products:
+            product.save()
+        first = sync.changes(token, page_size=2)
+        self.assertTrue(first['has_more'])
+        second = sync.changes(first['next'], page_size=2)
+        self.assertFalse(second['has_more'])
+        ids = [row[0] for row in first['products'] + second['products']]
+        self.assertEqual(ids, [p.pk for p in self.products])
+        self.assertFalse(first['full'] or second['full'])
+
+    def test_bad_token(self):
+        with self.assertRaises(sync.SyncTokenError):
+            sync.changes('s1-x')
+
+
+class PurgeTests(TestCase):
+    def setUp(self):
+        seller, product = make_seller('s'), make_product('Tea')
+        self.sales = [make_sale(seller, product) for _ in range(5)]
+
+    def test_interrupted_purge_resumes(self):
+        job = PurgeJob.objects.create(target='sales')
+        # The worker dies after the first chunk of two
+        with mock.patch.object(purge.time, 'sleep', side_effect=RuntimeError('worker killed')):
+            with self.assertRaises(RuntimeError):
+                purge.run(job, batch_size=2)
+        self.assertEqual((job.status, job.deleted, Sale.objects.count()), ('failed', 2, 3))
+
+        with mock.patch.object(purge.time, 'sleep'):
+            tasks.purge_table(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.deleted), ('done', 5, 5))
+        self.assertFalse(Sale.objects.exists())
+
+    def test_abandoned_job_does_not_block_new_purges(self):
+        job = PurgeJob.objects.create(target='sales', status='running')
+        PurgeJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - purge.STALE_AFTER * 2)
+        admin = User.objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/sales/delete-all/')
+        new_job = PurgeJob.objects.latest('id')
+        self.assertNotEqual(new_job.pk, job.pk)
+        self.assertRedirects(response, f'/dashboard/purge/{new_job.pk}/', fetch_redirect_response=False)
+        self.assertEqual(PurgeJob.objects.get(pk=job.pk).status, 'failed')
+        self.assertTrue(BackgroundTask.objects.filter(name='market.tasks.purge_table', args=[new_job.pk]).exists())
+
+
+class ColdStorageTests(TestCase):
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        overridden = self.settings(COLD_STORAGE_DIR=folder)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.addCleanup(caches['default'].clear)
+
+        seller, product = make_seller('s'), make_product('Oil')
+        self.sales = [make_sale(seller, product, quantity) for quantity in (1, 2, 3)]
+        self.moment = timezone.now() - timedelta(days=10)
+        Sale.objects.update(sale_date=self.moment)
+        self.month = (timezone.localtime(self.moment).year, timezone.localtime(self.moment).month)
+
+    def test_interrupted_delete_is_finished_by_a_rerun(self):
+        real_delete = coldstore._delete_ids
+
+        def fail_on_sales(model, ids, field='id'):
+            if model is Sale:
+                real_delete(model, ids[:1], field)
+                raise OperationalError('connection lost')
+            real_delete(model, ids, field)
+
+        with mock.patch.object(coldstore, '_delete_ids', fail_on_sales), self.assertRaises(OperationalError):
+            coldstore.archive_month(*self.month)
+        # Half-deleted: readers keep using the hot rows only
+        self.assertEqual(coldstore.archived_months(), [])
+        self.assertEqual(Sale.objects.count(), 2)
+
+        manifest = coldstore.archive_month(*self.month)
+        self.assertEqual((manifest['state'], manifest['sales']), ('complete', 3))
+        self.assertEqual(coldstore.archived_months(), [self.month])
+        self.assertFalse(Sale.objects.exists())
+        with self.assertRaises(coldstore.ColdStorageError):
+            coldstore.archive_month(*self.month)
+
+    def test_dashboard_kpis_include_archived_months(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        self.enterContext(mock.patch.object(routers, '_use_replica', return_value=False))
+        before = self.client.get('/dashboard/').context
+        coldstore.archive_month(*self.month)
+        charts.invalidate()
+        after = self.client.get('/dashboard/').context
+        self.assertEqual(before['total_sales'], 12)
+        self.assertEqual(after['total_sales'], before['total_sales'])
+        self.assertEqual(after['net_profit'], before['net_profit'])
+        self.assertEqual(
+            [(row['id'], row['profit']) for row in after['category_margins']],
+            [(row['id'], row['profit']) for row in before['category_margins']],
+        )
+
+    def test_open_credits_stay_hot(self):
+        credit = self.sales[0]
+        Sale.objects.filter(pk=credit.pk).update(is_completed=False)
+        manifest = coldstore.archive_month(*self.month)
+        self.assertEqual(manifest['sales'], 2)
+        self.assertEqual(list(Sale.objects.values_list('pk', flat=True)), [credit.pk])
+
+        self.client.force_login(credit.seller.user)
+        credits = self.client.get('/seller/dashboard/').context['active_credits']
+        self.assertEqual([sale.pk for sale in credits], [credit.pk])
+        figures = coldstore.sales_figures(*[timezone.localtime(self.moment).date()] * 2, completed_only=False)
+        self.assertEqual(figures['transactions'], 2)
+
+
+def category_names(request):
+    return JsonResponse(sorted(Category.objects.values_list('name', flat=True)), safe=False)
+
+
+def add_category(request):
+    Category.objects.create(name='added')
+    return JsonResponse({})
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        Category.objects.create(name='primary')
+        Category.objects.using('replica').create(name='replica')
+        routers._health.clear()
+        self.factory = RequestFactory()
+        self.session = {}
+
+    def get(self, view, method='get'):
+        request = getattr(self.factory, method)('/')
+        request.session = self.session
+        response = ReplicaMiddleware(view)(request)
+        return b''.join(response) if response.streaming else json.loads(response.content)
+
+    def test_views_without_opt_in_read_the_primary(self):
+        self.assertEqual(self.get(category_names), ['primary'])
+
+    def test_opted_in_views_read_the_replica(self):
+        self.assertEqual(self.get(read_from_replica(category_names)), ['replica'])
+
+    def test_unsafe_methods_stay_on_the_primary(self):
+        self.assertEqual(self.get(read_from_replica(category_names), method='post'), ['primary'])
+
+    def test_auth_models_stay_on_the_primary(self):
+        @read_from_replica
+        def view(request):
+            return JsonResponse({'user': User.objects.db, 'category': Category.objects.db})
+
+        self.assertEqual(self.get(view), {'user': 'default', 'category': 'replica'})
+
+    def test_write_pins_the_session_to_the_primary(self):
+        self.get(add_category)
+        self.assertEqual(self.get(read_from_replica(category_names)), ['added', 'primary'])
+
+        self.session[routers.PIN_SESSION_KEY] = 0  # pin expired
+        self.assertEqual(self.get(read_from_replica(category_names)), ['replica'])
+
+    def test_reads_do_not_pin_the_session(self):
+        self.get(read_from_replica(category_names))
+        self.assertNotIn(routers.PIN_SESSION_KEY, self.session)
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self):
+        broken = mock.Mock(cursor=mock.Mock(side_effect=OperationalError('gone away')))
+        with mock.patch.object(routers, 'connections', {'replica': broken}):
+            self.assertEqual(self.get(read_from_replica(category_names)), ['primary'])
+        # The failed ping is remembered for REPLICA_HEALTH_INTERVAL
+        self.assertEqual(self.get(read_from_replica(category_names)), ['primary'])
+
+    def test_replica_failure_mid_view_retries_on_the_primary(self):
+        @read_from_replica
+        def view(request):
+            if Category.objects.db == 'replica':
+                raise OperationalError('lost connection')
+            return category_names(request)
+
+        self.assertEqual(self.get(view), ['primary'])
+        self.assertFalse(routers.replica_healthy())
+
+    def test_streaming_responses_read_the_replica_while_consumed(self):
+        @read_from_replica
+        def view(request):
+            return StreamingHttpResponse(name.encode() for name in Category.objects.values_list('name', flat=True))
+
+        self.assertEqual(self.get(view), b'replica')
+
+    def test_writes_inside_replica_views_go_to_the_primary(self):
+        @read_from_replica
+        def view(request):
+            with transaction.atomic():
+                Category.objects.create(name='written')
+            return JsonResponse({})
+
+        self.get(view)
+        self.assertTrue(Category.objects.using('default').filter(name='written').exists())
+        self.assertFalse(Category.objects.using('replica').filter(name='written').exists())
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def record(label):
+            self.calls.append(label)
+            return label
+
+        def fail():
+            raise ValueError('boom')
+
+        self.record = taskqueue.task(name='test.record')(record)
+        self.fail = taskqueue.task(name='test.fail', max_attempts=2)(fail)
+        self.periodic = taskqueue.task(name='test.periodic', every=60)(record)
+        self.addCleanup(lambda: [taskqueue.registry.pop(name) for name in ('test.record', 'test.fail', 'test.periodic')])
+
+    def test_higher_priority_runs_first(self):
+        self.record.enqueue('low')
+        self.record.enqueue('high', priority=5)
+        taskqueue.run_pending()
+        self.assertEqual(self.calls, ['high', 'low'])
+
+    def test_scheduled_task_waits_until_due(self):
+        job = self.record.enqueue('later', delay=60)
+        self.assertEqual(taskqueue.run_pending(), 0)
+        BackgroundTask.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(taskqueue.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('done', 'later'))
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = self.fail.enqueue()
+        taskqueue.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('ValueError', job.error)
+
+        BackgroundTask.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        taskqueue.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_a_task_is_claimed_once(self):
+        job = self.record.enqueue('once')
+        self.assertEqual(taskqueue.claim('worker-a', 5), [job.pk])
+        self.assertEqual(taskqueue.claim('worker-b', 5), [])
+
+    def test_stale_tasks_are_requeued(self):
+        job = self.record.enqueue('stale')
+        taskqueue.claim('dead-worker', 1)
+        BackgroundTask.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(taskqueue.release_stale(), 1)
+        self.assertEqual(taskqueue.run_pending(), 1)
+
+    def test_heartbeat_keeps_long_tasks_claimed(self):
+        job = self.record.enqueue('slow')
+        taskqueue.claim('busy-worker', 1)
+        BackgroundTask.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(taskqueue.heartbeat('other-worker', [job.pk]), 0)
+        self.assertEqual(taskqueue.heartbeat('busy-worker', [job.pk]), 1)
+        self.assertEqual(taskqueue.release_stale(), 0)
+
+    def test_product_image_is_staged_in_the_database(self):
+        product = make_product('Soap')
+        upload_id = tasks.stash_upload(SimpleUploadedFile('soap.png', b'png-bytes'))
+        saved = {}
+
+        def save(product, **kwargs):
+            # What CloudinaryField does on save
+            saved['name'], saved['content'] = product.image.name, product.image.read()
+            product.image = mock.Mock(public_id='soap')
+
+        with mock.patch.object(Product, 'save', save):
+            self.assertEqual(tasks.upload_product_image(product.pk, upload_id), 'soap')
+        self.assertEqual(saved, {'name': 'soap.png', 'content': b'png-bytes'})
+        self.assertFalse(StagedUpload.objects.exists())
+
+    def test_periodic_tasks_schedule_their_next_run(self):
+        taskqueue.schedule_periodic()
+        taskqueue.schedule_periodic()
+        self.assertEqual(BackgroundTask.objects.filter(name='test.periodic').count(), 1)
+
+        BackgroundTask.objects.filter(name='test.periodic').update(args=['tick'])
+        taskqueue.run_pending()
+        following = BackgroundTask.objects.get(name='test.periodic', status='queued')
+        self.assertGreater(following.run_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(self.calls, ['tick'])
+
+
+def revenue_chart(request):
+    today = timezone.localdate()
+    return JsonResponse(charts.data('revenue', 'day', today - timedelta(days=2), today))
+
+
+class ChartTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        routers._health.clear()
+        self.today = timezone.localdate()
+        self.product = make_product('Milk')
+        self.sale = make_sale(make_seller('s'), self.product, 2)  # 4.00 today
+
+    def test_buckets(self):
+        self.assertEqual(
+            charts.buckets(date(2024, 12, 30), date(2025, 1, 6), 'week'),
+            [date(2024, 12, 30), date(2025, 1, 6)],
+        )
+        self.assertEqual(
+            charts.buckets(date(2024, 11, 15), date(2025, 2, 1), 'month'),
+            [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        )
+        self.assertEqual(charts.buckets(date(2024, 6, 1), date(2025, 1, 1), 'year'), [date(2024, 1, 1), date(2025, 1, 1)])
+
+    def test_empty_days_are_zero_filled(self):
+        data = charts.data('revenue', 'day', self.today - timedelta(days=2), self.today)
+        self.assertEqual(len(data['labels']), 3)
+        self.assertEqual(data['values'], [0, 0, 4.0])
+
+    def test_bad_parameters_are_a_400(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        for query in ('metric=volume', 'granularity=hour', 'start=2025-02-01&end=2025-01-01', 'start=yesterday'):
+            response = self.client.get(f'/dashboard/charts/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('error', response.json())
+
+    def test_cached_series_are_computed_on_the_primary(self):
+        # The replica has none of the primary's sales (it lags)
+        request = RequestFactory().get('/')
+        request.session = {}
+        response = read_from_replica(revenue_chart)(request)
+        self.assertEqual(json.loads(response.content)['values'], [0, 0, 4.0])
+
+    def test_deleting_a_product_drops_its_sales_from_the_charts(self):
+        charts.data('revenue', 'day', self.today, self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(charts.data('revenue', 'day', self.today, self.today)['values'], [0])
+
+
+class MonthEndCloseTests(TestCase):
+    def setUp(self):
+        self.month_end = timezone.localdate().replace(day=1) - timedelta(days=1)
+        self.year, self.month = self.month_end.year, self.month_end.month
+        in_month = timezone.now() - timedelta(days=timezone.localdate().day + 2)
+
+        self.category = category = Category.objects.create(name='Drinks')
+        supplier = Supplier.objects.create(name='Acme', contact_person='A', phone='1', address='x')
+        product = Product.objects.create(
+            name='Juice', buying_price=2, selling_price=3, unit='piece', quantity=10,
+            image='sample', category=category, supplier=supplier,
+        )
+        self.sellers = [
+            Seller.objects.create(user=User.objects.create_user(name), phone='1', address='x', hire_date=in_month.date())
+            for name in ('s1', 's2')
+        ]
+        for seller, quantity, method in ((self.sellers[0], 2, 'cash'), (self.sellers[0], 1, 'card'), (self.sellers[1], 4, 'mobile_money')):
+            sale = Sale.objects.create(
+                seller=seller, products=product, category=category, quantity=quantity,
+                sale_amount=3 * quantity, cost_amount=2 * quantity, payment_method=method,
+            )
+            Sale.objects.filter(pk=sale.pk).update(sale_date=in_month)
+        Expenses.objects.create(expenses_type='rent', description='rent', amount=7, expenses_date=in_month.date())
+
+    def test_close_merges_partitions_into_report_tables(self):
+        close = closing.close_month(self.year, self.month, workers=1)
+        self.assertEqual(close.status, 'done')
+        self.assertEqual((close.total_revenue, close.total_cost, close.total_expenses), (21, 14, 7))
+        self.assertEqual(close.inventory_value, 20)
+
+        first = close.seller_statements.get(seller=self.sellers[0])
+        self.assertEqual((first.revenue, first.cash_sales, first.card_sales, first.units), (9, 6, 3, 3))
+        category = close.category_results.get()
+        self.assertEqual((category.gross_profit, category.allocated_expenses, category.net_profit), (7, 7, 0))
+        self.assertEqual(close.expense_summaries.get().total, 7)
+
+    def test_interrupted_close_resumes(self):
+        close = closing.plan(self.year, self.month)
+        done = list(close.work.filter(kind='sales').values_list('pk', flat=True))
+        for pk in done:
+            closing.run_partition(pk)
+        ClosePartition.objects.filter(pk__in=done).update(result={str(self.category.pk): [100, 0, 1, 1, 100, 0, 0]})
+
+        close = closing.close_month(self.year, self.month, workers=1)
+        # Finished partitions are not recomputed
+        self.assertEqual(close.total_revenue, len(done))
+        self.assertEqual(closing.close_month(self.year, self.month, workers=1).pk, close.pk)
+
+        close = closing.close_month(self.year, self.month, workers=1, restart=True)
+        self.assertEqual(close.total_revenue, 21)
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Snacks')
+        supplier = Supplier.objects.create(name='Acme', contact_person='A', phone='1', address='x')
+        self.products = [
+            Product.objects.create(
+                name=name, buying_price=1, selling_price=2, unit='piece', quantity=10,
+                image='sample', category=category, supplier=supplier,
+            )
+            for name in ('Chips', 'Nuts')
+        ]
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.addCleanup(caches['default'].clear)
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            f'/cart/add/{product.pk}/', {'quantity': quantity}, headers={'x-requested-with': 'XMLHttpRequest'},
+        )
+
+    def test_visitor_cart_lives_in_a_signed_cookie(self):
+        self.add(self.products[0], 2)
+        response = self.add(self.products[1])
+        self.assertEqual(json.loads(response.content)['total_items'], 3)
+        self.assertIn(carts.COOKIE_NAME, response.cookies)
+        self.assertFalse(CartLine.objects.exists())
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/get-cart-count/')
+        self.assertEqual(json.loads(response.content)['total_quantity'], 3)
+
+        self.client.cookies[carts.COOKIE_NAME] = 'tampered'
+        self.assertEqual(json.loads(self.client.get('/get-cart-count/').content)['total_quantity'], 0)
+
+    def test_login_merges_the_visitor_cart(self):
+        self.add(self.products[0], 2)
+        carts.DatabaseCart(self.user.pk).add(self.products[0].pk, 1)
+        self.client.post('/login/', {'user': 'buyer', 'password': 'pw'})
+
+        self.assertEqual(carts.DatabaseCart(self.user.pk).lines(), {self.products[0].pk: 3})
+        self.assertEqual(self.client.cookies[carts.COOKIE_NAME].value, '')
+
+    def test_customer_count_is_cached_and_kept_current(self):
+        self.client.force_login(self.user)
+        self.add(self.products[0], 2)
+        self.assertEqual(json.loads(self.client.get('/get-cart-count/').content)['total_quantity'], 2)
+
+        self.add(self.products[0], 1)
+        self.client.post(f'/cart/update/{self.products[1].pk}/', {'quantity': 4})
+        self.assertEqual(json.loads(self.client.get('/get-cart-count/').content)['total_quantity'], 7)
+
+        self.client.get(f'/cart/remove/{self.products[0].pk}/')
+        self.assertEqual(carts.DatabaseCart(self.user.pk).count(), 4)
+
+    def test_count_from_another_worker_expires(self):
+        carts.DatabaseCart(self.user.pk).add(self.products[0].pk, 2)
+        self.assertEqual(carts.count_for(self.user.pk), 2)
+        # Checkout handled by another worker: this process's copy is not told
+        CartLine.objects.filter(cart_id=self.user.pk).delete()
+        self.assertEqual(carts.count_for(self.user.pk), 2)
+        later = time.time() + carts.COUNT_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(carts.count_for(self.user.pk), 0)
+
+    def test_bad_additions_are_refused(self):
+        for login in (False, True):
+            if login:
+                self.client.force_login(self.user)
+            self.add(self.products[0], 2)
+            for product_id, quantity in ((self.products[0].pk, -5), (self.products[0].pk, 'x'), (9999, 1)):
+                response = self.client.post(
+                    f'/cart/add/{product_id}/', {'quantity': quantity}, headers={'x-requested-with': 'XMLHttpRequest'},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(json.loads(response.content)['total_items'], 2)
+            self.assertEqual(carts.get_cart(response.wsgi_request).lines(), {self.products[0].pk: 2})
+
+    def test_order_skips_products_removed_from_the_shop(self):
+        Customer.objects.create(user=self.user, username='buyer', first_name='A', last_name='B', phone='677000001', address='x')
+        self.client.force_login(self.user)
+        self.add(self.products[0], 2)
+        self.add(self.products[1], 1)
+        self.products[1].delete()
+        response = self.client.post('/place-order/', {'city': 'Douala', 'town': 'Akwa', 'phone': '677000001'})
+        order = Order.objects.get()
+        self.assertRedirects(response, f'/receipt/{order.order_number}/', fetch_redirect_response=False)
+        self.assertEqual(order.total_amount, 4)
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(self.products[0].pk, 2)])
+
+
+class SessionEngineTests(TestCase):
+    def setUp(self):
+        self.store = sessions.SessionStore()
+        self.store['visits'] = 1
+        self.store.create()
+        self.key = self.store.session_key
+        self.addCleanup(caches[settings.SESSION_CACHE_ALIAS].clear)
+
+    def request(self, change):
+        store = sessions.SessionStore(self.key)
+        change(store)
+        store.save()
+
+    def stored(self):
+        return Session.objects.get(session_key=self.key).get_decoded()
+
+    def test_unchanged_session_is_not_written(self):
+        with self.assertNumQueries(0):
+            self.request(lambda s: s.__setitem__('visits', s['visits']))
+
+    def test_process_local_cache_writes_through(self):
+        self.assertFalse(sessions.coalescing())  # LocMem in the test settings
+        self.request(lambda s: s.__setitem__('visits', 2))
+        self.assertEqual(self.stored()['visits'], 2)
+
+    @mock.patch.object(sessions, 'coalescing', return_value=True)
+    def test_quick_changes_are_coalesced_and_flushed(self, coalescing):
+        self.request(lambda s: s.__setitem__('visits', 1.5))  # a write-through starts the window
+        with self.assertNumQueries(0):
+            for visits in (2, 3, 4):
+                self.request(lambda s: s.__setitem__('visits', visits))
+        self.assertEqual(sessions.SessionStore(self.key)['visits'], 4)
+        self.assertEqual(self.stored()['visits'], 1.5)
+
+        self.assertEqual(sessions.flush_dirty(force=True), 1)
+        self.assertEqual(self.stored()['visits'], 4)
+
+    def test_login_is_written_through(self):
+        self.request(lambda s: s.__setitem__(SESSION_KEY, '7'))
+        self.assertEqual(self.stored()[SESSION_KEY], '7')
+
+    def test_prune_deletes_expired_sessions_in_batches(self):
+        Session.objects.filter(session_key=self.key).update(expire_date=timezone.now() - timedelta(days=1))
+        self.assertEqual(sessions.prune(batch_size=1), 1)
+        self.assertFalse(Session.objects.exists())
+
+
+class ProfileMiddlewareTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('seller', password='pw')
+        self.seller = Seller.objects.create(user=user, phone='1', address='x', hire_date=timezone.localdate())
+        self.client.force_login(user)
+        self.addCleanup(caches['default'].clear)
+
+    def test_profiles_are_loaded_once_and_cached(self):
+        factory = RequestFactory()
+        request = factory.get('/')
+        request.session = self.client.session
+        middleware = profiles.ProfileMiddleware(lambda request: request)
+        middleware(request)
+        with self.assertNumQueries(2):  # user, then user joined with its profiles
+            self.assertEqual(request.user.seller, self.seller)
+            self.assertFalse(hasattr(request.user, 'customer'))
+            self.assertEqual(request.user.seller.user, request.user)
+
+        request = factory.get('/')
+        request.session = self.client.session
+        middleware(request)
+        with self.assertNumQueries(1):  # user only
+            self.assertTrue(request.user.seller.is_active)
+
+    def test_profile_changes_invalidate_the_cache(self):
+        profiles.load(self.seller.user_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seller.is_active = False
+            self.seller.save()
+        self.assertFalse(profiles.load(self.seller.user_id)['seller'].is_active)
+
+
+class IdentifierBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ama', email='ama@example.com', password='pw')
+        Customer.objects.create(user=self.user, username='ama', first_name='A', last_name='B', phone='677000000', address='x')
+        self.addCleanup(caches[settings.LOGIN_THROTTLE_CACHE_ALIAS].clear)
+
+    def test_username_email_and_phone_log_in(self):
+        for identifier in ('ama', 'AMA@example.com', '677000000'):
+            self.assertEqual(authenticate(username=identifier, password='pw'), self.user)
+        self.assertIsNone(authenticate(username='677000000', password='wrong'))
+
+    def test_shared_email_identifies_nobody(self):
+        User.objects.create_user('other', email='ama@example.com', password='pw')
+        self.assertIsNone(authenticate(username='ama@example.com', password='pw'))
+
+    def test_password_is_checked_once_and_not_at_all_when_throttled(self):
+        with mock.patch.object(User, 'check_password', autospec=True, return_value=False) as check:
+            for _ in range(settings.LOGIN_THROTTLE_FAILURES + 3):
+                authenticate(username='ama@example.com', password='guess')
+        self.assertEqual(check.call_count, settings.LOGIN_THROTTLE_FAILURES)
+        self.assertTrue(authentication.is_throttled('AMA@example.com'))
+        # Other identifiers of the same account are counted separately
+        self.assertEqual(authenticate(username='ama', password='pw'), self.user)
+
+    def test_failures_are_shared_between_workers(self):
+        for _ in range(settings.LOGIN_THROTTLE_FAILURES):
+            authentication.record_failure('ama')
+        # A fresh connection to the alias stands in for another worker process
+        other_worker = caches.create_connection(settings.LOGIN_THROTTLE_CACHE_ALIAS)
+        self.assertGreaterEqual(other_worker.get(authentication._throttle_key('ama')), settings.LOGIN_THROTTLE_FAILURES)
+        authentication.reset_failures('ama')
+        self.assertIsNone(other_worker.get(authentication._throttle_key('ama')))
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Fruit')
+        supplier = Supplier.objects.create(name='Acme', contact_person='A', phone='1', address='x')
+        self.product = Product.objects.create(
+            name='Mango', buying_price=1, selling_price=2, unit='piece', quantity=10,
+            image='sample', category=category, supplier=supplier,
+        )
+        self.addCleanup(caches['default'].clear)
+        self.client.get('/shop/')  # sets the CSRF cookie, which is part of the ETag
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_product_page(self):
+        def restock():
+            self.product.quantity = 20
+            self.product.save()
+        self.assertRevalidates(f'/product_details/{self.product.pk}/', restock)
+
+    def test_listing_follows_catalogue_version(self):
+        def bulk_write():
+            # e.g. pos.py, which sets updated_at itself and sends no signal
+            Product.objects.filter(pk=self.product.pk).update(quantity=5, updated_at=timezone.now())
+        self.assertRevalidates('/shop/?q=mango', bulk_write)
+
+    def test_listing_follows_deletions(self):
+        make_product('Papaya')  # stays the newest row, so only the count changes
+        self.assertRevalidates('/shop/', lambda: Product.objects.filter(pk=self.product.pk).delete())
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        self.addCleanup(caches['template_fragments'].clear)
+
+    def test_category_menu_follows_category_changes(self):
+        self.assertNotContains(self.client.get('/shop/'), 'Herbs')
+        Category.objects.create(name='Herbs')
+        self.assertContains(self.client.get('/shop/'), 'Herbs')
+
+    def test_header_is_cached_per_role(self):
+        User.objects.create_user('staffer', password='pw', is_staff=True)
+        User.objects.create_user('buyer', password='pw')
+        self.assertContains(self.client.get('/about/'), 'Register')
+        self.client.login(username='staffer', password='pw')
+        self.assertContains(self.client.get('/about/'), 'Admin Dashboard')
+        self.client.login(username='buyer', password='pw')
+        response = self.client.get('/about/')
+        self.assertContains(response, 'buyer')
+        self.assertNotContains(response, 'Admin Dashboard')
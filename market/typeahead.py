@@ -0,0 +1,157 @@
+"""
+Product search for seller terminals (POS grid and stock table).
+
+Matching runs in Python over a compact in-process index of product names and
+categories, so each keystroke costs no more than one query: fetching the page
+of products actually returned (fresh price and stock). The index is rebuilt
+after a product is added, renamed or deleted, or a category renamed (once
+the write commits, so a rebuild cannot read the old rows), and after
+SEARCH_INDEX_TTL seconds.
+
+Ranking: name prefix, then prefix of another word in the name, then category
+prefix, then substring anywhere, then fuzzy (typo-tolerant) word matches.
+"""
+import difflib
+import re
+import threading
+import time
+
+from django.db import transaction
+
+from .models import Product
+
+SEARCH_INDEX_TTL = 300
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+FUZZY_CUTOFF = 0.75
+THUMBNAIL_SIZE = 120
+
+_index = None           # (built_at, entries, words, keys)
+_lock = threading.Lock()
+WORD_RE = re.compile(r'\w+')
+
+
+def _build_index():
+    entries = []        # (id, name, category, name words) lower-cased, sorted by name
+    words = {}          # word -> ids of products whose name/category has it
+    keys = {}           # id -> (name, category id), to spot renames cheaply
+    for product_id, name, category_id, category in Product.objects.order_by('name', 'id').values_list(
+        'id', 'name', 'category_id', 'category__name'
+    ):
+        keys[product_id] = (name, category_id)
+        name, category = name.lower(), (category or '').lower()
+        name_words = tuple(WORD_RE.findall(name))
+        entries.append((product_id, name, category, name_words))
+        for word in name_words + tuple(WORD_RE.findall(category)):
+            words.setdefault(word, set()).add(product_id)
+    return time.monotonic(), entries, words, keys
+
+
+def _get_index():
+    global _index
+    with _lock:
+        if _index is None or time.monotonic() - _index[0] > SEARCH_INDEX_TTL:
+            _index = _build_index()
+        return _index
+
+
+def invalidate():
+    global _index
+    with _lock:
+        _index = None
+
+
+def product_saved(product):
+    """Drops the index only if the saved product is new, renamed or recategorised."""
+    with _lock:
+        keys = _index[3] if _index else None
+    if keys is not None and keys.get(product.pk) != (product.name, product.category_id):
+        transaction.on_commit(invalidate)
+
+
+def _rank(query, entries, words):
+    """Product ids matching `query`, best first."""
+    if not query:
+        return [entry[0] for entry in entries]
+
+    terms = WORD_RE.findall(query)
+    buckets = ([], [], [], [])
+    matched = set()
+    for product_id, name, category, name_words in entries:
+        if name.startswith(query):
+            rank = 0
+        elif all(any(w.startswith(t) for w in name_words) for t in terms):
+            rank = 1
+        elif category.startswith(query):
+            rank = 2
+        elif query in name or query in category:
+            rank = 3
+        else:
+            continue
+        buckets[rank].append(product_id)
+        matched.add(product_id)
+
+    ranked = [product_id for bucket in buckets for product_id in bucket]
+
+    # Typos: every term must be close to some word of the product
+    if len(query) >= 3:
+        vocabulary = list(words)
+        fuzzy = None
+        for term in terms:
+            ids = set()
+            for word in difflib.get_close_matches(term, vocabulary, n=10, cutoff=FUZZY_CUTOFF):
+                ids |= words[word]
+            fuzzy = ids if fuzzy is None else fuzzy & ids
+        if fuzzy:
+            ranked += [entry[0] for entry in entries if entry[0] in fuzzy and entry[0] not in matched]
+    return ranked
+
+
+def _thumbnail(product):
+    if not product.image:
+        return None
+    try:
+        # Small Cloudinary rendition instead of the full-size upload
+        return product.image.build_url(
+            width=THUMBNAIL_SIZE, height=THUMBNAIL_SIZE, crop='fill',
+            quality='auto', fetch_format='auto', secure=True,
+        )
+    except AttributeError:
+        return product.image.url
+
+
+def search(query, page=1, page_size=PAGE_SIZE):
+    """
+    Returns one page of matches as compact dicts plus paging info:
+    {'results': [...], 'page': n, 'has_more': bool, 'total': n}
+    """
+    query = ' '.join((query or '').lower().split())
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+
+    _, entries, words, _ = _get_index()
+    ranked = _rank(query, entries, words)
+    start = (page - 1) * page_size
+    page_ids = ranked[start:start + page_size]
+
+    products = Product.objects.select_related('category').in_bulk(page_ids)
+    results = [
+        {
+            'id': product.id,
+            'name': product.name,
+            'category': product.category.name,
+            'price': str(product.selling_price),
+            'stock': product.quantity,
+            'unit': product.unit,
+            'low': product.quantity <= product.min_stock_level,
+            'thumb': _thumbnail(product),
+        }
+        for product in (products.get(pid) for pid in page_ids)
+        if product is not None
+    ]
+    return {
+        'results': results,
+        'page': page,
+        'has_more': start + page_size < len(ranked),
+        'total': len(ranked),
+    }
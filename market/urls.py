@@ -27,12 +27,20 @@ urlpatterns = [
 
   #admin_dashboard
   path('dashboard/', views.dashboard_home, name='dashboard_home'),
+  path('dashboard/charts/', views.dashboard_chart_data, name='dashboard_chart_data'),
+  path('dashboard/analytics/', views.analytics_overview, name='analytics_overview'),
+  path('dashboard/analytics/margins/', views.analytics_margins, name='analytics_margins'),
   path('dashboard/products/', views.manage_products, name='manage_products'),
   path('products/add/', views.add_product, name='add_product'), 
+  path('products/import/', views.import_products, name='import_products'),
+  path('dashboard/products/reorder/', views.reorder_suggestions, name='reorder_suggestions'),
   path('products/delete/<int:product_id>', views.product_delete, name='product_delete'), 
   path('product/edit/<int:product_id>/', views.add_product, name='edit_product'),
   path('sales/delete-all/', views.delete_all_sales, name='delete_all_sales'),
   path('reports/delete-all/', views.delete_all_reports, name='delete_all_reports'),
+  path('dashboard/purge/<int:job_id>/', views.purge_status, name='purge_status'),
+  path('dashboard/tasks/', views.task_status, name='task_status'),
+  path('dashboard/tasks/<int:task_id>/retry/', views.task_retry, name='task_retry'),
   path('dashboard/sellers/', views.manage_sellers, name='manage_sellers'),
   path('dashboard/sellers/create/', views.create_sellers, name='create_sellers'),
   path('dashboard/sellers/edit/<int:seller_id>', views.edit_sellers, name='edit_sellers'),
@@ -40,6 +48,10 @@ urlpatterns = [
   path('dashboard/expenses/', views.manage_expenses, name='manage_expenses'),
   path('dashboard/expenses/delete/<int:expenses_id>/', views.delete_expenses, name='delete_expenses'),
   path('dashboard/sales/report/', views.sales_report, name='sales_report'),
+  path('dashboard/export/sales/', views.export_sales, name='export_sales'),
+  path('dashboard/export/sales/<int:seller_id>/', views.export_sales, name='export_seller_sales'),
+  path('dashboard/export/orders/', views.export_orders, name='export_orders'),
+  path('dashboard/export/expenses/', views.export_expenses, name='export_expenses'),
   path('dashboard/order/', views.admin_order, name='admin_order'),
   path('dashboard/order/process/<int:order_id>/', views.admin_process_order, name='admin_process_order'),
   path('dashboard/<str:order_number>/print/', views.admin_receipt, name='admin_receipt'),
@@ -56,15 +68,21 @@ urlpatterns = [
   path('process/<str:order_number>/print', views.receipt, name='receipt'),
   path('seller/clear-orders/', views.clear_orders, name='clear_orders'),
   path('check-new-orders/', views.check_for_new_orders, name='check_for_new_orders'),
+  path('documents/receipt/<str:order_number>.pdf', views.receipt_pdf, name='receipt_pdf'),
+  path('documents/report/<int:report_id>.pdf', views.report_pdf, name='report_pdf'),
   
   
   #path('seller/pos-system/', views.pos_system, name='pos_system'),
-  #path('seller/process-sale/', views.process_sale, name='process_sale'),
+  path('seller/process-sale/', views.pos_sales_api, name='pos_sales_api'),
+  path('seller/scan/<str:code>/', views.pos_scan, name='pos_scan'),
+  path('seller/products/search/', views.pos_product_search, name='pos_product_search'),
+  path('api/catalogue/sync/', views.catalogue_sync, name='catalogue_sync'),
   #path('seller/receipt/<int:sale_id>/', views.sale_receipt, name='sale_receipt'),
 
   path('dashboard/sellers/toggle-status/<int:seller_id>/', views.toggle_seller_status, name='toggle_seller_status'),
 
   path('chatbot-response/', views.chatbot_response, name='chatbot_response'),
+  path('chatbot-response/<int:task_id>/', views.chatbot_reply, name='chatbot_reply'),
 
   
 ]
@@ -1,48 +1,46 @@
 # 1. Standard Library Imports
-import os
 import json
 import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from decimal import Decimal
-from datetime import timedelta
-from dotenv import load_dotenv
+from datetime import date, timedelta
 
-# 2. Third-Party Libraries (OpenAI, etc.)
-from openai import OpenAI
-
-# 3. Django Core Imports
+# 2. Django Core Imports
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, HttpResponseBadRequest
+from django.urls import reverse
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
 from django.contrib import messages
+from django.conf import settings
 
-# 4. Django Auth & Decorators
+# 3. Django Auth & Decorators
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 
-# 5. Django Database & Query Imports
-from django.db import models, transaction, IntegrityError
-from django.db.models import (
-    Sum, Count, Avg, F, Q, 
-    ExpressionWrapper, DecimalField, fields
-)
-from django.db.models.functions import TruncDay, TruncMonth, TruncYear
+# 4. Django Database & Query Imports
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, Count, Avg, F, Q
+from django.db.models.functions import TruncDay
 
-# 6. Local App Imports (Mom'shop Models and Forms)
+# 5. Local App Imports (Mom'shop Models and Forms)
 from .models import (
     Product, Category, Supplier, Seller, 
-    Customer, Order, OrderItem, Sale, 
-    Expenses, SalesReport
+    Order, OrderItem, Sale, 
+    Expenses, SalesReport, LowStockAlert, PurgeJob, BackgroundTask
 )
 from .forms import (
     CustomerRegistrationForm, ProductForm, 
-    SellerForm, ExpensesForm
+    SellerForm, ExpensesForm, ProductImportUploadForm
 )
+from . import analytics, authentication, carts, catalogue, charts, coldstore, exports, imports, receipts, documents, pos, profiles, profits, purge, scan, stock, tasks, typeahead, sync, watchlist
+from .routers import read_from_replica
 
 #___________________CUSTOMER/VISITOR SECTION______________
+@catalogue.conditional_page(catalogue.catalogue_state)
 def home(request):
     query = request.GET.get('q', '')
     category_slug = request.GET.get('category', '')
@@ -66,7 +64,7 @@ def home(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
-    categories = Category.objects.all()
+    categories = catalogue.categories(request)
     
     return render(request, 'home.html', {
         'products': page_obj,
@@ -76,6 +74,7 @@ def home(request):
         'current_category': category_slug
     })
 
+@catalogue.conditional_page(catalogue.catalogue_state)
 def shop(request):
     query = request.GET.get('q', '')
     category_slug = request.GET.get('category', '')
@@ -98,7 +97,7 @@ def shop(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
-    categories = Category.objects.all()
+    categories = catalogue.categories(request)
     
     return render(request, 'shop.html', {
         'products': page_obj,
@@ -139,36 +138,53 @@ def shop(request):
         'active_category': active_category,
     }'''
 
+def _posted_quantity(request):
+    """The posted quantity (default 1); 0 when it is not a whole number."""
+    try:
+        return int(request.POST.get('quantity', 1))
+    except ValueError:
+        return 0
+
 def add_to_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    quantity = int(request.POST.get('quantity', 1))
+    cart = carts.get_cart(request)
+    quantity = _posted_quantity(request)
     
-    # Logic to add to cart
-    cart[str(product_id)] = cart.get(str(product_id), 0) + quantity
-    request.session['cart'] = cart
-    request.session.modified = True
+    # Logic to add to cart (one cart line written, or the cookie for visitors)
+    added = cart.add(product_id, quantity)
 
     # Calculate new total items for the navbar badge
-    total_items = sum(int(qty) for qty in cart.values())
+    total_items = cart.count()
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        if not added:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'This product cannot be added to your cart.',
+                'total_items': total_items
+            }, status=400)
         return JsonResponse({
             'status': 'success',
             'message': 'Product added to cart!',
             'total_items': total_items
         })
 
+    if not added:
+        messages.error(request, "This product cannot be added to your cart.")
     return redirect('cart')
 
 def cart(request):
-    cart_session = request.session.get('cart', {})
+    basket = carts.get_cart(request)
+    lines = basket.lines()
     cart_items = []
     subtotal = Decimal('0.00')
     shipping_fee = Decimal('1000.00') # Defined shipping fee
 
-    # 1. Prepare display data for the template
-    for p_id, qty in cart_session.items():
-        product = get_object_or_404(Product, id=p_id)
+    # 1. Prepare display data for the template (products no longer sold are skipped)
+    products = Product.objects.in_bulk(list(lines))
+    for p_id, qty in lines.items():
+        if p_id not in products:
+            continue
+        product = products[p_id]
         total_price = Decimal(str(product.selling_price)) * int(qty)
         subtotal += total_price
         cart_items.append({
@@ -187,7 +203,7 @@ def cart(request):
             return redirect('login')
 
         if cart_items:
-            customer = get_object_or_404(Customer, user=request.user)
+            customer = profiles.profile_or_404(request.user, 'customer')
             transaction_id = str(uuid.uuid4())[:8].upper()
 
             # Create ONE Parent Order with the shipping included in total_amount
@@ -206,11 +222,11 @@ def cart(request):
                     order=order,
                     product=item['product'],
                     quantity=item['quantity'],
-                    price_at_purchase=item['product'].selling_price
+                    price_at_purchase=item['product'].selling_price,
+                    cost_at_purchase=item['product'].buying_price
                 )
 
-            request.session['cart'] = {}
-            request.session.modified = True
+            basket.clear()
             
             return redirect('order_success', order_number=transaction_id) 
         
@@ -227,40 +243,22 @@ def cart(request):
     })
 
 def remove_from_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    product_id_str = str(product_id)
-
-    if product_id_str in cart:
-        del cart[product_id_str]
-        request.session['cart'] = cart
-        request.session.modified = True
-    
+    carts.get_cart(request).remove(product_id)
     return redirect('cart')
 
 def update_cart(request, product_id):
     if request.method == 'POST':
-        cart = request.session.get('cart', {})
         # Get quantity from the JSON body or POST data
-        quantity = int(request.POST.get('quantity', 1))
-        product_id_str = str(product_id)
-        
-        if quantity > 0:
-            cart[product_id_str] = quantity
-        else:
-            cart.pop(product_id_str, None)
-            
-        request.session['cart'] = cart
-        request.session.modified = True
+        quantity = _posted_quantity(request)
         
-        # Calculate new total count
-        new_count = sum(cart.values())
+        # Zero or less removes the line
+        carts.get_cart(request).set(product_id, quantity)
         
-        return redirect('cart')
+    return redirect('cart')
 
 def get_cart_count(request):
-    cart = request.session.get('cart', {})
-    # Sum the quantities of all items in the cart
-    total_quantity = sum(cart.values())
+    # Answered from the cart cookie or the cached count, without loading the user
+    total_quantity = carts.count(request)
     return JsonResponse({'total_quantity': total_quantity})    
 
 def calculate_total(cart):
@@ -271,18 +269,26 @@ def calculate_total(cart):
     return total
 
 def place_order(request):
-    cart = request.session.get('cart', {})
+    basket = carts.get_cart(request)
+    cart = basket.lines()
     
     if request.method == 'POST' and cart:
         # 1. Setup basic info
         transaction_id = str(uuid.uuid4())[:8].upper()
-        customer = get_object_or_404(Customer, user=request.user)
+        customer = profiles.profile_or_404(request.user, 'customer')
         
+        # Products removed from the shop since they were added are skipped
+        products = Product.objects.in_bulk(list(cart))
+        cart = {p_id: qty for p_id, qty in cart.items() if p_id in products}
+        if not cart:
+            basket.clear()
+            messages.warning(request, "The products in your cart are no longer available.")
+            return redirect('cart')
+
         # Calculate total using Decimal for MySQL accuracy
         total = Decimal('0.00')
         for p_id, qty in cart.items():
-            product = Product.objects.get(id=p_id)
-            total += Decimal(str(product.selling_price)) * int(qty)
+            total += Decimal(str(products[p_id].selling_price)) * int(qty)
 
         # 2. CREATE THE ORDER (The Header)
         # NOTICE: We do NOT use 'ordered_product' or 'order_amount' here!
@@ -297,19 +303,19 @@ def place_order(request):
 
         # 3. CREATE THE ITEMS (The Details)
         for product_id, quantity in cart.items():
-            product = Product.objects.get(id=product_id)
+            product = products[product_id]
             
             # This is where your individual product info now lives
             OrderItem.objects.create(
                 order=order,
                 product=product,
                 quantity=quantity,
-                price_at_purchase=product.selling_price
+                price_at_purchase=product.selling_price,
+                cost_at_purchase=product.buying_price
             )
 
         # 4. Cleanup
-        request.session['cart'] = {}
-        request.session.modified = True
+        basket.clear()
         
         return redirect('print_receipt', order_number=transaction_id)
 
@@ -319,15 +325,12 @@ def order_success(request, order_number):
     return render(request, 'order_success.html', {'order_number': order_number})
 
 def print_receipt(request, order_number):
-    # Fetch the parent order
-    order = get_object_or_404(Order, order_number=order_number)
-    
-    # Fetch children items linked to this order
-    order_items = order.items.all() 
+    # Order, items and products are loaded (or served from the receipt cache) in one go
+    receipt_html = receipts.render_receipt(order_number, kind='customer')
 
     return render(request, 'receipt.html', {
-        'order': order,
-        'order_items': order_items,
+        'order_number': order_number,
+        'receipt_html': receipt_html,
     })
 
 def contact(request):
@@ -336,6 +339,7 @@ def contact(request):
 def about(request):
     return render(request, 'about.html')    
 
+@catalogue.conditional_page(catalogue.product_state)
 def product_details(request, pk):  # Ensure 'pk' is here!
     product = get_object_or_404(Product, pk=pk)
     return render(request, 'product_details.html', {'product': product})
@@ -373,22 +377,19 @@ def user_register(request):
 
 def user_login(request):
     if request.method == "POST":
-        user_identifier = request.POST.get("user")
+        user_identifier = request.POST.get("user", "")
         password = request.POST.get("password")
 
-        # Try to authenticate with username first
+        # Username, email or phone number, resolved in one query (market.authentication)
         user = authenticate(request, username=user_identifier, password=password)
-        
-        # If authentication fails, check if it might be an email
-        if user is None and '@' in user_identifier:
-            try:
-                user_obj = User.objects.get(email=user_identifier)
-                user = authenticate(request, username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                pass  # User doesn't exist with this email
+
+        if user is None and authentication.is_throttled(user_identifier):
+            messages.error(request, "Too many failed attempts. Please wait a few minutes and try again.")
+            return redirect('login')
 
         if user is not None:
             login(request, user)
+            profiles.attach(user)
             
             if hasattr(user, 'seller'):
                 seller = user.seller
@@ -403,7 +404,7 @@ def user_login(request):
                 return redirect('home')
              
         else:
-            messages.error(request, "Invalid username/email or password")
+            messages.error(request, "Invalid username/email/phone or password")
             return redirect('login')
 
     return render(request, 'login.html')
@@ -421,81 +422,81 @@ def is_admin(user):
     return user.is_authenticated and user.is_superuser
 
 @user_passes_test(is_admin, login_url='login')
+@read_from_replica
 def dashboard_home(request):
-    # Calculate timeframe for the chart (Last 15 days)
-    today = timezone.now()
-    chart_start_date = today - timedelta(days=15)
-
-    # 1. Daily Sales Trend (MODIFIED)
-    daily_sales = Sale.objects.filter(sale_date__gte=chart_start_date) \
-        .annotate(day=TruncDay('sale_date')) \
-        .values('day') \
-        .annotate(total=Sum('sale_amount')) \
-        .order_by('day')
-
-    # Format for Chart.js: "31 Dec"
-    sales_labels = [s['day'].strftime("%d %b") if s['day'] else "Unknown" for s in daily_sales]
-    sales_data = [float(s['total']) if s['total'] else 0 for s in daily_sales]
-
-    # 2. Top 5 Products (Using your ManyToMany field 'products')
-    # We count how many times each product appears across all Sales
-    top_products = Sale.objects.values('products__name') \
-        .filter(products__name__isnull=False) \
-        .annotate(total_sold=Count('products')) \
-        .order_by('-total_sold')[:5]
-
-    product_labels = [p['products__name'] for p in top_products]
-    product_data = [p['total_sold'] for p in top_products]
-    # Calculate dates for the last 30 days
+    """
+    KPIs for the last 30 days; the charts load from dashboard_chart_data
+    """
     today = timezone.now()
     thirty_days_ago = today - timedelta(days=30)
-    
-    # --- 1. KPI Calculations ---
-    
-    # Total Sales (Last 30 Days)
-    total_sales_qs = Sale.objects.filter(sale_date__gte=thirty_days_ago).aggregate(
-        total=Sum('sale_amount')
-    )
-    total_sales = total_sales_qs['total'] or 0
-    
-    # Total Expenses (Last 30 Days)
-    total_expenses_qs = Expenses.objects.filter(expenses_date__gte=thirty_days_ago.date()).aggregate(
-        total=Sum('amount')
-    )
-    total_expenses = total_expenses_qs['total'] or 0
-
-    # Net Profit (Approximation: Sale Price - Buying Price)
-    # NOTE: This requires mapping the Sale back to the original Product for cost calculation.
-    # Given the current Sale model links to a single Product, we can estimate:
-    net_profit_calc = Sale.objects.filter(sale_date__gte=thirty_days_ago).annotate(
-        cost_of_goods=F('products__buying_price'),
-        profit=ExpressionWrapper(F('sale_amount') - F('cost_of_goods'), output_field=fields.DecimalField())
-    ).aggregate(total_profit=Sum('profit'))
-    
-    # Final Net Profit (must account for other business expenses)
-    net_profit = (net_profit_calc['total_profit'] or 0) - total_expenses
-    
-    # Active Sellers Count
-    active_sellers_count = Seller.objects.count()
-    
-    # --- 2. Chart Data (Basic Example) ---
-    # In a real app, you'd calculate monthly sales and top product units sold here
-    # and format them into a JSON structure suitable for Chart.js.
 
+    def kpis():
+        # --- 1. KPI Calculations ---
+        # Archived months in the window count too (all sales, like the hot figures)
+        window = (timezone.localtime(thirty_days_ago).date(), timezone.localdate())
+        archived = coldstore.sales_figures(*window, completed_only=False)
+
+        # Total Sales (Last 30 Days)
+        total_sales = (Sale.objects.filter(sale_date__gte=thirty_days_ago).aggregate(
+            total=Sum('sale_amount')
+        )['total'] or 0) + Decimal(str(archived['revenue']))
+
+        # Total Expenses (Last 30 Days)
+        total_expenses = Expenses.objects.filter(expenses_date__gte=thirty_days_ago.date()).aggregate(
+            total=Sum('amount')
+        )['total'] or 0
+
+        # Gross Profit (sale amount - cost captured on each sale, no join to Product)
+        recent_sales = Sale.objects.filter(sale_date__gte=thirty_days_ago)
+        gross = profits.with_archived(profits.summary(recent_sales), archived)
+
+        return {
+            'total_sales': total_sales,
+            'total_expenses': total_expenses,
+            # Final Net Profit (must account for other business expenses)
+            'net_profit': gross['profit'] - total_expenses,
+            'gross_margin': gross['margin'],
+            'category_margins': profits.breakdown(
+                recent_sales, 'category', archived=coldstore.sales_by_category(*window, completed_only=False),
+            ),
+        }
+
+    # Cached until the next sale or expense (charts.invalidate)
+    context = charts.cached(kpis, 'dashboard_kpis', today.date())
     context = {
-        'total_sales': total_sales,
-        'total_expenses': total_expenses,
-        'net_profit': net_profit,
-        'active_sellers_count': active_sellers_count,
-        'sales_labels_json': json.dumps(sales_labels),
-        'sales_data_json': json.dumps(sales_data),
-        'product_labels_json': json.dumps(product_labels),
-        'product_data_json': json.dumps(product_data),
-        # Placeholder for chart data: 'sales_chart_data': [ ... ],
+        **context,
+        # Active Sellers Count
+        'active_sellers_count': Seller.objects.count(),
+        'sellers': Seller.objects.select_related('user').order_by('user__username'),
+        'categories': Category.objects.order_by('name'),
     }
     return render(request, 'admin/dashboard_home.html', context)
 
-import cloudinary.uploader # Needed for manual deletion
+@user_passes_test(is_admin, login_url='login')
+@read_from_replica
+def dashboard_chart_data(request):
+    """
+    Chart series as JSON: ?metric=revenue|profit|expenses|top_products
+    &granularity=day|week|month|year&start=YYYY-MM-DD&end=YYYY-MM-DD[&seller=&category=]
+    """
+    today = timezone.localdate()
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=29)
+        seller_id = int(request.GET['seller']) if request.GET.get('seller') else None
+        category_id = int(request.GET['category']) if request.GET.get('category') else None
+        limit = min(int(request.GET.get('limit', charts.TOP_PRODUCTS)), 50)
+        data = charts.data(
+            request.GET.get('metric', 'revenue'), request.GET.get('granularity', 'day'),
+            start, end, seller_id=seller_id, category_id=category_id, limit=limit,
+        )
+    except ValueError as e:  # includes charts.ChartError
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.db.models import F
@@ -521,8 +522,15 @@ def manage_products(request):
     if search_query:
         products = products.filter(name__icontains=search_query)
     
-    # Low stock alert
-    low_stock_count = products.filter(quantity__lte=F('min_stock_level')).count()
+    # Low stock alert, read from the precomputed watchlist
+    alerts = LowStockAlert.objects.filter(below_minimum=True)
+    if category_filter:
+        alerts = alerts.filter(product__category_id=category_filter)
+    if supplier_filter:
+        alerts = alerts.filter(product__supplier_id=supplier_filter)
+    if search_query:
+        alerts = alerts.filter(product__name__icontains=search_query)
+    low_stock_count = alerts.count()
     
     context = {
         'products': products,
@@ -557,10 +565,30 @@ def add_product(request, product_id=None):
                 product = form.save(commit=False)
                 if not product_id:
                     product.created_by = request.user
+
+                # The Cloudinary upload runs in the background worker; keep the
+                # current image until it is done
+                upload = None
+                if 'image' in request.FILES:
+                    upload = tasks.stash_upload(request.FILES['image'])
+                    product.image = Product.objects.filter(pk=product.pk).values_list('image', flat=True).first()
                 
-                product.save() # Cloudinary upload happens here automatically
+                with transaction.atomic():
+                    # Quantity edits go through the ledger like any other stock change;
+                    # the row stays locked so no sale moves it between read and write
+                    old_quantity = Product.objects.select_for_update().filter(pk=product.pk).values_list('quantity', flat=True).first() or 0
+                    product.save()
+                    form.save_barcodes(product)
+                    stock.record([stock.movement(
+                        product, 'adjustment' if product_id else 'opening',
+                        product.quantity - old_quantity, reference='product form', user=request.user,
+                    )])
+                    if upload:
+                        tasks.upload_product_image.enqueue_on_commit(product.id, upload)
                 
                 messages.success(request, success_message)
+                if upload:
+                    messages.info(request, "The image is being uploaded and will appear shortly.")
                 
                 if 'save_and_add_another' in request.POST:
                     return redirect('add_product')
@@ -585,6 +613,48 @@ def add_product(request, product_id=None):
     }
     return render(request, 'admin/add_product.html', context)
 
+@user_passes_test(is_admin, login_url='login')
+def reorder_suggestions(request):
+    """
+    Low-stock watchlist grouped by supplier, with days to stockout and reorder quantities
+    """
+    context = {
+        'page_title': "Reorder Suggestions",
+        'groups': watchlist.by_supplier(),
+        'lead_time_days': watchlist.LEAD_TIME_DAYS,
+        'cover_days': watchlist.COVER_DAYS,
+    }
+    return render(request, 'admin/reorder_suggestions.html', context)
+
+@user_passes_test(is_admin, login_url='login')
+def import_products(request):
+    """
+    Bulk add products / update stock from a supplier CSV (with dry-run preview)
+    """
+    report = None
+
+    if request.method == 'POST':
+        form = ProductImportUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            report = imports.import_products(
+                imports.read_rows(form.cleaned_data['csv_file']),
+                stock_mode=form.cleaned_data['stock_mode'],
+                dry_run=form.cleaned_data['dry_run'],
+            )
+            if report.errors:
+                messages.warning(request, report.summary())
+            else:
+                messages.success(request, report.summary())
+    else:
+        form = ProductImportUploadForm()
+
+    context = {
+        'form': form,
+        'report': report,
+        'page_title': 'Import Products from CSV',
+    }
+    return render(request, 'admin/import_products.html', context)
+
 @user_passes_test(is_admin, login_url='login')
 def product_delete(request, product_id=None):
     """
@@ -593,17 +663,14 @@ def product_delete(request, product_id=None):
     product = get_object_or_404(Product, id=product_id)
 
     if request.method == 'POST':
-        # 1. Delete image from Cloudinary if it exists
-        if product.image:
-            try:
+        with transaction.atomic():
+            # 1. Delete image from Cloudinary (in the background) if it exists
+            if product.image and product.image.public_id:
                 # We use the public_id to tell Cloudinary which file to delete
-                cloudinary.uploader.destroy(product.image.public_id)
-            except Exception as e:
-                # We log the error but continue deleting the product record
-                print(f"Cloudinary deletion failed: {e}")
-        
-        # 2. Delete database record
-        product.delete()
+                tasks.delete_cloudinary_image.enqueue_on_commit(product.image.public_id)
+
+            # 2. Delete database record
+            product.delete()
         
         messages.success(request, f'Product {product.name} deleted successfully!')
         return redirect('manage_products') 
@@ -613,17 +680,127 @@ def product_delete(request, product_id=None):
 @user_passes_test(is_admin, login_url='login')
 def delete_all_sales(request):
     if request.method == "POST":
-        # Filter to ensure the seller only deletes THEIR own sales
-        my_sales = Sale.objects.filter()
-        count = my_sales.count()
-        
-        if count > 0:
-            my_sales.delete()
-            messages.success(request, f"Successfully cleared {count} sales from your record.")
+        return _start_purge(request, 'sales', 'dashboard_home')
+    return redirect('dashboard_home')
+
+def _start_purge(request, target, back_to):
+    """
+    Starts a chunked background purge of `target` and shows its progress page
+    """
+    model = purge.TARGETS[target][0]
+    if not model.objects.exists():
+        messages.info(request, f"There were no {target} to delete.")
+        return redirect(back_to)
+
+    purge.release_abandoned()
+    running = PurgeJob.objects.filter(target=target, status__in=['pending', 'running']).first()
+    if running:
+        messages.warning(request, f"A purge of {target} is already running.")
+        return redirect('purge_status', job_id=running.id)
+
+    with transaction.atomic():
+        job = PurgeJob.objects.create(target=target, started_by=request.user)
+        tasks.purge_table.enqueue_on_commit(job.id, archive='archive' in request.POST)
+    messages.success(request, f"Clearing all {target} in the background.")
+    return redirect('purge_status', job_id=job.id)
+
+@user_passes_test(is_admin, login_url='login')
+def purge_status(request, job_id):
+    """
+    Progress of a purge job (?format=json for polling)
+    """
+    job = get_object_or_404(PurgeJob, id=job_id)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'status': job.status,
+            'total': job.total,
+            'deleted': job.deleted,
+            'percent': job.percent,
+            'archive_path': job.archive_path,
+            'error': job.error.strip().splitlines()[-1] if job.error else '',
+        })
+    back_to = {'sales': 'dashboard_home', 'reports': 'sales_report', 'orders': 'admin_order'}[job.target]
+    return render(request, 'admin/purge_status.html', {'job': job, 'back_to': back_to})
+
+@staff_member_required(login_url='login')
+def task_status(request):
+    """
+    Background task queue: counts per status, what is running and recent failures
+    """
+    counts = dict(BackgroundTask.objects.values_list('status').annotate(n=Count('id')).order_by())
+    counts = {status: counts.get(status, 0) for status, _ in BackgroundTask.STATUSES}
+    if request.GET.get('format') == 'json':
+        return JsonResponse(counts)
+
+    context = {
+        'page_title': "Background Tasks",
+        'counts': counts,
+        'running': BackgroundTask.objects.filter(status='running').order_by('locked_at'),
+        'upcoming': BackgroundTask.objects.filter(status='queued').order_by('run_at')[:20],
+        'failed': BackgroundTask.objects.filter(status='failed').order_by('-finished_at')[:20],
+        'recent': BackgroundTask.objects.filter(status='done').order_by('-finished_at')[:20],
+    }
+    return render(request, 'admin/task_status.html', context)
+
+@staff_member_required(login_url='login')
+def task_retry(request, task_id):
+    """Queues a failed task again with a fresh set of attempts"""
+    if request.method == 'POST':
+        updated = BackgroundTask.objects.filter(id=task_id, status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None, updated_at=timezone.now(),
+        )
+        if updated:
+            messages.success(request, f"Task #{task_id} queued again.")
         else:
-            messages.info(request, "There were no sales to delete.")
-            
-        return redirect('dashboard_home')
+            messages.warning(request, f"Task #{task_id} is not a failed task.")
+    return redirect('task_status')
+
+def _report_month(request):
+    """?month=YYYY-MM as an analytics month index (default: this month)"""
+    try:
+        year, month = (int(part) for part in request.GET['month'].split('-'))
+        if 1 <= month <= 12:
+            return analytics.month_index(year, month)
+    except (KeyError, ValueError):
+        pass
+    return analytics.month_of(timezone.localdate())
+
+@user_passes_test(is_admin, login_url='login')
+@read_from_replica
+def analytics_overview(request):
+    """
+    Month-by-month revenue, profit, expenses and category revenue with MoM/YoY changes
+    """
+    month = _report_month(request)
+    try:
+        months = min(max(int(request.GET.get('months', 12)), 3), 36)
+    except ValueError:
+        months = 12
+    # Cached until the next sale or expense (charts.invalidate)
+    report = charts.cached(lambda: analytics.monthly_overview(month, months), 'analytics_overview', month, months)
+    context = {
+        'page_title': "Monthly Business Report",
+        'report': report,
+        'month': analytics.month_label(month),
+        'months_shown': months,
+    }
+    return render(request, 'admin/analytics_overview.html', context)
+
+@user_passes_test(is_admin, login_url='login')
+@read_from_replica
+def analytics_margins(request):
+    """
+    Products whose gross margin changed most against last month or last year
+    """
+    month = _report_month(request)
+    compare = 'mom' if request.GET.get('compare') == 'mom' else 'yoy'
+    report = charts.cached(lambda: analytics.margin_changes(month, compare), 'analytics_margins', month, compare)
+    context = {
+        'page_title': "Margin Changes by Product",
+        'report': report,
+        'month': analytics.month_label(month),
+    }
+    return render(request, 'admin/analytics_margins.html', context)
 
 @user_passes_test(is_admin, login_url='login')
 def manage_sellers(request):
@@ -817,23 +994,16 @@ def edit_sellers(request, seller_id):
     return render(request, 'admin/edit_sellers.html', context)
 
 @user_passes_test(is_admin, login_url='login')
+@read_from_replica
 def manage_expenses(request):
     """
     Manage and track business expenditures
     """
-    expenses = Expenses.objects.all().order_by('-expenses_date')
-    
-    # Filtering
-    expense_type = request.GET.get('type')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
-    if expense_type:
-        expenses = expenses.filter(type=expense_type)
-    if start_date:
-        expenses = expenses.filter(expenses_date__gte=start_date)
-    if end_date:
-        expenses = expenses.filter(expenses_date__lte=end_date)
+    # Filtering (shared with the CSV export)
+    try:
+        expenses = exports.filter_expenses(request.GET).order_by('-expenses_date')
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
     
     if request.method == 'POST':
         form = ExpensesForm(request.POST)
@@ -879,6 +1049,7 @@ def delete_expenses(request, expenses_id):
     return render(request, 'admin/delete_expenses.html', {'expenses': expenses})
 
 @user_passes_test(is_admin, login_url='login')
+@read_from_replica
 def sales_report(request):
     """
     Displays a history of all daily/monthly sales reports generated.
@@ -895,17 +1066,8 @@ def sales_report(request):
 @user_passes_test(is_admin, login_url='login')
 def delete_all_reports(request):
     if request.method == "POST":
-        # Filter to ensure the seller only deletes THEIR own sales
-        my_reports = SalesReport.objects.filter()
-        count = my_reports.count()
-        
-        if count > 0:
-            my_reports.delete()
-            messages.success(request, f"Successfully cleared {count} reports from your record.")
-        else:
-            messages.info(request, "There were no report to delete.")
-            
-        return redirect('sales_report')
+        return _start_purge(request, 'reports', 'sales_report')
+    return redirect('sales_report')
 
 
 def toggle_seller_status(request, seller_id):
@@ -922,6 +1084,7 @@ def toggle_seller_status(request, seller_id):
     return redirect('manage_sellers')
 
 @user_passes_test(is_admin, login_url='login')
+@read_from_replica
 def seller_sales_report(request, seller_id):
     """View sales report for a specific seller"""
     seller = get_object_or_404(Seller, id=seller_id)
@@ -946,21 +1109,44 @@ def seller_sales_report(request, seller_id):
         # FIX 2: Change 'average_sale' to use the correct field 'sale_amount'
         average_sale=Avg('sale_amount')
     )
+    profit = profits.summary(sales)
+    product_margins = profits.breakdown(sales, 'product', limit=10)
+
+    # Months moved to cold storage still count towards the period
+    archived = coldstore.sales_figures(start_date, end_date, seller_id=seller.id)
+    if archived['transactions']:
+        revenue = (total_sales['total_revenue'] or 0) + Decimal(str(archived['revenue']))
+        count = total_sales['total_transactions'] + archived['transactions']
+        total_sales = {'total_revenue': revenue, 'total_transactions': count, 'average_sale': revenue / count}
+        profit = profits.with_archived(profit, archived)
     
     # Daily sales trend
-    daily_sales = sales.annotate(
+    daily_sales = {}
+    for row in sales.annotate(
         day=TruncDay('sale_date')
     ).values('day').annotate(
         # FIX 3: Change 'daily_revenue' to use the correct field 'sale_amount'
         daily_revenue=Sum('sale_amount'), 
         daily_transactions=Count('id')
-    ).order_by('day')
+    ).order_by('day'):
+        daily_sales[row['day'].date()] = [float(row['daily_revenue'] or 0), row['daily_transactions']]
+    for day, row in coldstore.daily_sales(start_date, end_date, seller_id=seller.id).items():
+        totals = daily_sales.setdefault(day, [0, 0])
+        totals[0] += row['total_revenue']
+        totals[1] += row['transactions']
+    daily_sales = [
+        {'day': day.isoformat(), 'daily_revenue': revenue, 'daily_transactions': count}
+        for day, (revenue, count) in sorted(daily_sales.items())
+    ]
     
     context = {
         'seller': seller,
         'sales': sales,
         'total_sales': total_sales,
-        'daily_sales': list(daily_sales),
+        'profit': profit,
+        'product_margins': product_margins,
+        'daily_sales': daily_sales,
+        'daily_sales_json': json.dumps(daily_sales),
         'days': days,
         'start_date': start_date,
         'end_date': end_date,
@@ -968,6 +1154,43 @@ def seller_sales_report(request, seller_id):
     
     return render(request, 'admin/seller_sales_report.html', context)
 
+@user_passes_test(is_admin, login_url='login')
+@read_from_replica
+def export_sales(request, seller_id=None):
+    """
+    Streams the filtered Sale rows as CSV (?format=excel, ?compress=gzip).
+    """
+    try:
+        sales = exports.filter_sales(request.GET, seller_id=seller_id)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    filename = f"sales_seller_{seller_id}" if seller_id else "sales"
+    return exports.streaming_csv_response(filename, exports.SALE_COLUMNS, sales, request.GET)
+
+@user_passes_test(is_admin, login_url='login')
+@read_from_replica
+def export_orders(request):
+    """
+    Streams one CSV row per ordered item, with the order header repeated.
+    """
+    try:
+        items = exports.filter_order_items(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return exports.streaming_csv_response("orders", exports.ORDER_ITEM_COLUMNS, items, request.GET)
+
+@user_passes_test(is_admin, login_url='login')
+@read_from_replica
+def export_expenses(request):
+    """
+    Streams the expenses matching the manage_expenses filters as CSV.
+    """
+    try:
+        expenses = exports.filter_expenses(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return exports.streaming_csv_response("expenses", exports.EXPENSE_COLUMNS, expenses, request.GET)
+
 @user_passes_test(is_admin, login_url='login')
 def admin_order(request):
     # Only show orders that haven't been processed yet
@@ -991,9 +1214,10 @@ def admin_process_order(request, order_id):
         # seller_profile = Seller.objects.get_or_create(user=request.user, defaults={'store_name': 'Admin Store'})[0]
     else:
         # For regular sellers, keep the standard 404 behavior
-        seller_profile = get_object_or_404(Seller, user=request.user)
+        seller_profile = profiles.profile_or_404(request.user, 'seller')
     
     running_total = 0
+    movements = []
     
     for item in order.items.all():
         product = item.product
@@ -1003,6 +1227,7 @@ def admin_process_order(request, order_id):
             # 1. Update Inventory
             product.quantity = F('quantity') - actual_qty
             product.save()
+            movements.append(stock.movement(product, 'order', -actual_qty, reference=order.order_number, user=request.user))
 
             # 2. Update OrderItem fulfilled quantity
             item.quantity = actual_qty
@@ -1016,6 +1241,9 @@ def admin_process_order(request, order_id):
                 seller=seller_profile,
                 products=product,
                 sale_amount=subtotal,
+                quantity=actual_qty,
+                cost_amount=actual_qty * item.cost_at_purchase,
+                category_id=product.category_id,
                 # You can pull payment_method from a form or default to 'cash'
                 payment_method='cash', 
                 is_completed=True
@@ -1024,12 +1252,17 @@ def admin_process_order(request, order_id):
             item.quantity = 0
             item.save()
 
+    stock.record(movements)
+
     # 4. Finalize Order
     order.total_amount = running_total
     order.is_processed = True
     order.status = 'Processed'
     order.save()
 
+    # Render the PDF receipt in the background once the order is committed
+    transaction.on_commit(lambda: documents.submit_receipt(order.order_number))
+
     messages.success(request, f"Order #{order.order_number} processed and Sales recorded.")
     return redirect('admin_receipt', order_number=order.order_number)
 
@@ -1041,24 +1274,19 @@ def admin_receipt(request, order_number):
     """
     # We use order_number (the unique CharField) instead of ID for cleaner URLs
     # and better security/privacy.
-    order = get_object_or_404(Order, order_number=order_number)
-    
-    # We don't need to fetch OrderItems separately because we used 
-    # related_name='items' in the model. We can access them via order.items.all() 
-    # directly in the template.
+    # Processed orders never change, so reprints come from the receipt cache
+    # without touching the database.
+    receipt_html = receipts.render_receipt(order_number, kind='order')
     
     return render(request, 'admin/admin_receipt.html', {
-        'order': order,
+        'order_number': order_number,
+        'receipt_html': receipt_html,
     })
 
 @user_passes_test(is_admin, login_url='login')
 def clear_orders(request):
     if request.method == 'POST':
-        count = Order.objects.count()
-        Order.objects.all().delete()
-        
-        messages.success(request, f"Successfully cleared {count} orders from the database.")
-        return redirect('admin_order')
+        return _start_purge(request, 'orders', 'admin_order')
     
     # If someone tries to access via GET, just send them back
     return redirect('admin_order')
@@ -1074,33 +1302,31 @@ def seller_dashboard(request):
         logout(request)
         messages.error(request, "Seller profile not found.")
         return redirect('login')
-    # 1. Product Consultation (Filterable)
-    search_query = request.GET.get('search', '')
-    products = Product.objects.all().order_by('name')
-    if search_query:
-        products = products.filter(Q(name__icontains=search_query) | Q(category__name__icontains=search_query))
+    # 1. Products are loaded page by page from pos_product_search, so this page
+    #    stays the same size whatever the catalogue holds
 
     # 2. Reporting Logic (Today vs Month)
     today = timezone.now().date()
     month_start = today.replace(day=1)
     
-    daily_sales = Sale.objects.filter(seller=request.user.seller, sale_date__date=today, is_completed=True)
-    monthly_sales = Sale.objects.filter(seller=request.user.seller, sale_date__date__gte=month_start, is_completed=True)
+    daily_sales = Sale.objects.filter(seller=seller, sale_date__date=today, is_completed=True)
+    monthly_sales = Sale.objects.filter(seller=seller, sale_date__date__gte=month_start, is_completed=True)
 
     # 3. Credits (is_completed=False logic)
-    active_credits = Sale.objects.filter(seller=request.user.seller, is_completed=False).order_by('-sale_date')
+    active_credits = Sale.objects.filter(seller=seller, is_completed=False).order_by('-sale_date')
 
     context = {
-        'products': products,
+        'search_query': request.GET.get('search', ''),
         'today_total': daily_sales.aggregate(Sum('sale_amount'))['sale_amount__sum'] or 0,
         'month_total': monthly_sales.aggregate(Sum('sale_amount'))['sale_amount__sum'] or 0,
         'today_count': daily_sales.count(),
         'active_credits': active_credits,
-        'low_stock': Product.objects.filter(quantity__lte=models.F('min_stock_level'))
+        'low_stock': LowStockAlert.objects.filter(below_minimum=True)
     }
     return render(request, 'seller/seller_dashboard.html', context)
 
 
+@transaction.atomic
 def process_sale(request):
     try:
         seller = request.user.seller
@@ -1114,15 +1340,19 @@ def process_sale(request):
         payment_method = request.POST.get('payment_method')
         is_completed = 'is_completed' in request.POST
         
+        movements = []
         # In a real system, you'd create one "Invoice" and multiple "SaleItems"
         # For your current model, we loop:
         for p_id, qty in zip(product_ids, quantities):
-            product = get_object_or_404(Product, id=p_id)
+            # Locked: the quantity written back below is computed from this read
+            product = get_object_or_404(Product.objects.select_for_update(), id=p_id)
             for _ in range(int(qty)): # Creating records based on quantity
                 Sale.objects.create(
-                    seller=request.user.seller,
+                    seller=seller,
                     products=product,
                     sale_amount=product.selling_price,
+                    cost_amount=product.buying_price,
+                    category_id=product.category_id,
                     payment_method=payment_method,
                     is_completed=is_completed
                 )
@@ -1130,10 +1360,101 @@ def process_sale(request):
             if is_completed:
                 product.quantity -= int(qty)
                 product.save()
+                movements.append(stock.movement(product, 'sale', -int(qty), reference='counter sale', user=request.user))
 
+        stock.record(movements)
         messages.success(request, "Transaction completed!")
         return redirect('seller_dashboard')
 
+@login_required
+def pos_sales_api(request):
+    """
+    JSON sale ingestion for POS terminals: one basket, or {"baskets": [...]}
+    flushed from a terminal's offline queue. Baskets carry idempotency keys.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    try:
+        seller = request.user.seller
+    except Seller.DoesNotExist:
+        return JsonResponse({'error': 'Seller profile not found.'}, status=403)
+    if not seller.is_active:
+        return JsonResponse({'error': 'Your seller account is deactivated.'}, status=403)
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    single = isinstance(payload, dict) and 'baskets' not in payload
+    if single:
+        # A bare basket from seller/pos.html; it must carry its key like the others
+        baskets = [payload]
+    else:
+        baskets = payload.get('baskets') if isinstance(payload, dict) else payload
+
+    if not isinstance(baskets, list) or not 0 < len(baskets) <= pos.MAX_BATCH_SIZE:
+        return JsonResponse({'error': f'Send between 1 and {pos.MAX_BATCH_SIZE} baskets.'}, status=400)
+
+    try:
+        results = pos.ingest_baskets(seller, baskets)
+    except IntegrityError:
+        # Another upload recorded one of these keys at the same moment
+        return JsonResponse({'error': 'Conflict, please resend the batch.'}, status=409)
+
+    if single:
+        result = results[0]
+        ok = result['status'] != 'rejected'
+        return JsonResponse({'success': ok, **result}, status=200 if ok else 400)
+    return JsonResponse({'results': results})
+
+@login_required
+def pos_scan(request, code):
+    """
+    Barcode lookup for the POS scanner, served from the in-process scan cache
+    """
+    product = scan.lookup(code.strip())
+    if product is None:
+        return JsonResponse({'found': False, 'error': f"No product with barcode '{code}'."}, status=404)
+    return JsonResponse({'found': True, 'product': product})
+
+@login_required
+def pos_product_search(request):
+    """
+    Paginated typeahead for seller terminals: ?q=&page=&page_size=
+    """
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', typeahead.PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'page and page_size must be integers'}, status=400)
+    return JsonResponse(typeahead.search(request.GET.get('q', ''), page=page, page_size=page_size))
+
+@login_required
+def catalogue_sync(request):
+    """
+    Delta sync feed for terminals and delivery agents: ?since=<token from the last call>
+    """
+    user = request.user
+    if not (user.is_staff or hasattr(user, 'seller') or hasattr(user, 'deliveryagent')):
+        return JsonResponse({'error': 'Not allowed'}, status=403)
+
+    try:
+        data = sync.changes(request.GET.get('since', ''))
+    except sync.SyncTokenError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    etag = data.pop('etag')
+    if request.headers.get('If-None-Match') == etag:
+        # Nothing new: the client keeps its copy and its token
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 def generate_daily_report(request):
     try:
         seller = request.user.seller
@@ -1142,35 +1463,15 @@ def generate_daily_report(request):
         messages.error(request, "Seller profile not found.")
         return redirect('login')
     today = timezone.now().date()
-    
-    # 1. Aggregate Today's Sales
-    sales_today = Sale.objects.filter(sale_date__date=today, is_completed=True)
-    
-    if not sales_today.exists():
+
+    if not Sale.objects.filter(is_completed=True, sale_date__date=today).exists():
         messages.error(request, "No completed sales found for today to generate a report.")
         return redirect('seller_dashboard')
 
-    summary = sales_today.aggregate(
-        total_revenue=Sum('sale_amount'),
-        customer_count=Count('id'),
-        cash_total=Sum('sale_amount', filter=models.Q(payment_method='cash')),
-        momo_total=Sum('sale_amount', filter=models.Q(payment_method='mobile_money'))
-    )
-
-    # 2. Create or Update the SalesReport
-    report, created = SalesReport.objects.update_or_create(
-        report_date=today,
-        defaults={
-            'total_sales': summary['total_revenue'] or 0,
-            'total_customers': summary['customer_count'] or 0,
-            'cash_sales': summary['cash_total'] or 0,
-            'mobile_money_sales': summary['momo_total'] or 0,
-            'generated_by': request.user.seller,
-            'total_products_sold': summary['customer_count'] # Simplified for 1 product per sale
-        }
-    )
+    # Builds today's report plus any day since the last report that was never generated
+    tasks.build_daily_reports.enqueue(seller.id, today.isoformat())
 
-    messages.success(request, f"Daily report for {today} generated successfully!")
+    messages.success(request, f"Daily report for {today} is being generated and will appear in the list shortly.")
     return redirect('sales_report_list')
 
 def sales_report_list(request):
@@ -1185,7 +1486,7 @@ def sales_report_list(request):
     """
     # Fetch reports for the logged-in seller, newest first
     reports = SalesReport.objects.filter(
-        generated_by=request.user.seller
+        generated_by=seller
     ).order_by('-report_date')
     
     context = {
@@ -1234,9 +1535,10 @@ def process_order(request, order_id):
 
     # Identify the seller (current logged-in user)
     # Ensure your Seller model has a OneToOne relationship with User
-    seller_profile = get_object_or_404(Seller, user=request.user)
+    seller_profile = profiles.profile_or_404(request.user, 'seller')
     
     running_total = 0
+    movements = []
     
     for item in order.items.all():
         product = item.product
@@ -1246,6 +1548,7 @@ def process_order(request, order_id):
             # 1. Update Inventory
             product.quantity = F('quantity') - actual_qty
             product.save()
+            movements.append(stock.movement(product, 'order', -actual_qty, reference=order.order_number, user=request.user))
 
             # 2. Update OrderItem fulfilled quantity
             item.quantity = actual_qty
@@ -1259,6 +1562,9 @@ def process_order(request, order_id):
                 seller=seller_profile,
                 products=product,
                 sale_amount=subtotal,
+                quantity=actual_qty,
+                cost_amount=actual_qty * item.cost_at_purchase,
+                category_id=product.category_id,
                 # You can pull payment_method from a form or default to 'cash'
                 payment_method='cash', 
                 is_completed=True
@@ -1267,12 +1573,17 @@ def process_order(request, order_id):
             item.quantity = 0
             item.save()
 
+    stock.record(movements)
+
     # 4. Finalize Order
     order.total_amount = running_total
     order.is_processed = True
     order.status = 'Processed'
     order.save()
 
+    # Render the PDF receipt in the background once the order is committed
+    transaction.on_commit(lambda: documents.submit_receipt(order.order_number))
+
     messages.success(request, f"Order #{order.order_number} processed and Sales recorded.")
     return redirect('receipt', order_number=order.order_number)
 
@@ -1283,16 +1594,59 @@ def receipt(request, order_number):
     """
     # We use order_number (the unique CharField) instead of ID for cleaner URLs
     # and better security/privacy.
-    order = get_object_or_404(Order, order_number=order_number)
-    
-    # We don't need to fetch OrderItems separately because we used 
-    # related_name='items' in the model. We can access them via order.items.all() 
-    # directly in the template.
+    # Processed orders never change, so reprints come from the receipt cache
+    # without touching the database.
+    receipt_html = receipts.render_receipt(order_number, kind='order')
     
     return render(request, 'seller/receipt.html', {
-        'order': order,
+        'order_number': order_number,
+        'receipt_html': receipt_html,
     })
 
+def _serve_document(path, future, filename):
+    """
+    Streams a generated PDF, waiting briefly for the render pool if needed.
+    """
+    if future is not None:
+        try:
+            documents.wait(future, settings.DOCUMENT_WAIT_SECONDS)
+        except FutureTimeoutError:
+            response = JsonResponse({'status': 'pending', 'message': 'The document is being generated.'}, status=202)
+            response['Retry-After'] = '2'
+            return response
+        except Exception:
+            # Render error or a dead worker; nothing was written, so a retry starts over
+            response = JsonResponse({'status': 'failed', 'message': 'The document could not be generated, please retry.'}, status=503)
+            response['Retry-After'] = '2'
+            return response
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf')
+
+@login_required
+def receipt_pdf(request, order_number):
+    """
+    PDF receipt download for staff, sellers and the customer who placed the order.
+    """
+    is_staff = request.user.is_superuser or hasattr(request.user, 'seller')
+    if not is_staff and not Order.objects.filter(order_number=order_number, customer__user=request.user).exists():
+        messages.error(request, "You do not have permission to view this receipt.")
+        return redirect('home')
+
+    path, future = documents.submit_receipt(order_number)
+    return _serve_document(path, future, f"receipt_{order_number}.pdf")
+
+@login_required
+def report_pdf(request, report_id):
+    """
+    PDF download of a daily SalesReport (admins and sellers).
+    """
+    if not (request.user.is_superuser or hasattr(request.user, 'seller')):
+        messages.error(request, "You do not have permission to view this report.")
+        return redirect('home')
+
+    report = get_object_or_404(SalesReport.objects.select_related('generated_by__user'), id=report_id)
+    path, future = documents.submit_report(report)
+    return _serve_document(path, future, f"sales_report_{report.report_date}.pdf")
+
 def check_for_new_orders(request):
     # Fetch orders created in the last 1 minute (adjust as needed)
     # Or filter by a 'status' field if you have one (e.g., status='Pending')
@@ -1343,68 +1697,35 @@ def seller_dashboard_order(request):
 
 #___________________CHATBOT SECTION_______________________
 
-# Initialize client
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("DEEPSEEK_API_KEY"),
-    
-)
+CHAT_TASKS_SESSION_KEY = 'chat_tasks'
 
-load_dotenv()
 def chatbot_response(request):
+    """
+    Queues the assistant's reply; the widget polls chatbot_reply for it
+    """
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            user_message = data.get("message")
-
-            products = Product.objects.all()[:20] 
-            inventory_summary = "\n".join([
-                f"- {p.name}: {p.selling_price} XAF (Stock: {p.quantity} {p.unit})" 
-                for p in products
-            ])
-
-            system_prompt = f"""
-            You are the official AI Assistant for our Mini Market called Momshop. 
-            Your theme colors are Orange, White, and Dull Black.
-
-            SHOP FACTS:
-            - Location: Makepe St. Tropez, Douala.
-            - Hours: 8 AM - 10 PM.
-            - Payments: Cash, Orange Money, Mobile Money.
-            - Delivery: 1,000 XAF within the city.
-
-            INVENTORY:
-            {inventory_summary}
-
-            STRICT INSTRUCTIONS:
-            - If a customer asks about a product, check the inventory list above.
-            - If you DO NOT know the answer, or if the question is about a specific complaint, 
-              refund, or a product NOT in the list, reply: 
-              "I'm sorry, I don't have that specific information. Please contact our 
-              Human Support team directly at +237 600 000 000 for further assistance."
-            - Keep answers helpful and concise.
-            """
-
-            completion = client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": "http://localhost:8000", # Required for OpenRouter
-                },
-                model="nex-agi/deepseek-v3.1-nex-n1:free",
-                messages=[
-                   {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message},
-                ],
-            )
-            
-            bot_reply = completion.choices[0].message.content
-            return JsonResponse({"reply": bot_reply})
+        except ValueError:
+            return JsonResponse({"error": "Invalid request"}, status=400)
 
-        except Exception as e:
-            # THIS WILL PRINT THE EXACT ERROR IN THE CHAT WINDOW
-            return JsonResponse({"reply": f"Backend Error: {str(e)}"}, status=200)
+        job = tasks.chatbot_reply.enqueue(str(data.get("message") or "")[:2000])
+        # Only the session that asked may read the answer
+        request.session[CHAT_TASKS_SESSION_KEY] = request.session.get(CHAT_TASKS_SESSION_KEY, [])[-19:] + [job.id]
+        return JsonResponse({"task": job.id, "poll": reverse('chatbot_reply', args=[job.id])}, status=202)
 
     return JsonResponse({"error": "Invalid request"}, status=400)
 
+def chatbot_reply(request, task_id):
+    if task_id not in request.session.get(CHAT_TASKS_SESSION_KEY, []):
+        return JsonResponse({"error": "Unknown message"}, status=404)
+    job = get_object_or_404(BackgroundTask, id=task_id, name=tasks.chatbot_reply.name)
+    if job.status == 'done':
+        return JsonResponse({"status": job.status, "reply": job.result['reply']})
+    if job.status == 'failed':
+        return JsonResponse({"status": job.status, "reply": "Error: Could not reach AI."})
+    return JsonResponse({"status": job.status})
+
 
 def custom_404(request, exception):
     return render(request, '404.html', status=404)    
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Low-stock watchlist with sales-velocity reorder suggestions.
+
+LowStockAlert holds only the products that need attention: at or below their
+minimum stock level, or expected to run out within WATCH_HORIZON_DAYS at their
+current sales velocity. Every stock change refreshes the affected products
+(stock.record() schedules it on commit) and refresh_watchlist rebuilds the
+whole list, so dashboards read a handful of precomputed rows.
+
+Velocity comes from the last VELOCITY_DAYS of completed sales. The daily
+series of all refreshed products are laid out in one NumPy matrix and
+reduced with an exponentially weighted mean, so recent days count more.
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db import connections, router, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .models import Product, Sale, LowStockAlert
+
+VELOCITY_DAYS = 28
+VELOCITY_HALF_LIFE = 7        # days; a sale two weeks ago counts a quarter
+LEAD_TIME_DAYS = 7            # supplier delivery delay assumed for reorders
+COVER_DAYS = 14               # stock a reorder should last after delivery
+WATCH_HORIZON_DAYS = LEAD_TIME_DAYS
+
+ALERT_FIELDS = [
+    'supplier', 'quantity', 'min_stock_level', 'below_minimum',
+    'daily_velocity', 'days_to_stockout', 'reorder_quantity', 'updated_at',
+]
+
+
+def velocities(product_ids, today=None, days=VELOCITY_DAYS):
+    """{product id: weighted units sold per day} over the last `days` days."""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    index = {pid: row for row, pid in enumerate(product_ids)}
+    series = np.zeros((len(index), days))
+
+    sold = (
+        Sale.objects.filter(is_completed=True, products_id__in=index, sale_date__date__range=[start, today])
+        .annotate(day=TruncDay('sale_date'))
+        .values_list('products_id', 'day')
+        .annotate(units=Sum('quantity'))
+    )
+    rows, cols, units = [], [], []
+    for pid, day, total in sold:
+        day = timezone.localtime(day).date() if timezone.is_aware(day) else day.date()
+        rows.append(index[pid])
+        cols.append((day - start).days)
+        units.append(total or 0)
+    if rows:
+        np.add.at(series, (np.array(rows), np.array(cols)), np.array(units, dtype=float))
+
+    # Column 0 is the oldest day; weights halve every VELOCITY_HALF_LIFE days back
+    age = np.arange(days - 1, -1, -1)
+    weights = 0.5 ** (age / VELOCITY_HALF_LIFE)
+    rates = series @ weights / weights.sum()
+    return dict(zip(index, rates.tolist()))
+
+
+def _assess(product, velocity):
+    """The alert for `product`, or None if it does not need watching."""
+    days_left = product.quantity / velocity if velocity > 0 else None
+    below = product.quantity <= product.min_stock_level
+    if not below and (days_left is None or days_left > WATCH_HORIZON_DAYS):
+        return None
+
+    target = velocity * (LEAD_TIME_DAYS + COVER_DAYS) + product.min_stock_level
+    return LowStockAlert(
+        product_id=product.id,
+        supplier_id=product.supplier_id,
+        quantity=product.quantity,
+        min_stock_level=product.min_stock_level,
+        below_minimum=below,
+        daily_velocity=round(velocity, 3),
+        days_to_stockout=round(days_left, 1) if days_left is not None else None,
+        reorder_quantity=max(0, math.ceil(target - product.quantity)),
+    )
+
+
+def refresh(product_ids=None):
+    """
+    Recomputes the watchlist rows of the given products (None: every product)
+    with one product query, one grouped sales query and one bulk upsert.
+    Returns the number of products now on the watchlist.
+    """
+    products = Product.objects.only('id', 'quantity', 'min_stock_level', 'supplier_id')
+    if product_ids is not None:
+        products = products.filter(id__in=list(product_ids))
+    products = list(products)
+
+    rates = velocities([p.id for p in products])
+    alerts = [alert for alert in (_assess(p, rates[p.id]) for p in products) if alert]
+    watched = {alert.product_id for alert in alerts}
+
+    with transaction.atomic():
+        stale = LowStockAlert.objects.exclude(product_id__in=watched)
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=[p.id for p in products] + list(product_ids))
+        stale.delete()
+        if alerts:
+            # MySQL/TiDB upsert on any unique key and refuse an explicit conflict target
+            features = connections[router.db_for_write(LowStockAlert)].features
+            LowStockAlert.objects.bulk_create(
+                alerts,
+                update_conflicts=True,
+                unique_fields=['product'] if features.supports_update_conflicts_with_target else None,
+                update_fields=ALERT_FIELDS,
+            )
+    return len(alerts)
+
+
+def refresh_on_commit(product_ids):
+    product_ids = list(set(product_ids))
+    if product_ids:
+        transaction.on_commit(lambda: refresh(product_ids))
+
+
+def by_supplier(alerts=None):
+    """Watchlist grouped for ordering: [(supplier, [alerts], units to order)]."""
+    if alerts is None:
+        alerts = LowStockAlert.objects.all()
+    alerts = alerts.select_related('product', 'supplier').order_by(
+        'supplier__name', 'days_to_stockout', 'product__name'
+    )
+    groups = {}
+    for alert in alerts:
+        groups.setdefault(alert.supplier, []).append(alert)
+    return [
+        (supplier, items, sum(alert.reorder_quantity for alert in items))
+        for supplier, items in groups.items()
+    ]